@@ -1,14 +1,31 @@
 import asyncio
 import os
 import logging
+
+from agents.core.batching import batched_mode, run_batched
+from agents.core.cancellation import TaskCancelled, current_token, get_registry, run_cancellable, task_key
+from agents.core.dag import load_agent_dag, resolve_dag, run_dag
+from agents.core.governor import current_owner
+from agents.core.routing import AgentRouter, resolve_agent_name
+
 logging.basicConfig(level=logging.INFO)
 # Base class for all agents
 
 class Agent:
+    # Prompt parts used by the CrewAI-backed agents; also what batched mode sends.
+    role = None
+    grounding = None
+    closing = None
+
     def __init__(self, name):
         self.name = name
     async def process(self, task):
         raise NotImplementedError("Subclasses must implement the process method.")
+    def role_instructions(self, task):
+        """This agent's instructions for a batched single-call run, or None to run it separately."""
+        if not self.role:
+            return None
+        return "\n".join(p.strip() for p in (self.role, self.grounding, self.closing) if p)
 # Specialized agents
 class EngineerCodeReviewAgent(Agent):
     async def process(self, task):
@@ -53,6 +70,48 @@ class CrewAIDataIntegration:
         }
         return simulated_data
 
+def agent_deadline():
+    """Seconds an agent may spend on one task (AGENT_TASK_DEADLINE, default 180; 0 disables)."""
+    try:
+        value = float(os.getenv("AGENT_TASK_DEADLINE", "180") or 0)
+    except ValueError:
+        value = 180.0
+    return value if value > 0 else None
+
+
+class DeadlineExceeded(str):
+    """Result recorded for an agent that ran past the task deadline."""
+
+    @classmethod
+    def for_agent(cls, name, deadline):
+        return cls(f"{name}: timed out after {deadline:g}s; no result")
+
+
+async def with_deadline(name, awaitable, deadline):
+    """Await `awaitable`; past `deadline` return a `DeadlineExceeded` note for `name` instead."""
+    try:
+        return await asyncio.wait_for(awaitable, deadline)
+    except asyncio.TimeoutError:
+        logging.warning("%s exceeded the %ss task deadline", name, deadline)
+        return DeadlineExceeded.for_agent(name, deadline)
+
+
+async def run_with_deadline(agent, task, deadline):
+    """Run `agent.process(task)`; on deadline return a timeout note instead of waiting."""
+    return await with_deadline(agent.name, agent.process(task), deadline)
+
+def normalize_response(resp):
+    """Reduce an agent's return value to the string stored as its result."""
+    if isinstance(resp, str):
+        return resp
+    if isinstance(resp, dict):
+        # Prefer common keys used by crewai-backed agents
+        if "result" in resp:
+            return resp.get("result")
+        if "text" in resp:
+            return resp.get("text")
+    return str(resp)
+
 # Agent management layer that holds and dispatches tasks to agents.
 
 class AgentManagementLayer:
@@ -83,28 +142,36 @@ class AgentManagementLayer:
             ]
 
         self.agents = [EngineerCodeReviewCrewAI("EngineerAgent")] + extra_agents
+        self.router = AgentRouter()
+        self.agent_dag = load_agent_dag()
+
+    def select_agents(self, task):
+        """Agents the router picks for this task (see agents/core/routing.py)."""
+        decision = self.router.route(task, [a.name for a in self.agents])
+        logging.info("Routing task '%s' to %s (%s)", task.get("title"), decision.agents, decision.reason)
+        return [a for a in self.agents if a.name in decision.agents], decision
 
     async def process_task(self, task):
         results = {}
-        # Dispatch the task concurrently to all agents
-        tasks = [asyncio.create_task(agent.process(task)) for agent in self.agents]
-        responses = await asyncio.gather(*tasks)
-        for agent, response in zip(self.agents, responses):
+        # Dispatch the task to the routed agents; dependents wait for their inputs
+        task = await resolve_agent_name(task)
+        agents, _ = self.select_agents(task)
+        deadline = agent_deadline()
+        try:
+            deps = resolve_dag(task.get("agent_dag") or self.agent_dag, [a.name for a in agents])
+        except ValueError:
+            logging.exception("Invalid agent DAG; running agents as independent peers")
+            deps = {}
+
+        async def run_node(agent, upstream):
+            agent_task = dict(task, upstream_results=upstream) if upstream else task
             # Normalize agent responses to simple strings so callers/tests
             # don't need to know agent-specific return shapes.
-            if isinstance(response, str):
-                results[agent.name] = response
-            elif isinstance(response, dict):
-                # Prefer common keys used by crewai-backed agents
-                if "result" in response:
-                    results[agent.name] = response.get("result")
-                elif "text" in response:
-                    results[agent.name] = response.get("text")
-                else:
-                    # Fallback to stringifying the dict
-                    results[agent.name] = str(response)
-            else:
-                results[agent.name] = str(response)
+            return normalize_response(await run_with_deadline(agent, agent_task, deadline))
+
+        outputs = await run_dag(agents, deps, run_node)
+        for agent in agents:
+            results[agent.name] = outputs[agent.name]
         return results
  # Master Control Panel that orchestrates the entire process
 
@@ -116,9 +183,52 @@ class MasterControlPanel:
         self.data_integration = CrewAIDataIntegration()
         self.agent_manager = AgentManagementLayer()
         self.publisher = publisher
+        self.batch_adapter = None
 
     async def handle_task(self, task):
         logging.info("MCP: Received new task.")
+        task_id = task.get('id')
+        registry = get_registry()
+        token = registry.register(task_key(task))
+        if not token.cancelled:
+            # A cancel may have been recorded by another process while this task was queued
+            reason = await asyncio.to_thread(registry.take_remote, token.key) if registry.remote else None
+            if reason:
+                token.cancel(reason)
+        # LLM calls made for this task queue fairly under its owner and stop once it is cancelled
+        current_owner.set(str(task.get('owner_id') or task.get('source') or 'default'))
+        current_token.set(token)
+
+        results = {}
+        started = set()
+        try:
+            await run_cancellable(self._dispatch(task, results, started), token, registry)
+        except TaskCancelled as exc:
+            logging.info("MCP: Task %s cancelled (%s); stopping its agents", token.key, exc.reason)
+            for name in sorted(started - set(results)):
+                results[name] = f"{name}: cancelled ({exc.reason}); no result"
+                await self._publish(task_id, {"type": "agent_status", "agent": name, "status": "cancelled"})
+            await self._publish(task_id, {"type": "status", "status": "cancelled", "reason": exc.reason})
+            return results
+        finally:
+            registry.release(token)
+            if registry.remote is not None:
+                await asyncio.to_thread(registry.clear_remote, token.key)
+
+        # Publish an overall task 'done' status so the server persists the Task.status
+        await self._publish(task_id, {"type": "status", "status": "done"})
+        return results
+
+    async def _publish(self, task_id, event):
+        if self.publisher and task_id is not None:
+            try:
+                await self.publisher(task_id, event)
+            except Exception:
+                # swallow publisher errors so they don't stop agent work
+                pass
+
+    async def _dispatch(self, task, results, started):
+        """Route the task and run its agents, filling `results`; `started` collects agents that began."""
         # Optional test-only hold to keep the task "running" for a period so
         # distributed lock behavior can be observed during smoke tests.
         try:
@@ -133,60 +243,66 @@ class MasterControlPanel:
         task.update(defect_data)
         logging.info("MCP: Enriched task data, dispatching to agents.")
 
-        results = {}
         task_id = task.get('id')
         from datetime import datetime
         # Run agents concurrently but emit per-agent events as they progress.
         lock = asyncio.Lock()
+        deadline = agent_deadline()
+
+        async def deliver(name, resp):
+            """Normalize an agent's response, record it and publish activity + done."""
+            content = normalize_response(resp)
 
-        async def run_agent(agent):
-            nonlocal results
+            # If artifact summary is present, ensure outputs begin with a factual table
             try:
-                if self.publisher and task_id is not None:
-                    try:
-                        await self.publisher(task_id, {"type": "agent_status", "agent": agent.name, "status": "running"})
-                    except Exception:
-                        # swallow publisher errors so they don't stop agent work
-                        pass
+                art_sum = task.get('artifact_summary')
+            except Exception:
+                art_sum = None
+            if art_sum and isinstance(content, str):
+                # Prepend the summary if not already included at the start
+                norm = content.strip()
+                has_table = norm.startswith("|") or norm.startswith("### Attached Test Artifacts Summary")
+                if not has_table:
+                    content = str(art_sum) + "\n\n" + content
+
+            # Safely write result
+            async with lock:
+                results[name] = content
 
-                resp = await agent.process(task)
-
-                # Normalize response similar to previous behavior
-                if isinstance(resp, str):
-                    content = resp
-                elif isinstance(resp, dict):
-                    if "result" in resp:
-                        content = resp.get("result")
-                    elif "text" in resp:
-                        content = resp.get("text")
-                    else:
-                        content = str(resp)
-                else:
-                    content = str(resp)
-
-                # If artifact summary is present, ensure outputs begin with a factual table
+            # Publish activity + done status
+            if self.publisher and task_id is not None:
                 try:
-                    art_sum = task.get('artifact_summary')
+                    await self.publisher(task_id, {"type": "activity", "agent": name, "content": content, "created_at": datetime.utcnow().isoformat()})
+                    await self.publisher(task_id, {"type": "agent_status", "agent": name, "status": "done"})
                 except Exception:
-                    art_sum = None
-                if art_sum and isinstance(content, str):
-                    # Prepend the summary if not already included at the start
-                    norm = content.strip()
-                    has_table = norm.startswith("|") or norm.startswith("### Attached Test Artifacts Summary")
-                    if not has_table:
-                        content = str(art_sum) + "\n\n" + content
-
-                # Safely write result
-                async with lock:
-                    results[agent.name] = content
+                    pass
+
+        async def timed_out(name, note):
+            async with lock:
+                results[name] = str(note)
+            await self._publish(task_id, {"type": "agent_status", "agent": name, "status": "timeout"})
 
-                # Publish activity + done status
+        async def run_agent(agent, agent_task=None):
+            started.add(agent.name)
+            try:
                 if self.publisher and task_id is not None:
                     try:
-                        await self.publisher(task_id, {"type": "activity", "agent": agent.name, "content": content, "created_at": datetime.utcnow().isoformat()})
-                        await self.publisher(task_id, {"type": "agent_status", "agent": agent.name, "status": "done"})
+                        await self.publisher(task_id, {"type": "agent_status", "agent": agent.name, "status": "running"})
                     except Exception:
+                        # swallow publisher errors so they don't stop agent work
                         pass
+
+                resp = await run_with_deadline(agent, agent_task or task, deadline)
+                if isinstance(resp, DeadlineExceeded):
+                    # Bound the task's tail latency: report this agent and keep the others' results
+                    await timed_out(agent.name, resp)
+                    return
+                await deliver(agent.name, resp)
+            except TaskCancelled as e:
+                # The run was cancelled mid-call; handle_task reports it once the fan-out stops
+                async with lock:
+                    results[agent.name] = f"{agent.name}: cancelled ({e.reason}); no result"
+                await self._publish(task_id, {"type": "agent_status", "agent": agent.name, "status": "cancelled"})
             except Exception as e:
                 # Publish failure and record error
                 try:
@@ -197,23 +313,67 @@ class MasterControlPanel:
                 async with lock:
                     results[agent.name] = str(e)
 
-        # Spawn all agent tasks and wait for them to complete concurrently
-        agent_tasks = [asyncio.create_task(run_agent(agent)) for agent in self.agent_manager.agents]
-        # Wait for all agent tasks to finish; exceptions are handled per-agent
-        await asyncio.gather(*agent_tasks)
+        # Only the agents relevant to this task run (one LLM call each)
+        task = await resolve_agent_name(task)
+        selected, decision = self.agent_manager.select_agents(task)
+        if self.publisher and task_id is not None:
+            try:
+                await self.publisher(task_id, {"type": "routing", "agents": [a.name for a in selected], "reason": decision.reason})
+            except Exception:
+                pass
 
-        # Publish an overall task 'done' status so the server persists the Task.status
+        # Dependent agents wait for their inputs (agents/core/dag.py)
         try:
-            if self.publisher and task_id is not None:
-                try:
-                    await self.publisher(task_id, {"type": "status", "status": "done"})
-                except Exception:
-                    # swallow publisher errors
-                    pass
-        except Exception:
-            pass
+            deps = resolve_dag(task.get("agent_dag") or self.agent_manager.agent_dag, [a.name for a in selected])
+        except ValueError:
+            logging.exception("Invalid agent DAG; running agents as independent peers")
+            deps = {}
 
-        return results
+        # Opt-in batched mode: one LLM call answers for every agent that can share it
+        # (agents consuming upstream output need that output, so they run afterwards)
+        if batched_mode(task) and len(selected) > 1:
+            peers = [a for a in selected if not deps.get(a.name)]
+            try:
+                answers = await with_deadline("Batched call", run_batched(self._batch_adapter(), task, peers), deadline)
+            except Exception:
+                logging.exception("Batched agent call failed; running agents separately")
+                answers = {}
+            if isinstance(answers, DeadlineExceeded):
+                # The shared call used up the peers' deadline; rerunning them would double it
+                for agent in peers:
+                    await timed_out(agent.name, DeadlineExceeded.for_agent(agent.name, deadline))
+                selected = [a for a in selected if a not in peers]
+                answers = {}
+            for agent in selected:
+                if agent.name in answers:
+                    if self.publisher and task_id is not None:
+                        try:
+                            await self.publisher(task_id, {"type": "agent_status", "agent": agent.name, "status": "running"})
+                        except Exception:
+                            pass
+                    await deliver(agent.name, answers[agent.name])
+            selected = [a for a in selected if a.name not in answers]
+
+        async def run_node(agent, upstream):
+            agent_task = task
+            if deps.get(agent.name):
+                # Each dependent agent gets its own copy carrying its inputs' outputs
+                # (inputs answered by the batched call are already in results)
+                agent_task = dict(task)
+                agent_task["upstream_results"] = {d: results.get(d) for d in deps[agent.name]}
+            await run_agent(agent, agent_task)
+            return results.get(agent.name)
+
+        # Independent agents run concurrently; dependents start once their inputs finish.
+        # Exceptions are handled per-agent inside run_agent.
+        remaining = {a.name for a in selected}
+        await run_dag(selected, {n: [d for d in ds if d in remaining] for n, ds in deps.items()}, run_node)
+
+    def _batch_adapter(self):
+        if self.batch_adapter is None:
+            from agents.core.crewai_adapter import CrewAIAdapter
+            self.batch_adapter = CrewAIAdapter(agent="batched")
+        return self.batch_adapter
 
     def submit_task(self, task):
         # Use asyncio to run the asynchronous handle_task function
@@ -0,0 +1,99 @@
+"""Batched single-call mode: one LLM call answers for several agents.
+
+The shared task context (`prompting.shared_prefix`) is sent once, followed
+by each agent's role instructions, and the model returns a JSON object
+keyed by agent name. Agents whose instructions depend on their own
+retrieval (see `Agent.role_instructions`) are left out and run normally,
+as is any agent whose answer is missing from the response.
+
+Enabled per task with `"execution_mode": "batched"` or for every task with
+`AGENT_EXECUTION_MODE=batched`.
+"""
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from agents.core.prompting import PromptBuilder, compose_prompt
+
+_logger = logging.getLogger(__name__)
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+def batched_mode(task: Dict) -> bool:
+    mode = task.get("execution_mode") or os.getenv("AGENT_EXECUTION_MODE") or "separate"
+    return str(mode).lower() == "batched"
+
+
+def batch_max_tokens(n_agents: int) -> int:
+    try:
+        cap = int(os.getenv("AGENT_BATCH_MAX_TOKENS") or 4000)
+    except ValueError:
+        cap = 4000
+    return min(cap, 800 * max(1, n_agents))
+
+
+def build_batched_prompt(task: Dict, roles: Sequence[Tuple[str, str]]) -> str:
+    """Shared task context plus one instruction block per `(agent_name, instructions)`."""
+    names = ", ".join(json.dumps(name) for name, _ in roles)
+    pb = PromptBuilder()
+    pb.add("instructions", (
+        "Answer the task above once for each of the following agents, each from its own perspective.\n"
+        f"Respond with only a JSON object whose keys are exactly {names} and whose values are "
+        "that agent's complete answer as a Markdown string."
+    ), priority=0, required=True)
+    for name, instructions in roles:
+        pb.add(f"agent:{name}", f"### {name}\n{instructions}", priority=1, required=True, dedupe=False)
+    return compose_prompt(task, pb)
+
+
+def parse_batched_response(text: Optional[str], names: Sequence[str]) -> Dict[str, str]:
+    """Map agent names to their answers; unknown keys and non-JSON replies are ignored."""
+    if not text:
+        return {}
+    body = _FENCE_RE.sub("", text.strip())
+    start, end = body.find("{"), body.rfind("}")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        data = json.loads(body[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    by_lower = {n.lower(): n for n in names}
+    out: Dict[str, str] = {}
+    for key, value in data.items():
+        name = by_lower.get(str(key).strip().lower())
+        if name is None or value is None:
+            continue
+        if not isinstance(value, str):
+            value = json.dumps(value, indent=2)
+        if value.strip():
+            out[name] = value
+    return out
+
+
+async def run_batched(adapter, task: Dict, agents: Sequence) -> Dict[str, str]:
+    """Answer for every batchable agent in one call; returns only the parsed answers."""
+    roles: List[Tuple[str, str]] = []
+    for agent in agents:
+        try:
+            instructions = agent.role_instructions(task)
+        except Exception:
+            instructions = None
+        if instructions:
+            roles.append((agent.name, instructions))
+    if len(roles) < 2:
+        return {}
+    prompt = build_batched_prompt(task, roles)
+    names = [name for name, _ in roles]
+    res = await adapter.run(prompt, max_tokens=batch_max_tokens(len(roles)), response_format={"type": "json_object"})
+    text = res.get("text") if isinstance(res, dict) else str(res)
+    parsed = parse_batched_response(text, names)
+    missing = [n for n in names if n not in parsed]
+    if missing:
+        _logger.info("Batched call returned no answer for %s; running them separately", missing)
+    return parsed
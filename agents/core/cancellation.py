@@ -0,0 +1,345 @@
+"""Cooperative cancellation for agent runs.
+
+Each run of `MasterControlPanel.handle_task` holds a `CancelToken` from the
+process-wide registry, keyed by the task's id (or a generated `run_id` for
+webhook tasks that have no database row). A token is cancelled when
+
+- a client calls `POST /api/tasks/{id}/cancel`,
+- the `/run-agents` caller disconnects, or
+- a newer task is submitted under the same supersede key (for example a
+  later push to the same branch, see `CancellationRegistry.supersede`).
+
+Cancelling wakes `handle_task`, which cancels its in-flight agent coroutines
+and reports the task as cancelled. `CrewAIAdapter` also checks the token of
+the current run (`current_token`) before queuing for and after acquiring a
+governor slot, so no new LLM call starts once a run is cancelled. Tasks
+still waiting in a queue are skipped by the workers. A cancel for a key
+that isn't running in this process is remembered for TASK_CANCEL_EARLY_TTL
+seconds (600), or until the task reaches a final status, so it can't cancel
+a much later rerun of the same task id.
+
+When `TASK_CANCEL_REDIS_URL` is set, cancellations are also written to
+Redis and polled by running tasks every `TASK_CANCEL_POLL_SECONDS`
+(default 1), so a cancel reaches Celery workers in other processes. A
+starting run takes (reads and deletes) its flag and a finished run clears
+it, so a flag only ever cancels the run it was meant for, never a rerun of
+the same task.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Dict, List, Optional, Tuple, TypeVar
+
+try:
+    import redis  # type: ignore
+except Exception:
+    redis = None
+
+_logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Bound on remembered early cancels and supersede keys
+_REMEMBER_LIMIT = 1024
+_REMOTE_TTL = 3600
+
+
+def _early_ttl() -> float:
+    try:
+        return max(0.0, float(os.getenv("TASK_CANCEL_EARLY_TTL") or 600))
+    except ValueError:
+        return 600.0
+
+
+class TaskCancelled(Exception):
+    """Raised inside a run whose token was cancelled."""
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """Thread-safe cancellation flag that asyncio code can also await."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Cancel once; returns False if already cancelled. Safe from any thread."""
+        with self._lock:
+            if self.reason is not None:
+                return False
+            self.reason = reason
+            waiters, self._waiters = self._waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+        return True
+
+    def check(self) -> None:
+        if self.reason is not None:
+            raise TaskCancelled(self.reason)
+
+    async def wait(self) -> str:
+        """Return the reason once cancelled."""
+        event = asyncio.Event()
+        with self._lock:
+            if self.reason is None:
+                self._waiters.append((asyncio.get_running_loop(), event))
+            else:
+                event.set()
+        await event.wait()
+        return self.reason
+
+
+# Token of the run currently executing; MasterControlPanel sets it per task.
+current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar("cancel_token", default=None)
+
+
+def check_cancelled() -> None:
+    """Raise `TaskCancelled` if the current run has been cancelled."""
+    token = current_token.get()
+    if token is not None:
+        token.check()
+
+
+def task_key(task: Dict) -> str:
+    """Registry key for a task dict, assigning a `run_id` when it has no id."""
+    if task.get("id") is not None:
+        return str(task["id"])
+    if not task.get("run_id"):
+        task["run_id"] = uuid.uuid4().hex
+    return str(task["run_id"])
+
+
+class RemoteFlags:
+    """Cancellation flags shared across processes through Redis."""
+
+    def __init__(self, url: str, prefix: str = "task_cancel"):
+        self.url = url
+        self.prefix = prefix
+        self._client = None
+
+    def _redis(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url, decode_responses=True)
+        return self._client
+
+    def mark(self, key: str, reason: str) -> None:
+        self._redis().set(f"{self.prefix}:{key}", reason, ex=_REMOTE_TTL)
+
+    def reason(self, key: str) -> Optional[str]:
+        return self._redis().get(f"{self.prefix}:{key}")
+
+    def take(self, key: str) -> Optional[str]:
+        """Read and delete the flag in one step (GETDEL)."""
+        return self._redis().getdel(f"{self.prefix}:{key}")
+
+    def clear(self, key: str) -> None:
+        self._redis().delete(f"{self.prefix}:{key}")
+
+
+class CancellationRegistry:
+    def __init__(self, remote: Optional[RemoteFlags] = None):
+        self.remote = remote
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, CancelToken] = {}
+        # Cancels that arrived before the run registered (e.g. still queued)
+        # key -> (reason, monotonic expiry)
+        self._early: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        # supersede_key -> key of the latest run submitted under it
+        self._latest: "OrderedDict[str, str]" = OrderedDict()
+
+    def register(self, key: str) -> CancelToken:
+        """Token for a starting run; already cancelled if a cancel arrived first."""
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is None:
+                token = self._tokens[key] = CancelToken(key)
+                early = self._pop_early(key)
+                if early is not None:
+                    token.cancel(early)
+        return token
+
+    def release(self, token: CancelToken) -> None:
+        with self._lock:
+            if self._tokens.get(token.key) is token:
+                del self._tokens[token.key]
+
+    def get(self, key: str) -> Optional[CancelToken]:
+        with self._lock:
+            return self._tokens.get(key)
+
+    def cancel(self, key: str, reason: str = "cancelled") -> bool:
+        """Cancel the run registered under `key`; True if it was running here.
+
+        Unknown keys are remembered (locally and, if configured, in Redis) so
+        the run is skipped when a worker picks it up later.
+        """
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is None:
+                self._remember(self._early, key, (reason, time.monotonic() + _early_ttl()))
+        cancelled = token.cancel(reason) if token is not None else False
+        if token is None or cancelled:
+            self._mark_remote(key, reason)
+        return cancelled
+
+    def supersede(self, supersede_key: str, key: str) -> Optional[str]:
+        """Record `key` as the latest run for `supersede_key` and cancel the previous one.
+
+        Returns the key of the superseded run, if any.
+        """
+        with self._lock:
+            previous = self._latest.get(supersede_key)
+            self._remember(self._latest, supersede_key, key)
+        if previous is None or previous == key:
+            return None
+        _logger.info("Run %s superseded by %s (%s)", previous, key, supersede_key)
+        self.cancel(previous, "superseded")
+        return previous
+
+    def is_cancelled(self, key: str) -> bool:
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is None:
+                return self._peek_early(key) is not None
+        return token.cancelled
+
+    def _peek_early(self, key: str) -> Optional[str]:
+        # Caller holds self._lock
+        entry = self._early.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._early[key]
+            return None
+        return entry[0]
+
+    def _pop_early(self, key: str) -> Optional[str]:
+        reason = self._peek_early(key)
+        self._early.pop(key, None)
+        return reason
+
+    def discard(self, key: str) -> None:
+        """Forget a pending cancel (the queued run was skipped or the task finished elsewhere)."""
+        with self._lock:
+            self._early.pop(key, None)
+
+    def remote_reason(self, key: str) -> Optional[str]:
+        if self.remote is None:
+            return None
+        try:
+            return self.remote.reason(key)
+        except Exception:
+            _logger.debug("Remote cancel flag lookup failed for %s", key, exc_info=True)
+            return None
+
+    def take_remote(self, key: str) -> Optional[str]:
+        """Consume a cancel flagged for `key` before its run registered here."""
+        if self.remote is None:
+            return None
+        try:
+            return self.remote.take(key)
+        except Exception:
+            _logger.debug("Remote cancel flag lookup failed for %s", key, exc_info=True)
+            return None
+
+    def clear_remote(self, key: str) -> None:
+        """Drop the remote flag of a finished run so it can't cancel the next one."""
+        if self.remote is None:
+            return
+        try:
+            self.remote.clear(key)
+        except Exception:
+            _logger.debug("Failed to clear remote cancel flag for %s", key, exc_info=True)
+
+    @staticmethod
+    def _remember(entries: "OrderedDict[str, Any]", key: str, value: Any) -> None:
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > _REMEMBER_LIMIT:
+            entries.popitem(last=False)
+
+    def _mark_remote(self, key: str, reason: str) -> None:
+        if self.remote is None:
+            return
+        try:
+            self.remote.mark(key, reason)
+        except Exception:
+            _logger.warning("Failed to publish cancellation of %s to Redis", key, exc_info=True)
+
+
+def poll_interval() -> float:
+    try:
+        return max(0.1, float(os.getenv("TASK_CANCEL_POLL_SECONDS") or 1.0))
+    except ValueError:
+        return 1.0
+
+
+async def watch_remote(registry: CancellationRegistry, token: CancelToken) -> None:
+    """Cancel `token` when another process flags its key in Redis."""
+    if registry.remote is None:
+        return
+    interval = poll_interval()
+    while not token.cancelled:
+        reason = await asyncio.to_thread(registry.remote_reason, token.key)
+        if reason:
+            token.cancel(reason)
+            return
+        await asyncio.sleep(interval)
+
+
+async def run_cancellable(coro: Awaitable[T], token: CancelToken, registry: Optional["CancellationRegistry"] = None) -> T:
+    """Await `coro`, cancelling it as soon as `token` is; then raise `TaskCancelled`."""
+    work = asyncio.ensure_future(coro)
+    waiter = asyncio.ensure_future(token.wait())
+    watchers = {work, waiter}
+    if registry is not None and registry.remote is not None:
+        watchers.add(asyncio.ensure_future(watch_remote(registry, token)))
+    try:
+        await asyncio.wait({work, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        # The caller itself was cancelled: don't leave the work running
+        work.cancel()
+        raise
+    finally:
+        for fut in watchers - {work}:
+            fut.cancel()
+    if token.cancelled:
+        if not work.done():
+            work.cancel()
+        try:
+            await work
+        except (asyncio.CancelledError, Exception):
+            pass
+        raise TaskCancelled(token.reason)
+    return work.result()
+
+
+_REGISTRY: Optional[CancellationRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> CancellationRegistry:
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            url = os.getenv("TASK_CANCEL_REDIS_URL")
+            _REGISTRY = CancellationRegistry(RemoteFlags(url) if url and redis is not None else None)
+        return _REGISTRY
@@ -10,6 +10,17 @@ from typing import Any, Dict, Optional
 import os
 import asyncio
 import logging
+import time
+
+from agents.core.cancellation import TaskCancelled, check_cancelled
+from agents.core.governor import get_governor
+from agents.core.resilience import LatencyTracker, call_timeout, call_with_retries, mark_admitted
+
+try:
+    from mcp.metrics import LLM_CACHED_PROMPT_TOKENS, LLM_PROMPT_TOKENS
+except Exception:
+    LLM_PROMPT_TOKENS = LLM_CACHED_PROMPT_TOKENS = None
+from mcp.rerank import estimate_tokens
 
 try:
     import crewai  # type: ignore
@@ -25,11 +36,39 @@ try:
 except Exception:
     OpenAIClient = None
 
+# Recent request latencies per model, used to decide when to hedge.
+_LATENCY: Dict[str, LatencyTracker] = {}
+
+
+def _latency_tracker(model: str) -> LatencyTracker:
+    tracker = _LATENCY.get(model)
+    if tracker is None:
+        tracker = _LATENCY.setdefault(model, LatencyTracker())
+    return tracker
+
+
+def usage_summary(usage) -> Optional[Dict[str, int]]:
+    """Prompt/completion/cached token counts from a provider usage object or dict."""
+    if usage is None:
+        return None
+
+    def _get(obj, key):
+        return obj.get(key) if isinstance(obj, dict) else getattr(obj, key, None)
+
+    details = _get(usage, "prompt_tokens_details")
+    return {
+        "prompt_tokens": int(_get(usage, "prompt_tokens") or 0),
+        "completion_tokens": int(_get(usage, "completion_tokens") or 0),
+        "cached_tokens": int((_get(details, "cached_tokens") if details is not None else 0) or 0),
+    }
+
 
 class CrewAIAdapter:
-    def __init__(self, model: Optional[str] = None):
+    def __init__(self, model: Optional[str] = None, agent: Optional[str] = None):
         # Model name can be configured with CREWAI_MODEL
         self.model = model or os.getenv("CREWAI_MODEL") or "gpt-4o-mini"
+        # Agent label for per-agent token/cache metrics
+        self.agent = agent or "unknown"
         # Support explicit API key wiring for crewai client
         self.api_key = os.getenv("CREWAI_API_KEY")
         self.logger = logging.getLogger("crewai_adapter")
@@ -51,13 +90,53 @@ class CrewAIAdapter:
             ),
         )
 
+    def _estimate_cost(self, prompt: str, kwargs: Dict[str, Any]) -> int:
+        """Rate-limit cost as the provider counts it: prompt plus max_tokens."""
+        return estimate_tokens(self.system_grounding) + estimate_tokens(prompt) + int(kwargs.get("max_tokens", 2000))
+
+    async def _governed_call(self, fn, prompt: str, kwargs: Dict[str, Any]):
+        """One attempt: wait for a governor slot, then run `fn` under the call deadline.
+
+        The slot is held until `fn`'s thread returns, even past a timeout, so
+        timed-out calls still count against `LLM_MAX_CONCURRENCY`.
+
+        `fn` returns `(result, usage)`; usage (if any) corrects the token estimate
+        and is recorded per agent, including prompt tokens served from the
+        provider's prefix cache. A cancelled run neither queues for a slot nor
+        starts the call once admitted.
+        """
+        check_cancelled()
+        async with get_governor().slot(self._estimate_cost(prompt, kwargs)) as lease:
+            check_cancelled()
+            mark_admitted()
+            started = time.monotonic()
+            call = asyncio.ensure_future(asyncio.to_thread(fn))
+            # A timed-out thread keeps calling the LLM; it keeps the slot until it returns
+            lease.hold_until(call)
+            result, usage = await asyncio.wait_for(asyncio.shield(call), call_timeout())
+            _latency_tracker(self.model).record(time.monotonic() - started)
+            lease.record(getattr(usage, "total_tokens", None))
+        summary = usage_summary(usage)
+        if summary is not None:
+            self.logger.info("LLM usage agent=%s prompt=%d cached=%d completion=%d", self.agent,
+                             summary["prompt_tokens"], summary["cached_tokens"], summary["completion_tokens"])
+            try:
+                if LLM_PROMPT_TOKENS is not None:
+                    LLM_PROMPT_TOKENS.labels(agent=self.agent).inc(summary["prompt_tokens"])
+                    LLM_CACHED_PROMPT_TOKENS.labels(agent=self.agent).inc(summary["cached_tokens"])
+            except Exception:
+                pass
+        return result, summary
+
     async def run(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """Run the prompt through CrewAI or a fallback.
 
         This method ensures any blocking client calls run in a thread so the
         FastAPI event loop is not blocked. Returns a dict containing at least
-        the key `text`.
+        the key `text`. Raises `TaskCancelled` if the current run has been
+        cancelled (see agents/core/cancellation.py).
         """
+        check_cancelled()
         print(f"[ADAPTER DEBUG] CrewAIAdapter.run called, prompt length: {len(prompt)}")
         self.logger.info("CrewAIAdapter.run called, prompt length: %d", len(prompt))
         
@@ -73,19 +152,26 @@ class CrewAIAdapter:
                         client = crewai
 
                     if hasattr(client, "completions"):
-                        return client.completions.create(model=self.model, prompt=prompt, **kwargs)
-                    if hasattr(client, "responses"):
-                        return client.responses.create(model=self.model, input=prompt, **kwargs)
-                    return client.create(model=self.model, prompt=prompt, **kwargs)
+                        resp = client.completions.create(model=self.model, prompt=prompt, **kwargs)
+                    elif hasattr(client, "responses"):
+                        resp = client.responses.create(model=self.model, input=prompt, **kwargs)
+                    else:
+                        resp = client.create(model=self.model, prompt=prompt, **kwargs)
+                    return resp, getattr(resp, "usage", None)
 
-                resp = await asyncio.to_thread(_call_crewai)
+                resp, usage = await call_with_retries(
+                    lambda: self._governed_call(_call_crewai, prompt, kwargs), _latency_tracker(self.model),
+                    admission=True,
+                )
                 # Extract textual content robustly
                 text = None
                 if isinstance(resp, dict):
                     text = resp.get("text") or resp.get("content") or str(resp)
                 else:
                     text = getattr(resp, "text", None) or getattr(resp, "content", None) or str(resp)
-                return {"text": text}
+                return {"text": text, "usage": usage}
+            except TaskCancelled:
+                raise
             except Exception as e:
                 self.logger.exception("CrewAI client failed, falling back: %s", e)
 
@@ -97,25 +183,34 @@ class CrewAIAdapter:
             try:
                 def _call_openai():
                     self.logger.info("Creating OpenAI client...")
-                    client = OpenAIClient()
+                    client = OpenAIClient(max_retries=0, timeout=call_timeout())
                     self.logger.info("Calling chat.completions.create with model: %s", self.model)
                     # Use chat completions API (modern OpenAI API)
                     messages = []
                     # Always include a grounding system message to reduce hallucinations
                     messages.append({"role": "system", "content": self.system_grounding})
                     messages.append({"role": "user", "content": prompt})
+                    extra = {}
+                    if kwargs.get("response_format"):
+                        extra["response_format"] = kwargs["response_format"]
                     response = client.chat.completions.create(
                         model=self.model,
                         messages=messages,
                         max_tokens=kwargs.get("max_tokens", 2000),
                         temperature=kwargs.get("temperature", self.default_temperature),
+                        **extra,
                     )
                     self.logger.info("OpenAI response received, content length: %d", len(response.choices[0].message.content))
-                    return response.choices[0].message.content
+                    return response.choices[0].message.content, getattr(response, "usage", None)
 
-                text = await asyncio.to_thread(_call_openai)
+                text, usage = await call_with_retries(
+                    lambda: self._governed_call(_call_openai, prompt, kwargs), _latency_tracker(self.model),
+                    admission=True,
+                )
                 self.logger.info("OpenAI call successful, returning text")
-                return {"text": text}
+                return {"text": text, "usage": usage}
+            except TaskCancelled:
+                raise
             except Exception as e:
                 self.logger.exception("OpenAI client failed as fallback: %s", e)
 
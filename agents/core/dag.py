@@ -0,0 +1,76 @@
+"""Dependency-aware scheduling of the agents selected for a task.
+
+The DAG maps an agent name to the agents whose output it consumes, e.g.
+`{"RootCauseAgent": ["DiscoveryAgent"]}`. Agents with no pending inputs run
+concurrently; a dependent agent starts as soon as all of its inputs finish
+and receives their outputs as `task["upstream_results"]` in its own copy of
+the task. Task latency is therefore the critical path, not the sum.
+
+Only edges between agents that were actually selected for the task apply.
+The DAG is read from `agents/core/agent_dag.json` (override the path with
+`AGENT_DAG_CONFIG`) and can be replaced per task with `task["agent_dag"]`.
+"""
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+_logger = logging.getLogger(__name__)
+
+_DEFAULT_CONFIG = Path(__file__).resolve().parent / "agent_dag.json"
+
+
+def load_agent_dag(path: Optional[str] = None) -> Dict[str, List[str]]:
+    p = Path(path or os.getenv("AGENT_DAG_CONFIG") or _DEFAULT_CONFIG)
+    try:
+        with open(p, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except Exception:
+        return {}
+    return {str(k): [str(d) for d in (v or [])] for k, v in (data or {}).items()}
+
+
+def resolve_dag(dag: Dict[str, Sequence[str]], names: Sequence[str]) -> Dict[str, List[str]]:
+    """Restrict `dag` to `names` and check it is acyclic (ValueError otherwise)."""
+    present = set(names)
+    deps = {n: [d for d in dag.get(n, ()) if d in present and d != n] for n in names}
+    state: Dict[str, int] = {}
+
+    def visit(n: str, path: List[str]) -> None:
+        if state.get(n) == 2:
+            return
+        if state.get(n) == 1:
+            raise ValueError("agent DAG has a cycle: " + " -> ".join(path + [n]))
+        state[n] = 1
+        for d in deps[n]:
+            visit(d, path + [n])
+        state[n] = 2
+
+    for n in names:
+        visit(n, [])
+    return deps
+
+
+async def run_dag(agents: Sequence[Any], deps: Dict[str, List[str]], run_one: Callable[[Any, Dict[str, Any]], Awaitable[Any]]) -> Dict[str, Any]:
+    """Await `run_one(agent, upstream_outputs)` for every agent in dependency order.
+
+    Returns each agent's output keyed by name.
+    """
+    loop = asyncio.get_running_loop()
+    outputs: Dict[str, asyncio.Future] = {a.name: loop.create_future() for a in agents}
+
+    async def node(agent):
+        upstream = {}
+        for d in deps.get(agent.name, ()):
+            upstream[d] = await outputs[d]
+        try:
+            result = await run_one(agent, upstream)
+        except Exception as e:
+            _logger.exception("Agent %s failed inside DAG", agent.name)
+            result = str(e)
+        outputs[agent.name].set_result(result)
+
+    await asyncio.gather(*(node(a) for a in agents))
+    return {name: fut.result() for name, fut in outputs.items()}
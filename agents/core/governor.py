@@ -0,0 +1,331 @@
+"""Process-wide governor for LLM calls.
+
+Every real model call made by `CrewAIAdapter.run` acquires a slot here
+first. Admission respects:
+
+- a requests/minute and a tokens/minute token bucket (`LLM_RPM_LIMIT`,
+  default 500; `LLM_TPM_LIMIT`, default 200000; 0 disables a bucket),
+- a cap on in-flight calls (`LLM_MAX_CONCURRENCY`, default 8),
+- fair queuing: waiters are grouped by owner (`current_owner`, set per task)
+  and served round-robin, so one tenant's burst can't starve the others.
+
+Token cost is estimated up front as prompt tokens plus `max_tokens` (the
+same way the provider charges rate limits) and corrected afterwards with
+`Lease.record` from the response's usage.
+
+When `LLM_GOVERNOR_REDIS_URL` is set the same buckets are also enforced
+across processes by a Redis Lua script; Redis errors fall back to the local
+buckets only. Queue waits are exported as `llm_governor_queue_wait_seconds`.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+try:
+    import redis.asyncio as aioredis  # type: ignore
+except Exception:
+    aioredis = None
+
+try:
+    from mcp.metrics import LLM_INFLIGHT, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT
+except Exception:
+    LLM_INFLIGHT = LLM_QUEUE_DEPTH = LLM_QUEUE_WAIT = None
+
+_logger = logging.getLogger(__name__)
+
+# Owner of the work currently executing; MasterControlPanel sets it per task.
+current_owner: contextvars.ContextVar[str] = contextvars.ContextVar("llm_owner", default="default")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+class TokenBucket:
+    """Thread-safe bucket refilled continuously at `capacity` per minute."""
+
+    def __init__(self, capacity: float):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        if self.level >= cost:
+            return 0.0
+        return (cost - self.level) / self.rate
+
+    def take(self, cost: float) -> None:
+        self.level -= min(cost, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Give back (delta < 0) or charge extra (delta > 0) after the fact."""
+        self.level = min(self.capacity, self.level - delta)
+
+
+_REDIS_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local wait = 0
+local state = {}
+for i = 1, #KEYS do
+  local cap = tonumber(ARGV[2 * i - 1])
+  local cost = math.min(tonumber(ARGV[2 * i]), cap)
+  local v = redis.call('HMGET', KEYS[i], 'level', 'ts')
+  local level = tonumber(v[1]) or cap
+  local ts = tonumber(v[2]) or now
+  level = math.min(cap, level + (now - ts) * cap / 60)
+  if level < cost then
+    wait = math.max(wait, (cost - level) * 60 / cap)
+  end
+  state[i] = level - cost
+end
+if wait > 0 then
+  return tostring(wait)
+end
+for i = 1, #KEYS do
+  redis.call('HSET', KEYS[i], 'level', state[i], 'ts', now)
+  redis.call('EXPIRE', KEYS[i], 120)
+end
+return '0'
+"""
+
+
+class RedisBuckets:
+    """The same rpm/tpm buckets shared across processes through Redis."""
+
+    def __init__(self, url: str, rpm: int, tpm: int, prefix: str = "llm_governor"):
+        self.url = url
+        self.limits = [(f"{prefix}:rpm", rpm), (f"{prefix}:tpm", tpm)]
+        self._clients: Dict[int, object] = {}
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(id(loop))
+        if client is None:
+            client = self._clients[id(loop)] = aioredis.from_url(self.url, decode_responses=True)
+        return client
+
+    async def acquire(self, tokens: int) -> None:
+        keys, args = [], []
+        for (key, cap), cost in zip(self.limits, (1, tokens)):
+            if cap > 0:
+                keys.append(key)
+                args.extend([cap, cost])
+        if not keys:
+            return
+        while True:
+            wait = float(await self._client().eval(_REDIS_BUCKET_LUA, len(keys), *keys, *args))
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, 5.0))
+
+
+class _Waiter:
+    __slots__ = ("owner", "tokens", "future", "loop", "enqueued", "admitted")
+
+    def __init__(self, owner: str, tokens: int, loop: asyncio.AbstractEventLoop):
+        self.owner = owner
+        self.tokens = tokens
+        self.loop = loop
+        self.future = loop.create_future()
+        self.enqueued = time.monotonic()
+        self.admitted = False
+
+
+def _wake(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class Lease:
+    """Handle for an admitted call; report real usage with `record`."""
+
+    def __init__(self, governor: "LLMGovernor", estimated: int, queue_wait: float):
+        self.governor = governor
+        self.estimated = estimated
+        self.queue_wait = queue_wait
+        self.held_by: Optional[asyncio.Future] = None
+
+    def hold_until(self, fut: asyncio.Future) -> None:
+        """Keep the slot past the `slot()` block until `fut` is done.
+
+        For work that can't be interrupted, such as a call running in a
+        thread, which keeps going after its caller has timed out.
+        """
+        self.held_by = fut
+
+    def record(self, total_tokens: Optional[int]) -> None:
+        if total_tokens is None:
+            return
+        self.governor._adjust_tokens(int(total_tokens) - self.estimated)
+
+
+class LLMGovernor:
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None, max_concurrency: Optional[int] = None, redis_url: Optional[str] = None):
+        rpm = _env_int("LLM_RPM_LIMIT", 500) if rpm is None else rpm
+        tpm = _env_int("LLM_TPM_LIMIT", 200000) if tpm is None else tpm
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_concurrency = max(1, max_concurrency or _env_int("LLM_MAX_CONCURRENCY", 8))
+        redis_url = redis_url if redis_url is not None else os.getenv("LLM_GOVERNOR_REDIS_URL")
+        self.redis = RedisBuckets(redis_url, rpm, tpm) if redis_url and aioredis is not None else None
+        self._lock = threading.Lock()
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._inflight = 0
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int, owner: Optional[str] = None) -> AsyncIterator[Lease]:
+        """Wait for a fair turn within the rate limits, then hold a call slot."""
+        waiter = _Waiter(owner or current_owner.get(), max(0, int(estimated_tokens)), asyncio.get_running_loop())
+        with self._lock:
+            self._queues.setdefault(waiter.owner, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except BaseException:
+            with self._lock:
+                if waiter.admitted:
+                    self._inflight -= 1
+                else:
+                    q = self._queues.get(waiter.owner)
+                    if q is not None and waiter in q:
+                        q.remove(waiter)
+                        if not q:
+                            del self._queues[waiter.owner]
+            self._dispatch()
+            raise
+        wait = time.monotonic() - waiter.enqueued
+        try:
+            if LLM_QUEUE_WAIT is not None:
+                LLM_QUEUE_WAIT.observe(wait)
+        except Exception:
+            pass
+        lease = Lease(self, waiter.tokens, wait)
+        try:
+            if self.redis is not None:
+                try:
+                    await self.redis.acquire(waiter.tokens)
+                except Exception:
+                    _logger.warning("Redis LLM governor unavailable; using local limits only", exc_info=True)
+            yield lease
+        finally:
+            held = lease.held_by
+            if held is not None and not held.done():
+                held.add_done_callback(self._release_held)
+            else:
+                self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._inflight -= 1
+        self._dispatch()
+
+    def _release_held(self, fut: asyncio.Future) -> None:
+        if not fut.cancelled():
+            fut.exception()  # nobody awaits a call that outlived its caller
+        self._release()
+
+    def _adjust_tokens(self, delta: int) -> None:
+        if self.tokens is None or not delta:
+            return
+        with self._lock:
+            self.tokens.adjust(delta)
+        if delta < 0:
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit queued waiters round-robin while concurrency and buckets allow."""
+        admitted = []
+        retry_in = None
+        with self._lock:
+            now = time.monotonic()
+            while self._inflight < self.max_concurrency and self._queues:
+                owner, q = next(iter(self._queues.items()))
+                if not q:
+                    del self._queues[owner]
+                    continue
+                w = q[0]
+                if w.future.cancelled():
+                    q.popleft()
+                    continue
+                wait = max(
+                    self.requests.wait_time(1, now) if self.requests else 0.0,
+                    self.tokens.wait_time(w.tokens, now) if self.tokens else 0.0,
+                )
+                if wait > 0:
+                    retry_in = wait
+                    break
+                if self.requests:
+                    self.requests.take(1)
+                if self.tokens:
+                    self.tokens.take(w.tokens)
+                q.popleft()
+                w.admitted = True
+                self._inflight += 1
+                admitted.append(w)
+                # Round-robin: this owner goes to the back of the line
+                if q:
+                    self._queues.move_to_end(owner)
+                else:
+                    del self._queues[owner]
+            if retry_in is not None and self._timer is None:
+                self._timer = threading.Timer(retry_in, self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+            depth = sum(len(q) for q in self._queues.values())
+            inflight = self._inflight
+        for w in admitted:
+            try:
+                w.loop.call_soon_threadsafe(_wake, w.future)
+            except RuntimeError:
+                # Loop already closed; the slot will never be used.
+                with self._lock:
+                    self._inflight -= 1
+        try:
+            if LLM_QUEUE_DEPTH is not None:
+                LLM_QUEUE_DEPTH.set(depth)
+                LLM_INFLIGHT.set(inflight)
+        except Exception:
+            pass
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        self._dispatch()
+
+
+_GOVERNOR: Optional[LLMGovernor] = None
+_GOVERNOR_LOCK = threading.Lock()
+
+
+def get_governor() -> LLMGovernor:
+    global _GOVERNOR
+    with _GOVERNOR_LOCK:
+        if _GOVERNOR is None:
+            _GOVERNOR = LLMGovernor()
+        return _GOVERNOR
@@ -0,0 +1,233 @@
+"""Token-budgeted prompt assembly shared by the CrewAI-backed agents.
+
+Agents describe their prompt as named sections, each with a priority and an
+optional token budget:
+
+    pb = PromptBuilder()
+    pb.add("instructions", "...", priority=0, required=True)
+    pb.add("artifacts", summary, priority=2, budget=1500)
+    prompt = pb.build()
+
+`build` then
+
+1. collapses repeated lines inside a section and drops non-trivial lines
+   already present in a higher-priority section (log tails and diffs often
+   repeat the same lines);
+2. truncates each section to its own budget, keeping its head or tail;
+3. if the total still exceeds the prompt budget (`AGENT_PROMPT_TOKEN_BUDGET`,
+   default 6000), shrinks and then drops the lowest-priority optional
+   sections first. Required sections are only ever truncated, last.
+
+Sections are emitted in the order they were added. Tokens are counted with
+`tiktoken` when installed, otherwise estimated at ~4 characters per token.
+
+Agent prompts are laid out as `compose_prompt(task, suffix)`: a shared task
+context block built only from the task (`shared_prefix`, byte-identical for
+every agent handling the same task) followed by the agent's own role,
+context and instructions. Together with the adapter's fixed system message
+this lets provider-side prefix caching serve every follow-on agent call.
+"""
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+try:
+    import tiktoken  # type: ignore
+except Exception:
+    tiktoken = None
+
+DEFAULT_PROMPT_BUDGET = 6000
+
+# Lines shorter than this (blank lines, "---", headings) are never deduplicated.
+_DEDUPE_MIN_CHARS = 12
+# Markdown table rules and separators stay, so repeated tables keep their shape.
+_STRUCTURAL_RE = re.compile(r"^[\s|:\-=#*_]+$")
+
+# Room left for the "... [N tokens truncated]" marker
+_MARKER_TOKENS = 10
+
+# Default per-section budgets used by `add_task_sections`
+DESCRIPTION_BUDGET = 1000
+FILES_BUDGET = 300
+ARTIFACTS_BUDGET = 1500
+UPSTREAM_BUDGET = 800
+
+_ENCODING = None
+
+
+def _encoding():
+    global _ENCODING
+    if _ENCODING is None and tiktoken is not None:
+        try:
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _ENCODING = False
+    return _ENCODING or None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+
+def prompt_budget() -> int:
+    try:
+        return int(os.getenv("AGENT_PROMPT_TOKEN_BUDGET") or DEFAULT_PROMPT_BUDGET)
+    except ValueError:
+        return DEFAULT_PROMPT_BUDGET
+
+
+def truncate_tokens(text: str, budget: int, keep: str = "head") -> str:
+    """Cut `text` to roughly `budget` tokens on a line boundary, with a marker."""
+    if budget <= 0:
+        return ""
+    total = count_tokens(text)
+    if total <= budget:
+        return text
+    lines = text.splitlines()
+    if keep == "tail":
+        lines = lines[::-1]
+    kept: List[str] = []
+    used = 0
+    room = max(1, budget - _MARKER_TOKENS)
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > room:
+            break
+        kept.append(line)
+        used += cost
+    if not kept and lines:
+        # A single enormous line: fall back to a character cut.
+        chars = room * 4
+        kept = [lines[0][-chars:] if keep == "tail" else lines[0][:chars]]
+    marker = f"... [{max(0, total - used)} tokens truncated]"
+    if keep == "tail":
+        return "\n".join([marker] + kept[::-1])
+    return "\n".join(kept + [marker])
+
+
+@dataclass
+class Section:
+    name: str
+    text: str
+    priority: int
+    budget: Optional[int] = None
+    required: bool = False
+    keep: str = "head"
+    dedupe: bool = True
+
+
+class PromptBuilder:
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget if budget is not None else prompt_budget()
+        self.sections: List[Section] = []
+
+    def add(
+        self,
+        name: str,
+        text: Optional[str],
+        priority: int = 5,
+        budget: Optional[int] = None,
+        required: bool = False,
+        keep: str = "head",
+        dedupe: bool = True,
+    ) -> "PromptBuilder":
+        """Add a section; lower `priority` numbers are kept first. Empty text is skipped."""
+        if text is None or not str(text).strip():
+            return self
+        self.sections.append(Section(name, str(text), priority, budget, required, keep, dedupe))
+        return self
+
+    def _dedupe(self) -> None:
+        seen: Set[str] = set()
+        for sec in sorted(self.sections, key=lambda s: s.priority):
+            if not sec.dedupe:
+                continue
+            out: List[str] = []
+            prev = None
+            for line in sec.text.splitlines():
+                key = line.strip()
+                if key and key == prev:
+                    continue
+                prev = key
+                if len(key) >= _DEDUPE_MIN_CHARS and not _STRUCTURAL_RE.match(key):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                out.append(line)
+            sec.text = "\n".join(out)
+
+    def sizes(self) -> Dict[str, int]:
+        return {s.name: count_tokens(s.text) for s in self.sections}
+
+    def build(self) -> str:
+        self._dedupe()
+        for sec in self.sections:
+            if sec.budget is not None:
+                sec.text = truncate_tokens(sec.text, sec.budget, sec.keep)
+        sizes = {id(s): count_tokens(s.text) for s in self.sections}
+        # Sections are joined with one newline each
+        overflow = sum(sizes.values()) + len(self.sections) - self.budget
+        if overflow > 0:
+            optional = sorted((s for s in self.sections if not s.required), key=lambda s: -s.priority)
+            required = sorted((s for s in self.sections if s.required), key=lambda s: -s.priority)
+            for sec in optional + required:
+                if overflow <= 0:
+                    break
+                have = sizes[id(sec)]
+                target = max(0, have - overflow)
+                # Keep a section only if a useful slice of it survives
+                if not sec.required and target < min(64, have):
+                    target = 0
+                sec.text = truncate_tokens(sec.text, target, sec.keep)
+                new = count_tokens(sec.text)
+                overflow -= have - new
+                sizes[id(sec)] = new
+        return "\n".join(s.text for s in self.sections if s.text)
+
+
+def add_task_sections(pb: PromptBuilder, task: Dict, description_label: str = "Details") -> PromptBuilder:
+    """The task title, description, files and artifacts summary common to every agent."""
+    pb.add("task", f"Task: {task.get('title')}", priority=1, required=True)
+    pb.add("description", f"{description_label}: {task.get('description')}", priority=1, budget=DESCRIPTION_BUDGET, required=True)
+    if task.get("files"):
+        pb.add("files", f"Files: {task.get('files')}", priority=4, budget=FILES_BUDGET)
+    art_sum = task.get("artifact_summary")
+    if art_sum:
+        pb.add("artifacts", "\n=== Attached Test Artifacts Summary ===\n" + str(art_sum), priority=2, budget=ARTIFACTS_BUDGET)
+    return pb
+
+
+def add_upstream_sections(pb: PromptBuilder, task: Dict) -> PromptBuilder:
+    """Findings from agents this one depends on (`task["upstream_results"]`, see agents/core/dag.py)."""
+    for name, output in (task.get("upstream_results") or {}).items():
+        if output:
+            pb.add(f"upstream:{name}", f"=== Findings from {name} ===\n{output}", priority=2, budget=UPSTREAM_BUDGET)
+    return pb
+
+
+# Share of the prompt budget reserved for the shared task context.
+PREFIX_BUDGET_SHARE = 0.6
+
+SHARED_PREFIX_HEADER = "=== Task Context ==="
+SUFFIX_HEADER = "=== Your Role ==="
+
+
+def shared_prefix(task: Dict) -> str:
+    """Task context common to all agents; depends on nothing but the task."""
+    pb = PromptBuilder(budget=int(prompt_budget() * PREFIX_BUDGET_SHARE))
+    pb.add("header", SHARED_PREFIX_HEADER, priority=0, required=True)
+    add_task_sections(pb, task)
+    return pb.build()
+
+
+def compose_prompt(task: Dict, suffix: PromptBuilder) -> str:
+    """Shared prefix first, then the agent-specific suffix in the remaining budget."""
+    prefix = shared_prefix(task)
+    suffix.budget = max(256, prompt_budget() - count_tokens(prefix))
+    return f"{prefix}\n\n{SUFFIX_HEADER}\n{suffix.build()}"
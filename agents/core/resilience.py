@@ -0,0 +1,165 @@
+"""Deadlines, retries and hedging for LLM calls.
+
+`call_with_retries` runs an attempt coroutine factory with:
+
+- jittered exponential backoff ("full jitter") on retryable errors: rate
+  limits, timeouts, connection errors and 5xx responses;
+- optional hedging: when an attempt is still running after the observed p95
+  latency, a second attempt is started and whichever succeeds first wins.
+  With `admission`, an attempt calls `mark_admitted()` once it is past its
+  queue (the governor) and the hedge timer only starts then, so queueing
+  under rate limits doesn't trigger duplicate requests.
+
+Per-attempt deadlines are applied by the caller (`CrewAIAdapter`) inside
+the attempt so time spent queued in the governor doesn't count against the
+request. Settings: `LLM_CALL_TIMEOUT` (60s), `LLM_MAX_RETRIES` (2),
+`LLM_RETRY_BASE` (0.5s), `LLM_RETRY_MAX` (8s), `LLM_HEDGE` (off).
+"""
+import asyncio
+import contextvars
+import os
+import random
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_RETRYABLE_NAMES = {
+    "RateLimitError",
+    "APITimeoutError",
+    "APIConnectionError",
+    "InternalServerError",
+    "ServiceUnavailableError",
+    "Timeout",
+    "TimeoutError",
+    "ConnectionError",
+}
+
+
+# Set by `_hedged` for each attempt it starts; see `mark_admitted`.
+_admitted: contextvars.ContextVar[Optional[asyncio.Event]] = contextvars.ContextVar("llm_admitted", default=None)
+
+
+def mark_admitted() -> None:
+    """Tell the hedging logic that the current attempt has left its queue."""
+    event = _admitted.get()
+    if event is not None:
+        event.set()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+def call_timeout() -> float:
+    return _env_float("LLM_CALL_TIMEOUT", 60.0)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status == 408 or status >= 500
+    return type(exc).__name__ in _RETRYABLE_NAMES
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for the given 0-based retry number."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def p95(self) -> Optional[float]:
+        return self.quantile(0.95)
+
+
+def _start(attempt: Callable[[], Awaitable[T]]) -> "Tuple[asyncio.Future, asyncio.Event]":
+    admitted = asyncio.Event()
+    reset = _admitted.set(admitted)
+    try:
+        # The task copies the current context, so the attempt sees its own event
+        return asyncio.ensure_future(attempt()), admitted
+    finally:
+        _admitted.reset(reset)
+
+
+async def _hedged(attempt: Callable[[], Awaitable[T]], hedge_after: Optional[float], admission: bool = False) -> T:
+    first, admitted = _start(attempt)
+    if hedge_after is None:
+        return await first
+    if admission:
+        # Time spent queued for admission isn't call latency
+        gate = asyncio.ensure_future(admitted.wait())
+        try:
+            await asyncio.wait({first, gate}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            gate.cancel()
+        if first.done():
+            return first.result()
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+    second, _ = _start(attempt)
+    pending = {first, second}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    return fut.result()
+                error = fut.exception()
+        raise error  # type: ignore[misc]
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
+async def call_with_retries(
+    attempt: Callable[[], Awaitable[T]],
+    tracker: Optional[LatencyTracker] = None,
+    retries: Optional[int] = None,
+    hedge: Optional[bool] = None,
+    admission: bool = False,
+) -> T:
+    """Run `attempt()` until it succeeds, retrying retryable failures.
+
+    With `admission`, hedging waits for the attempt's `mark_admitted()`.
+    """
+    retries = int(_env_float("LLM_MAX_RETRIES", 2)) if retries is None else retries
+    if hedge is None:
+        hedge = (os.getenv("LLM_HEDGE") or "").lower() in ("1", "true", "yes", "on")
+    base = _env_float("LLM_RETRY_BASE", 0.5)
+    cap = _env_float("LLM_RETRY_MAX", 8.0)
+    for n in range(retries + 1):
+        hedge_after = tracker.p95() if (hedge and tracker is not None) else None
+        try:
+            return await _hedged(attempt, hedge_after, admission)
+        except Exception as exc:
+            if n >= retries or not is_retryable(exc):
+                raise
+            await asyncio.sleep(backoff_delay(n, base, cap))
+    raise RuntimeError("unreachable")
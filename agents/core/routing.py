@@ -0,0 +1,125 @@
+"""Select which agents run for a task.
+
+Every agent costs a full LLM call, so tasks are routed to a subset:
+
+1. `escalate: true` on the task (or an escalation keyword in its text)
+   runs every agent.
+2. An explicit target wins next: `agents` (list of names), `agent` /
+   `agent_name`, or `agent_id` (the `agents` table row, matched by name;
+   `resolve_agent_name` looks it up off the event loop before routing).
+3. Otherwise agents are scored by keyword hits in title and description,
+   capped at the source's `max_agents`; a source with no hits falls back
+   to its `default_agents`.
+4. Tasks with no matching rule run every agent, as before routing existed.
+
+Rules live in `agents/core/routing.json` (override with `AGENT_ROUTING_CONFIG`);
+set `AGENT_ROUTING=off` to always run every agent.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+_logger = logging.getLogger(__name__)
+
+_DEFAULT_CONFIG = Path(__file__).resolve().parent / "routing.json"
+
+
+@dataclass
+class RoutingDecision:
+    agents: List[str]
+    reason: str
+
+
+def load_routing_config(path: Optional[str] = None) -> Dict[str, Any]:
+    p = Path(path or os.getenv("AGENT_ROUTING_CONFIG") or _DEFAULT_CONFIG)
+    try:
+        with open(p, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except Exception:
+        _logger.warning("Routing config %s unavailable; running all agents", p)
+        return {}
+
+
+def _contains(text: str, phrase: str) -> bool:
+    return re.search(r"\b" + re.escape(phrase.lower()) + r"\b", text) is not None
+
+
+def _agent_name_for_id(agent_id: Any) -> Optional[str]:
+    """Name of the `agents` row referenced by a task's `agent_id`."""
+    try:
+        from mcp.db import SessionLocal
+        from mcp import models
+    except Exception:
+        return None
+    db = SessionLocal()
+    try:
+        row = db.query(models.Agent).filter(models.Agent.id == int(agent_id)).first()
+        return row.name if row else None
+    except Exception:
+        return None
+    finally:
+        db.close()
+
+
+async def resolve_agent_name(task: Dict[str, Any]) -> Dict[str, Any]:
+    """`task` with `agent_name` filled in from its `agent_id`, looked up in a worker thread."""
+    if task.get("agent_id") is None or task.get("agent") or task.get("agent_name") or task.get("agents"):
+        return task
+    name = await asyncio.to_thread(_agent_name_for_id, task["agent_id"])
+    return dict(task, agent_name=name) if name else task
+
+
+class AgentRouter:
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else load_routing_config()
+
+    def route(self, task: Dict[str, Any], available: Sequence[str]) -> RoutingDecision:
+        names = list(available)
+        if (os.getenv("AGENT_ROUTING") or "on").lower() in ("off", "0", "false", "all"):
+            return RoutingDecision(names, "routing disabled")
+
+        text = f"{task.get('title') or ''} {task.get('description') or ''}".lower()
+        if task.get("escalate"):
+            return RoutingDecision(names, "escalated")
+        for kw in self.config.get("escalate_keywords") or []:
+            if _contains(text, kw):
+                return RoutingDecision(names, f"escalated by keyword '{kw}'")
+
+        explicit = self._explicit(task)
+        if explicit:
+            chosen = [n for n in names if n in explicit]
+            if chosen:
+                return RoutingDecision(chosen, "explicit agent")
+            _logger.info("Requested agents %s not available; routing by rules", explicit)
+
+        source = (task.get("source") or "").lower()
+        rule = (self.config.get("sources") or {}).get(source) or {}
+        limit = int(rule.get("max_agents") or self.config.get("max_agents") or len(names))
+        scores = []
+        for name in names:
+            hits = sum(1 for kw in (self.config.get("keywords") or {}).get(name, []) if _contains(text, kw))
+            if hits:
+                scores.append((hits, name))
+        if scores:
+            scores.sort(key=lambda s: (-s[0], names.index(s[1])))
+            return RoutingDecision([n for _, n in scores[:limit]], "keywords")
+        defaults = [n for n in names if n in (rule.get("default_agents") or [])]
+        if defaults:
+            return RoutingDecision(defaults, f"source '{source}' default")
+        return RoutingDecision(names, "no matching rule")
+
+    @staticmethod
+    def _explicit(task: Dict[str, Any]) -> List[str]:
+        wanted = task.get("agents")
+        if isinstance(wanted, str):
+            wanted = [wanted]
+        out = [str(w) for w in (wanted or []) if w]
+        for key in ("agent", "agent_name"):
+            if task.get(key):
+                out.append(str(task[key]))
+        return out
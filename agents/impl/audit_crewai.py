@@ -1,22 +1,27 @@
 from agents.core.crewai_adapter import CrewAIAdapter
 from agents.core.agents import Agent
+from agents.core.prompting import PromptBuilder, add_upstream_sections, compose_prompt
 
 
 class AuditCrewAI(Agent):
+    role = (
+        "You are an audit compliance expert. "
+        "Check the task context above for compliance gaps, required artifacts, and suggest remediation steps."
+    )
+    grounding = ("Ground compliance findings in the provided artifacts summary; "
+                 "do not assume artifacts that are not listed.")
+    closing = "Return findings and priorities."
+
     def __init__(self, name: str = "AuditCrewAI"):
         super().__init__(name)
-        self.adapter = CrewAIAdapter()
+        self.adapter = CrewAIAdapter(agent=name)
 
     async def process(self, task):
-        art_sum = task.get('artifact_summary')
-        art_block = ("\n\n=== Attached Test Artifacts Summary ===\n" + str(art_sum)) if art_sum else ""
-        grounding = ("Ground compliance findings in the provided artifacts summary; "
-                     "do not assume artifacts that are not listed.")
-        prompt = (
-            "You are an audit compliance expert. Check the task context for compliance gaps,"
-            f" required artifacts, and suggest remediation steps.\nTask: {task.get('title')}\n"
-            f"Details: {task.get('description')}\nFiles: {task.get('files')}" + art_block + "\n" + grounding + "\n"
-            "Return findings and priorities."
-        )
+        pb = PromptBuilder()
+        pb.add("instructions", self.role, priority=0, required=True)
+        add_upstream_sections(pb, task)
+        pb.add("grounding", self.grounding, priority=0, required=True)
+        pb.add("closing", self.closing, priority=0, required=True)
+        prompt = compose_prompt(task, pb)
         res = await self.adapter.run(prompt)
         return {"agent": self.name, "result": res.get("text")}
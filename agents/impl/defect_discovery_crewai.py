@@ -1,9 +1,9 @@
 from agents.core.crewai_adapter import CrewAIAdapter
 from agents.core.agents import Agent
+from agents.core.prompting import PromptBuilder, add_upstream_sections, compose_prompt
+from mcp.config_store import rag_config
 import os
-import json
 import logging
-from pathlib import Path
 
 try:
     from qdrant_client import QdrantClient
@@ -11,18 +11,26 @@ except ImportError:
     QdrantClient = None
 
 class DefectDiscoveryCrewAI(Agent):
+    role = "You are an analytics expert. Analyze the provided CI/test logs and repo context to detect patterns."
+    grounding = ("Use the artifacts summary for defect patterns and frequencies; "
+                 "avoid hypothetical examples not supported by the summary.")
+    closing = "Return detected defect patterns, frequency, and suggested mitigations."
+
     def __init__(self, name: str = "DiscoveryCrewAI"):
         super().__init__(name)
-        self.adapter = CrewAIAdapter()
+        self.adapter = CrewAIAdapter(agent=name)
         self.logger = logging.getLogger(name)
 
+    def role_instructions(self, task):
+        # Cross-repo analysis needs the per-product-line context gathered in process()
+        if task.get("product_line"):
+            return None
+        return super().role_instructions(task)
+
     def _load_rag_config(self):
+        # In-memory snapshot shared with the API; re-read only when the file changes
         try:
-            # Assume config is in ../core/rag_config.json relative to this file's parent (impl)
-            config_path = Path(__file__).resolve().parent.parent / "core" / "rag_config.json"
-            if config_path.exists():
-                with open(config_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
+            return rag_config.get()
         except Exception as e:
             self.logger.error(f"Failed to load RAG config: {e}")
         return {}
@@ -62,18 +70,15 @@ class DefectDiscoveryCrewAI(Agent):
                 except Exception as e:
                     self.logger.error(f"Qdrant query failed: {e}")
 
-        art_sum = task.get('artifact_summary')
-        art_block = ("\n\n=== Attached Test Artifacts Summary ===\n" + str(art_sum)) if art_sum else ""
-        grounding = ("Use the artifacts summary for defect patterns and frequencies; "
-                     "avoid hypothetical examples not supported by the summary.")
-        
-        prompt = (
-            "You are an analytics expert. Analyze the provided CI/test logs and repo context to detect patterns.\n"
-            f"Task: {task.get('title')}\nDetails: {task.get('description')}\nFiles: {task.get('files')}\n"
-            f"{extra_context}\n"
-            f"{art_block}\n{grounding}\n"
-            "Return detected defect patterns, frequency, and suggested mitigations."
-            f"{' Note potential cross-service impacts based on the product line context.' if product_line else ''}"
-        )
+        pb = PromptBuilder()
+        pb.add("instructions", self.role, priority=0, required=True)
+        add_upstream_sections(pb, task)
+        pb.add("cross_repo", extra_context, priority=3, budget=500)
+        pb.add("grounding", self.grounding, priority=0, required=True)
+        pb.add("closing", (
+            self.closing
+            + (" Note potential cross-service impacts based on the product line context." if product_line else "")
+        ), priority=0, required=True)
+        prompt = compose_prompt(task, pb)
         res = await self.adapter.run(prompt)
         return {"agent": self.name, "result": res.get("text")}
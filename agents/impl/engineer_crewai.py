@@ -1,16 +1,18 @@
 from agents.core.crewai_adapter import CrewAIAdapter
 from agents.core.agents import Agent
+from agents.core.prompting import PromptBuilder, add_upstream_sections, compose_prompt
+from agents.tools.git_reader import GitRepo, git_dir_for
+from mcp.collection_registry import embed_for_collection
+from mcp.rerank import rerank
+from mcp.vector_store import search_with_fallback
 import asyncio
 import os
-import hashlib
-import subprocess
 import re
 from typing import Optional, List, Dict, Any
 
-try:
-    from qdrant_client import QdrantClient
-except Exception:
-    QdrantClient = None
+# Prompt budgets (tokens) for the engineer's larger context sections
+GIT_CONTEXT_BUDGET = 2500
+FILES_CONTEXT_BUDGET = 800
 
 
 def get_commit_summary(commit_sha: str, repo_path: Optional[str] = None) -> Optional[str]:
@@ -26,34 +28,8 @@ def get_commit_summary(commit_sha: str, repo_path: Optional[str] = None) -> Opti
     try:
         # Use mounted git repo path from environment
         cwd = repo_path or os.getenv("GIT_REPO_PATH") or "/repo"
-        
-        # Get commit metadata and stats
-        result = subprocess.run(
-            ["git", "--git-dir", f"{cwd}/.git", "--work-tree", f"{cwd}/workspace", 
-             "show", commit_sha, "--stat", "--pretty=format:%H%n%an <%ae>%n%ad%n%s%n%b", "--date=iso"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        if result.returncode != 0:
-            return None
-            
-        output = result.stdout
-        
-        # Get file changes with diff summary
-        diff_result = subprocess.run(
-            ["git", "--git-dir", f"{cwd}/.git", "--work-tree", f"{cwd}/workspace",
-             "diff-tree", "--no-commit-id", "--name-status", "-r", commit_sha],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        if diff_result.returncode == 0:
-            output += f"\n\n=== File Changes ===\n{diff_result.stdout}"
-        
-        return output
+        # Served by a pooled, long-lived `git cat-file --batch` reader
+        return GitRepo(git_dir_for(cwd)).commit_summary(commit_sha)
     except Exception as e:
         return f"Error fetching commit: {str(e)}"
 
@@ -75,23 +51,52 @@ def get_file_content(file_path: str, commit_sha: Optional[str] = None, repo_path
         cwd = repo_path or os.getenv("GIT_REPO_PATH") or "/repo"
         
         if commit_sha:
-            cmd = ["git", "--git-dir", f"{cwd}/.git", "show", f"{commit_sha}:{file_path}"]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+            data = GitRepo(git_dir_for(cwd)).file_at(commit_sha, file_path)
+            if data is None:
+                return None
+            content = data.decode("utf-8", "replace")
         else:
             full_path = os.path.join(f"{cwd}/workspace", file_path)
-            result = subprocess.run(["cat", full_path], capture_output=True, text=True, timeout=10)
-        
-        if result.returncode != 0:
-            return None
+            with open(full_path, "r", encoding="utf-8", errors="replace") as fh:
+                content = fh.read()
         
-        lines = result.stdout.splitlines()
+        lines = content.splitlines()
         if len(lines) > max_lines:
             return "\n".join(lines[:max_lines]) + f"\n... ({len(lines) - max_lines} more lines)"
-        return result.stdout
+        return content
     except Exception:
         return None
 
 
+def validate_commit_refs(candidates: List[str], repo_path: Optional[str] = None) -> List[str]:
+    """Keep only candidates that name commits in the repository.
+
+    All candidates are checked in a single batch so hex-looking words in a
+    description never trigger a per-word git lookup.
+    """
+    if not candidates:
+        return []
+    try:
+        cwd = repo_path or os.getenv("GIT_REPO_PATH") or "/repo"
+        return GitRepo(git_dir_for(cwd)).existing(candidates, "commit")
+    except Exception:
+        return []
+
+
+# One scanner for every reference form; explicit prefixes win over bare hex.
+_GIT_REF_RE = re.compile(
+    r"""
+      (?:\bcommit[:\s]+|\bSHA[:\s]+|\#)(?P<ref>[a-f0-9]{7,40})\b
+    | \b(?P<sha>[a-f0-9]{40}|[a-f0-9]{7,9})\b
+    | \bbranch[:\s]+(?P<branch>[a-z0-9/_-]+)
+    | \bon\s+(?P<on_branch>[a-z0-9/_-]+)\s+branch\b
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+_HAS_DIGIT_RE = re.compile(r"[0-9]")
+_HAS_HEX_LETTER_RE = re.compile(r"[a-f]", re.IGNORECASE)
+
+
 def parse_git_references(text: str) -> Dict[str, Any]:
     """Parse git commit references and branch names from task text.
     
@@ -100,6 +105,12 @@ def parse_git_references(text: str) -> Dict[str, Any]:
     - branch:main, branch main
     - SHA: abc123def
     - #37c2ed14
+    - bare full (40) or short (7-9) hex SHAs
+    
+    Bare short SHAs must mix digits and letters, which drops ordinary
+    numbers and words like `deadbeef`; candidates still need
+    `validate_commit_refs` before any lookup. Explicitly prefixed
+    references are listed first, each value once, in order of appearance.
     
     Returns:
         Dict with 'commits' (list), 'branches' (list), 'files' (list)
@@ -109,32 +120,22 @@ def parse_git_references(text: str) -> Dict[str, Any]:
     if not text:
         return result
     
-    # Pattern 1: commit:SHA or commit SHA
-    commit_patterns = [
-        r'commit[:\s]+([a-f0-9]{7,40})',
-        r'SHA[:\s]+([a-f0-9]{7,40})',
-        r'#([a-f0-9]{7,40})',
-        r'\b([a-f0-9]{40})\b',  # full SHA
-        r'\b([a-f0-9]{7,9})\b',  # short SHA (7-9 chars to avoid false positives)
-    ]
-    
-    for pattern in commit_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        result["commits"].extend(matches)
-    
-    # Pattern 2: branch:name or branch name
-    branch_patterns = [
-        r'branch[:\s]+([a-zA-Z0-9/_-]+)',
-        r'on\s+([a-zA-Z0-9/_-]+)\s+branch',
-    ]
-    
-    for pattern in branch_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        result["branches"].extend(matches)
+    explicit: Dict[str, None] = {}
+    bare: Dict[str, None] = {}
+    branches: Dict[str, None] = {}
+    for m in _GIT_REF_RE.finditer(text):
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "ref":
+            explicit[value.lower()] = None
+        elif kind == "sha":
+            if len(value) == 40 or (_HAS_DIGIT_RE.search(value) and _HAS_HEX_LETTER_RE.search(value)):
+                bare[value.lower()] = None
+        else:
+            branches[value] = None
     
-    # Deduplicate
-    result["commits"] = list(set(result["commits"]))
-    result["branches"] = list(set(result["branches"]))
+    result["commits"] = list(explicit) + [c for c in bare if c not in explicit]
+    result["branches"] = list(branches)
     
     return result
 
@@ -145,9 +146,27 @@ class EngineerCodeReviewCrewAI(Agent):
     The agent builds a concise prompt from the task and asks CrewAI to
     produce a review summary and suggested fixes.
     """
+    role = "You are an expert Python engineer. Perform a detailed code review and analysis of the task above.\n"
+    grounding = ("Ground your analysis strictly in the attached artifacts summary when present. "
+                 "If a requested detail is not present, state 'not available from artifacts'. "
+                 "Do not invent test names or counts.")
+    closing = (
+        "Provide:\n"
+        "1. A concise summary of what changed (if commit data available)\n"
+        "2. Key functionality added or modified\n"
+        "3. Potential defects or issues\n"
+        "4. 3-5 concrete suggestions for improvement\n"
+    )
+
     def __init__(self, name: str = "EngineerCrewAI"):
         super().__init__(name)
-        self.adapter = CrewAIAdapter()
+        self.adapter = CrewAIAdapter(agent=name)
+
+    def role_instructions(self, task):
+        # Commit reviews need the git data fetched in process(); run those on their own
+        if parse_git_references(f"{task.get('title', '')} {task.get('description', '')}").get("commits"):
+            return None
+        return super().role_instructions(task)
 
     async def process(self, task):
         import logging
@@ -165,6 +184,8 @@ class EngineerCodeReviewCrewAI(Agent):
         git_context = []
         
         # OPTION 3: If commits are detected, fetch git data directly
+        if git_refs.get("commits"):
+            git_refs["commits"] = await asyncio.to_thread(validate_commit_refs, git_refs["commits"])
         if git_refs.get("commits"):
             for commit_sha in git_refs["commits"][:3]:  # Limit to 3 commits
                 try:
@@ -178,74 +199,51 @@ class EngineerCodeReviewCrewAI(Agent):
                 except Exception as e:
                     logger.exception(f"Error fetching commit {commit_sha}: {e}")
         
-        # OPTION 2: If no git context and no explicit files, try RAG/Qdrant retrieval
+        # OPTION 2: If no git context and no explicit files, try RAG retrieval
+        # (Qdrant, or the embedded local vector store when Qdrant is unavailable)
         if not git_context and not files:
             try:
                 collection = (os.getenv("RAG_COLLECTION") or "rag-poc")
-                qurl = os.getenv("QDRANT_URL") or "http://qdrant:6333"
-                if QdrantClient is not None:
-                    client = QdrantClient(url=qurl)
-                    # craft a simple query vector using a deterministic embedding
-                    query_text = f"{title}\n{desc}"
-                    def _deterministic_embed(text, dim=64):
-                        h = hashlib.sha256(text.encode("utf-8")).digest()
-                        reps = (dim + len(h) - 1) // len(h)
-                        data = (h * reps)[:dim]
-                        vec = [((b / 255.0) * 2.0 - 1.0) for b in data]
-                        # normalize
-                        import math
-                        norm = math.sqrt(sum(v * v for v in vec))
-                        if norm > 0:
-                            vec = [v / norm for v in vec]
-                        return vec
-
-                    qvec = _deterministic_embed(query_text, dim=int(os.getenv("RAG_EMBED_DIM", "64")))
-                    try:
-                        hits = client.search(collection_name=collection, query_vector=qvec, limit=5)
-                        rag_files = []
-                        for h in hits:
-                            payload = h.payload or {}
-                            src = payload.get("path") or payload.get("source") or payload.get("ingested_from")
-                            snippet = (payload.get("page_content") or "").strip().replace("\n", " ")[:800]
-                            rag_files.append(f"{src}: {snippet}")
-                        if rag_files:
-                            files = rag_files
-                    except Exception:
-                        # fall back to empty files list if qdrant search fails
-                        pass
+                # embed with the model the collection was indexed with
+                query_text = f"{title}\n{desc}"
+                qvec = await asyncio.to_thread(embed_for_collection, query_text, collection)
+                try:
+                    top_k = int(os.getenv("RAG_AGENT_TOP_K", "3"))
+                    overfetch = int(os.getenv("RAG_RERANK_OVERFETCH", "4"))
+                    hits = await asyncio.to_thread(search_with_fallback, collection, qvec, top_k * overfetch)
+                    candidates = []
+                    for h in hits:
+                        payload = h.get("payload") or {}
+                        src = payload.get("path") or payload.get("source") or payload.get("ingested_from")
+                        snippet = (payload.get("page_content") or "").strip().replace("\n", " ")[:800]
+                        candidates.append({"source": src, "text": snippet})
+                    # Keep only the best few chunks that fit the prompt budget
+                    budget = int(os.getenv("RAG_AGENT_TOKEN_BUDGET", "600"))
+                    selected = await asyncio.to_thread(rerank, query_text, candidates, top_k, budget)
+                    rag_files = [f"{c['source']}: {c['text']}" for c in selected]
+                    if rag_files:
+                        files = rag_files
+                except Exception:
+                    logger.warning("RAG retrieval failed for collection %s; continuing without it", collection, exc_info=True)
             except Exception:
                 pass
         
-        # Build enhanced prompt with git context, artifacts summary, RAG files, or explicit files
-        context_parts = []
-        art_sum = task.get("artifact_summary")
-        if art_sum:
-            context_parts.append("=== Attached Test Artifacts Summary ===")
-            context_parts.append(str(art_sum))
+        # Shared task context first (cacheable across agents), then the engineer's
+        # own budgeted sections: git context and RAG files
+        pb = PromptBuilder()
+        pb.add("instructions", self.role, priority=0, required=True)
+        add_upstream_sections(pb, task)
         if git_context:
-            context_parts.append("=== Git Commit Data ===")
-            context_parts.extend(git_context)
-        if files:
-            context_parts.append(f"\n=== Relevant Files ===\n{files}")
-        
-        context_str = "\n".join(context_parts) if context_parts else "No specific context available"
-        
-        grounding = ("Ground your analysis strictly in the attached artifacts summary when present. "
-                     "If a requested detail is not present, state 'not available from artifacts'. "
-                     "Do not invent test names or counts.")
-
-        prompt = (
-            f"You are an expert Python engineer. Perform a detailed code review and analysis.\n\n"
-            f"Task: {title}\n"
-            f"Description: {desc}\n\n"
-            f"{context_str}\n\n"
-            f"{grounding}\n\n"
-            f"Provide:\n"
-            f"1. A concise summary of what changed (if commit data available)\n"
-            f"2. Key functionality added or modified\n"
-            f"3. Potential defects or issues\n"
-            f"4. 3-5 concrete suggestions for improvement\n"
-        )
+            pb.add("git", "=== Git Commit Data ===\n" + "\n".join(git_context), priority=2, budget=GIT_CONTEXT_BUDGET)
+        if files and files is not task.get("files"):
+            # RAG snippets; explicit task files are already in the shared prefix
+            pb.add("files", f"\n=== Relevant Files ===\n{files}", priority=3, budget=FILES_CONTEXT_BUDGET)
+        if not (task.get("artifact_summary") or git_context or files):
+            pb.add("context", "No specific context available", priority=1)
+        pb.add("grounding", f"\n{self.grounding}\n", priority=0, required=True)
+        pb.add("closing", self.closing, priority=0, required=True)
+        prompt = compose_prompt(task, pb)
+        logger.info("Prompt suffix sections (tokens): %s", pb.sizes())
         
         # OPTION 1: Delegate to adapter (uses OpenAI if OPENAI_API_KEY is set, otherwise stub)
         res = await self.adapter.run(prompt)
@@ -1,22 +1,27 @@
 from agents.core.crewai_adapter import CrewAIAdapter
 from agents.core.agents import Agent
+from agents.core.prompting import PromptBuilder, add_upstream_sections, compose_prompt
 
 
 class PerformanceMetricsCrewAI(Agent):
+    role = (
+        "You are a performance engineer. "
+        "Given the task context above, summarize performance implications, identify metrics to monitor, and suggest thresholds/alerts."
+    )
+    grounding = ("Use the artifact summary data (pass/fail counts, coverage) when present; "
+                 "do not fabricate metrics.")
+    closing = "Return items as bullet list."
+
     def __init__(self, name: str = "PerfMetricsCrewAI"):
         super().__init__(name)
-        self.adapter = CrewAIAdapter()
+        self.adapter = CrewAIAdapter(agent=name)
 
     async def process(self, task):
-        art_sum = task.get('artifact_summary')
-        art_block = ("\n\n=== Attached Test Artifacts Summary ===\n" + str(art_sum)) if art_sum else ""
-        grounding = ("Use the artifact summary data (pass/fail counts, coverage) when present; "
-                     "do not fabricate metrics.")
-        prompt = (
-            "You are a performance engineer. Given the task context, summarize performance implications,"
-            f" identify metrics to monitor, and suggest thresholds/alerts.\nTask: {task.get('title')}\n"
-            f"Details: {task.get('description')}\nFiles: {task.get('files')}" + art_block + "\n" + grounding + "\n"
-            "Return items as bullet list."
-        )
+        pb = PromptBuilder()
+        pb.add("instructions", self.role, priority=0, required=True)
+        add_upstream_sections(pb, task)
+        pb.add("grounding", self.grounding, priority=0, required=True)
+        pb.add("closing", self.closing, priority=0, required=True)
+        prompt = compose_prompt(task, pb)
         res = await self.adapter.run(prompt)
         return {"agent": self.name, "result": res.get("text")}
@@ -1,22 +1,27 @@
 from agents.core.crewai_adapter import CrewAIAdapter
 from agents.core.agents import Agent
+from agents.core.prompting import PromptBuilder, add_upstream_sections, compose_prompt
 
 
 class RequirementsTracingCrewAI(Agent):
+    role = (
+        "You are a requirements tracing expert. Given the task above and available artifacts,\n"
+        "link requirements to tests and code areas and flag missing traceability."
+    )
+    grounding = ("Base trace links on the artifacts summary where applicable; "
+                 "call out unavailable mappings explicitly.")
+    closing = "Provide a mapping and any gaps."
+
     def __init__(self, name: str = "RequirementsCrewAI"):
         super().__init__(name)
-        self.adapter = CrewAIAdapter()
+        self.adapter = CrewAIAdapter(agent=name)
 
     async def process(self, task):
-        art_sum = task.get('artifact_summary')
-        art_block = ("\n\n=== Attached Test Artifacts Summary ===\n" + str(art_sum)) if art_sum else ""
-        grounding = ("Base trace links on the artifacts summary where applicable; "
-                     "call out unavailable mappings explicitly.")
-        prompt = (
-            "You are a requirements tracing expert. Given the task and available artifacts,\n"
-            f"link requirements to tests and code areas and flag missing traceability.\nTask: {task.get('title')}\n"
-            f"Details: {task.get('description')}\nFiles: {task.get('files')}" + art_block + "\n" + grounding + "\n"
-            "Provide a mapping and any gaps."
-        )
+        pb = PromptBuilder()
+        pb.add("instructions", self.role, priority=0, required=True)
+        add_upstream_sections(pb, task)
+        pb.add("grounding", self.grounding, priority=0, required=True)
+        pb.add("closing", self.closing, priority=0, required=True)
+        prompt = compose_prompt(task, pb)
         res = await self.adapter.run(prompt)
         return {"agent": self.name, "result": res.get("text")}
@@ -59,10 +59,10 @@ def process_local_task(task_payload: dict):
             results = asyncio.run(m.handle_task(task_payload))
             # Persist results to DB so the API/SSE consumers can observe activity
             try:
-                from mcp.db import SessionLocal
+                from mcp.db import run_write_sync
                 from mcp import models
-                db = SessionLocal()
-                try:
+
+                def _persist_results(db):
                     for agent_name, content in (results or {}).items():
                         try:
                             agent_obj = None
@@ -84,18 +84,9 @@ def process_local_task(task_payload: dict):
                             db.add(t)
                     except Exception:
                         pass
-                    try:
-                        db.commit()
-                    except Exception:
-                        try:
-                            db.rollback()
-                        except Exception:
-                            pass
-                finally:
-                    try:
-                        db.close()
-                    except Exception:
-                        pass
+
+                # one transaction, through the SQLite writer thread when enabled
+                run_write_sync(_persist_results)
             except Exception:
                 # best-effort; do not let DB persistence break worker execution
                 pass
@@ -8,7 +8,8 @@ from typing import Callable, Optional
 
 # Try to import models and db, assuming they are available in the python path
 try:
-    from mcp.db import SessionLocal
+    from sqlalchemy import update
+    from mcp.db import SessionLocal, run_write
     from mcp.models import ScheduledTask
 except ImportError:
     SessionLocal = None
@@ -64,11 +65,13 @@ class DatabaseScheduler:
         db = SessionLocal()
         try:
             now = datetime.utcnow()
-            # Find due tasks
-            due_tasks = db.query(ScheduledTask).filter(
-                ScheduledTask.is_active == True,
-                (ScheduledTask.next_run_at <= now) | (ScheduledTask.next_run_at == None)
-            ).all()
+            # Find due tasks: two range seeks on ix_scheduled_tasks_due rather
+            # than one OR that only uses the is_active prefix
+            active = db.query(ScheduledTask).filter(ScheduledTask.is_active == True)
+            due_tasks = (
+                active.filter(ScheduledTask.next_run_at == None).all()
+                + active.filter(ScheduledTask.next_run_at <= now).all()
+            )
 
             for task in due_tasks:
                 await self._process_task(db, task, now)
@@ -111,8 +114,17 @@ class DatabaseScheduler:
             except Exception as e:
                 self.logger.error("Error calculating cron next run for task %s: %s", task_record.id, e)
                 task_record.is_active = False
-        
-        db.commit()
+
+        # The read session is never committed; the new schedule is written
+        # through run_write so SQLite deployments use the single writer.
+        values = {
+            "last_run_at": task_record.last_run_at,
+            "next_run_at": task_record.next_run_at,
+            "is_active": task_record.is_active,
+        }
+        await run_write(
+            lambda w: w.execute(update(ScheduledTask).where(ScheduledTask.id == task_record.id).values(**values))
+        )
 
 # Alias for backward compatibility if needed, though we should update mcp.py to use DatabaseScheduler
 SimpleScheduler = DatabaseScheduler
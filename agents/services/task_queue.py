@@ -3,11 +3,15 @@
 This is a minimal implementation suitable for CI and local development.
 It exposes `enqueue(task)` and `start(worker_callable)` to begin
 processing tasks. The worker_callable should be an async callable that
-accepts the task dict.
+accepts the task dict. Tasks cancelled or superseded while still queued
+(see agents/core/cancellation.py) are dropped without running.
 """
 import asyncio
+import logging
 from typing import Any, Callable, Optional
 
+from agents.core.cancellation import get_registry, task_key
+
 
 class TaskQueue:
     def __init__(self):
@@ -19,6 +23,11 @@ class TaskQueue:
         while self._running:
             task = await self._queue.get()
             try:
+                key = task_key(task) if isinstance(task, dict) else None
+                if key is not None and get_registry().is_cancelled(key):
+                    logging.info("TaskQueue: skipping cancelled task %s", key)
+                    get_registry().discard(key)
+                    continue
                 await worker_callable(task)
             except Exception:
                 # swallow errors here; worker_callable should log
@@ -42,5 +51,5 @@ class TaskQueue:
             self._worker_task.cancel()
             try:
                 await self._worker_task
-            except Exception:
+            except (asyncio.CancelledError, Exception):
                 pass
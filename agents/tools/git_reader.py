@@ -0,0 +1,438 @@
+"""Long-lived git object access for agent git lookups.
+
+Agents used to fork `git show` / `git diff-tree` (and `cat`) for every
+commit and file referenced by a task. This module keeps persistent
+`git cat-file --batch` processes per repository instead, handed out from a
+small pool so concurrent tasks don't serialize on one pipe.
+
+Commit metadata, blobs and trees are read through the batch protocol;
+name-status and `--stat` style summaries are computed in Python by walking
+the commit's tree against its first parent, so a commit summary costs no
+extra process.
+
+Pool size per repository is `GIT_READER_POOL_SIZE` (default 4).
+
+Everything addressed by a full SHA (objects, commit summaries, `sha:path`
+blobs) goes through the shared `object_cache`, so repeat analyses of a
+commit make no git calls at all.
+"""
+import atexit
+import difflib
+from collections import Counter
+import os
+import queue
+import re
+import subprocess
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from agents.tools.object_cache import ObjectCache, get_object_cache
+
+# Blobs larger than this are reported as binary in stat output instead of diffed.
+_MAX_STAT_BYTES = 512 * 1024
+# SequenceMatcher is quadratic; past this many (old x new) changed lines the
+# counts come from a linear multiset comparison instead (exact unless lines moved).
+_MAX_STAT_CELLS = 1_000_000
+
+_FULL_SHA_RE = re.compile(r"[0-9a-f]{40}")
+_SHORT_SHA_RE = re.compile(r"[0-9a-fA-F]{4,39}")
+
+
+class GitObjectReader:
+    """One `git cat-file --batch` process bound to a single git dir."""
+
+    def __init__(self, git_dir: str):
+        self.git_dir = git_dir
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+
+    def _start(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                ["git", "--git-dir", self.git_dir, "cat-file", "--batch"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        return self._proc
+
+    def read(self, spec: str) -> Optional[Tuple[str, str, bytes]]:
+        """Return `(sha, type, content)` for a revision spec, or None if missing.
+
+        `spec` is anything `git cat-file` accepts: a (short) SHA, a ref, or
+        `<rev>:<path>`.
+        """
+        if not spec or "\n" in spec:
+            return None
+        with self._lock:
+            try:
+                return self._read(spec)
+            except (OSError, ValueError):
+                # Broken pipe or a desynced stream: drop the process and retry once.
+                self.close()
+                return self._read(spec)
+
+    def _read(self, spec: str) -> Optional[Tuple[str, str, bytes]]:
+        proc = self._start()
+        proc.stdin.write(spec.encode("utf-8") + b"\n")
+        proc.stdin.flush()
+        header = proc.stdout.readline()
+        if not header:
+            raise OSError("git cat-file exited")
+        parts = header.decode("utf-8", "replace").rstrip("\n").rsplit(" ", 2)
+        if parts[-1] in ("missing", "ambiguous") or len(parts) != 3:
+            return None
+        sha, kind, size = parts[0], parts[1], int(parts[2])
+        content = proc.stdout.read(size)
+        proc.stdout.read(1)  # trailing LF
+        if len(content) != size:
+            raise OSError("short read from git cat-file")
+        return sha, kind, content
+
+    def close(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+
+
+class GitReaderPool:
+    """Bounded set of readers for one repository."""
+
+    def __init__(self, git_dir: str, size: Optional[int] = None):
+        self.git_dir = git_dir
+        self.size = max(1, size or int(os.getenv("GIT_READER_POOL_SIZE", "4")))
+        self._idle: "queue.LifoQueue[GitObjectReader]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._all: List[GitObjectReader] = []
+
+    @contextmanager
+    def reader(self) -> Iterator[GitObjectReader]:
+        r = None
+        try:
+            r = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    r = GitObjectReader(self.git_dir)
+                    self._all.append(r)
+            if r is None:
+                r = self._idle.get()
+        try:
+            yield r
+        finally:
+            self._idle.put(r)
+
+    def close(self) -> None:
+        for r in self._all:
+            r.close()
+
+
+_POOLS: Dict[str, GitReaderPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(git_dir: str) -> GitReaderPool:
+    key = os.path.abspath(git_dir)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = GitReaderPool(key)
+        return pool
+
+
+@atexit.register
+def close_all() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for p in pools:
+        p.close()
+
+
+# -- object parsing ------------------------------------------------------
+
+def parse_commit(raw: bytes) -> Dict[str, object]:
+    """Split a raw commit object into headers, parents and message."""
+    text = raw.decode("utf-8", "replace")
+    head, _, message = text.partition("\n\n")
+    info: Dict[str, object] = {"parents": [], "message": message}
+    for line in head.splitlines():
+        key, _, value = line.partition(" ")
+        if key == "parent":
+            info["parents"].append(value)  # type: ignore[union-attr]
+        elif key in ("tree", "author", "committer"):
+            info[key] = value
+    return info
+
+
+def parse_tree(raw: bytes) -> List[Tuple[str, str, str]]:
+    """Return `(mode, name, sha)` entries of a raw tree object."""
+    entries = []
+    i = 0
+    n = len(raw)
+    while i < n:
+        sp = raw.index(b" ", i)
+        nul = raw.index(b"\0", sp)
+        mode = raw[i:sp].decode("ascii")
+        name = raw[sp + 1:nul].decode("utf-8", "replace")
+        sha = raw[nul + 1:nul + 21].hex()
+        entries.append((mode, name, sha))
+        i = nul + 21
+    return entries
+
+
+def split_ident(ident: str) -> Tuple[str, str]:
+    """`Name <email> 1700000000 +0100` -> (`Name <email>`, ISO date like `git --date=iso`)."""
+    who, _, stamp = ident.rpartition("> ")
+    who = who + ">" if who else ident
+    try:
+        secs, tz = stamp.split()
+        sign = -1 if tz.startswith("-") else 1
+        offset = timedelta(hours=int(tz[1:3]), minutes=int(tz[3:5])) * sign
+        when = datetime.fromtimestamp(int(secs), timezone(offset))
+        return who, when.strftime("%Y-%m-%d %H:%M:%S ") + tz
+    except Exception:
+        return who, stamp
+
+
+# -- repository facade ---------------------------------------------------
+
+class GitRepo:
+    """Read-only view of a repository backed by a reader pool."""
+
+    def __init__(self, git_dir: str, cache: Optional[ObjectCache] = None):
+        self.git_dir = os.path.abspath(git_dir)
+        self.pool = get_pool(git_dir)
+        self.cache = cache if cache is not None else get_object_cache()
+
+    def read(self, spec: str) -> Optional[Tuple[str, str, bytes]]:
+        if _FULL_SHA_RE.fullmatch(spec):
+            hit = self.cache.get(f"obj:{spec}")
+            if hit is not None:
+                return hit
+        with self.pool.reader() as r:
+            obj = r.read(spec)
+        if obj is not None:
+            # Whatever the spec, the object itself is content-addressed.
+            self.cache.put(f"obj:{obj[0]}", obj)
+        return obj
+
+    def resolve(self, rev: str) -> Optional[str]:
+        """Full SHA for `rev`; abbreviated SHAs are remembered per repository.
+
+        Refs (`HEAD`, branch names) are mutable and always go to git.
+        """
+        if _FULL_SHA_RE.fullmatch(rev):
+            return rev
+        alias_key = None
+        if _SHORT_SHA_RE.fullmatch(rev):
+            alias_key = f"alias:{self.git_dir}:{rev.lower()}"
+            hit = self.cache.get(alias_key)
+            if hit is not None:
+                return hit
+        obj = self.read(rev)
+        if obj is None:
+            return None
+        if alias_key:
+            self.cache.put(alias_key, obj[0])
+        return obj[0]
+
+    def existing(self, revs: List[str], kind: str = "commit") -> List[str]:
+        """Subset of `revs` naming an object of type `kind`, order preserved.
+
+        Cached resolutions answer without git; the remaining candidates are
+        checked together in one `git cat-file --batch-check` run.
+        """
+        found: Dict[str, str] = {}
+        unknown = []
+        for rev in revs:
+            if _FULL_SHA_RE.fullmatch(rev):
+                hit = self.cache.get(f"obj:{rev}")
+            elif _SHORT_SHA_RE.fullmatch(rev):
+                sha = self.cache.get(f"alias:{self.git_dir}:{rev.lower()}")
+                hit = self.cache.get(f"obj:{sha}") if sha else None
+            else:
+                hit = None
+            if hit is not None:
+                if hit[1] == kind:
+                    found[rev] = hit[0]
+            elif "\n" not in rev:
+                unknown.append(rev)
+        if unknown:
+            try:
+                proc = subprocess.run(
+                    ["git", "--git-dir", self.git_dir, "cat-file", "--batch-check"],
+                    input="\n".join(unknown) + "\n",
+                    capture_output=True,
+                    text=True,
+                    timeout=10,
+                )
+                replies = proc.stdout.splitlines()
+            except (OSError, subprocess.SubprocessError):
+                replies = []
+            for rev, reply in zip(unknown, replies):
+                parts = reply.rsplit(" ", 2)
+                if len(parts) == 3 and parts[1] == kind:
+                    found[rev] = parts[0]
+                    if _SHORT_SHA_RE.fullmatch(rev):
+                        self.cache.put(f"alias:{self.git_dir}:{rev.lower()}", parts[0])
+        return [rev for rev in revs if rev in found]
+
+    def _diff_trees(self, old_tree: Optional[str], new_tree: Optional[str], prefix: str = "") -> List[Tuple[str, str, Optional[str], Optional[str]]]:
+        """`(status, path, old_sha, new_sha)` for blobs that differ between two trees.
+
+        Identical subtrees are skipped by SHA without being read.
+        """
+        if old_tree == new_tree:
+            return []
+        old = {name: (mode, sha) for mode, name, sha in self._entries(old_tree)}
+        new = {name: (mode, sha) for mode, name, sha in self._entries(new_tree)}
+        changes: List[Tuple[str, str, Optional[str], Optional[str]]] = []
+        for name in sorted(set(old) | set(new)):
+            o, n = old.get(name), new.get(name)
+            path = f"{prefix}{name}"
+            o_dir = o is not None and o[0] == "40000"
+            n_dir = n is not None and n[0] == "40000"
+            if o_dir or n_dir:
+                changes.extend(self._diff_trees(o[1] if o_dir else None, n[1] if n_dir else None, path + "/"))
+                # A file replaced by a directory (or vice versa) at the same name
+                if o is not None and not o_dir:
+                    changes.append(("D", path, o[1], None))
+                if n is not None and not n_dir:
+                    changes.append(("A", path, None, n[1]))
+            elif o is None:
+                changes.append(("A", path, None, n[1]))
+            elif n is None:
+                changes.append(("D", path, o[1], None))
+            elif o != n:
+                changes.append(("M", path, o[1], n[1]))
+        return changes
+
+    def _entries(self, tree_sha: Optional[str]) -> List[Tuple[str, str, str]]:
+        if not tree_sha:
+            return []
+        obj = self.read(tree_sha)
+        if obj is None or obj[1] != "tree":
+            return []
+        return parse_tree(obj[2])
+
+    def _blob_lines(self, sha: Optional[str]) -> Optional[List[str]]:
+        if not sha:
+            return []
+        obj = self.read(sha)
+        if obj is None:
+            return []
+        data = obj[2]
+        if len(data) > _MAX_STAT_BYTES or b"\0" in data[:8000]:
+            return None
+        return data.decode("utf-8", "replace").splitlines()
+
+    def _line_stat(self, old_sha: Optional[str], new_sha: Optional[str]) -> Optional[Tuple[int, int]]:
+        a, b = self._blob_lines(old_sha), self._blob_lines(new_sha)
+        if a is None or b is None:
+            return None
+        # Only the middle between the common prefix and suffix needs diffing
+        start = 0
+        while start < len(a) and start < len(b) and a[start] == b[start]:
+            start += 1
+        end_a, end_b = len(a), len(b)
+        while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+            end_a -= 1
+            end_b -= 1
+        a, b = a[start:end_a], b[start:end_b]
+        if len(a) * len(b) > _MAX_STAT_CELLS:
+            old, new = Counter(a), Counter(b)
+            return sum((new - old).values()), sum((old - new).values())
+        added = deleted = 0
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+            if tag in ("replace", "delete"):
+                deleted += i2 - i1
+            if tag in ("replace", "insert"):
+                added += j2 - j1
+        return added, deleted
+
+    def commit_summary(self, rev: str) -> Optional[str]:
+        """Metadata, `--stat` block and name-status list for one commit.
+
+        Mirrors the layout previously produced by `git show --stat
+        --pretty=format:%H%n%an <%ae>%n%ad%n%s%n%b --date=iso` followed by
+        `git diff-tree --name-status -r`. Merge commits are diffed against
+        their first parent; root commits against the empty tree.
+        """
+        sha = self.resolve(rev)
+        if sha is None:
+            return None
+        key = f"summary:{sha}"
+        out = self.cache.get(key)
+        if out is None:
+            out = self._build_summary(sha)
+            self.cache.put(key, out)
+        return out
+
+    def _build_summary(self, rev: str) -> Optional[str]:
+        obj = self.read(rev)
+        if obj is None or obj[1] != "commit":
+            return None
+        sha, _, raw = obj
+        info = parse_commit(raw)
+        author, date = split_ident(str(info.get("author") or ""))
+        subject, _, body = str(info["message"]).partition("\n")
+        parents = info["parents"]
+        parent_tree = None
+        if parents:
+            pobj = self.read(parents[0])  # type: ignore[index]
+            if pobj is not None:
+                parent_tree = parse_commit(pobj[2]).get("tree")
+        changes = self._diff_trees(parent_tree, info.get("tree"))  # type: ignore[arg-type]
+
+        lines = [sha, author, date, subject, body.strip("\n")]
+        stat_lines = []
+        total_add = total_del = 0
+        width = max((len(p) for _, p, _, _ in changes), default=0)
+        for _, path, old_sha, new_sha in changes:
+            stat = self._line_stat(old_sha, new_sha)
+            if stat is None:
+                stat_lines.append(f" {path.ljust(width)} | Bin")
+                continue
+            added, deleted = stat
+            total_add += added
+            total_del += deleted
+            stat_lines.append(f" {path.ljust(width)} | {added + deleted} {'+' * min(added, 40)}{'-' * min(deleted, 40)}".rstrip())
+        out = "\n".join(lines)
+        if changes:
+            summary = f" {len(changes)} file{'s' if len(changes) != 1 else ''} changed"
+            if total_add:
+                summary += f", {total_add} insertion{'s' if total_add != 1 else ''}(+)"
+            if total_del:
+                summary += f", {total_del} deletion{'s' if total_del != 1 else ''}(-)"
+            out += "\n\n" + "\n".join(stat_lines) + "\n" + summary
+        name_status = "".join(f"{status}\t{path}\n" for status, path, _, _ in changes)
+        out += f"\n\n=== File Changes ===\n{name_status}"
+        return out
+
+    def file_at(self, rev: str, path: str) -> Optional[bytes]:
+        sha = self.resolve(rev)
+        if sha is None:
+            return None
+        key = f"blob:{sha}:{path}"
+        data = self.cache.get(key)
+        if data is None:
+            obj = self.read(f"{sha}:{path}")
+            # A path missing at a commit stays missing; remember that too.
+            data = obj[2] if obj is not None and obj[1] == "blob" else False
+            self.cache.put(key, data)
+        return data if data is not False else None
+
+
+def git_dir_for(repo_path: str) -> str:
+    """Agents mount repositories as `<path>/.git` plus `<path>/workspace`."""
+    return os.path.join(repo_path, ".git")
@@ -0,0 +1,139 @@
+"""Process-wide cache for immutable git data.
+
+Commit summaries, trees and `sha:path` blobs are keyed by full object SHA,
+so entries never go stale and never need invalidation. The in-memory tier
+is an LRU bounded by bytes (`GIT_OBJECT_CACHE_BYTES`, default 64 MiB);
+when `GIT_OBJECT_CACHE_DIR` is set, evicted entries spill to disk there and
+are promoted back on the next hit.
+
+Only callers that have resolved a full SHA should store anything here;
+refs such as `HEAD` or branch names are mutable and must not be used as keys.
+"""
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _sizeof(value: Any) -> int:
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value) + 16 * len(value)
+    return 64
+
+
+class ObjectCache:
+    """Byte-bounded LRU with optional disk spill."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, spill_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self._items: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _spill_path(self, key: str) -> Path:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.spill_dir / digest[:2] / digest  # type: ignore[operator]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        value = self._load_spilled(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.put(key, value)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        if value is None:
+            return
+        size = _sizeof(value) + len(key)
+        spill = []
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                # Too large for memory; keep it only on disk.
+                spill.append((key, value))
+            else:
+                self._items[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes and self._items:
+                    k, (v, s) = self._items.popitem(last=False)
+                    self._bytes -= s
+                    spill.append((k, v))
+        for k, v in spill:
+            self._spill(k, v)
+
+    def _spill(self, key: str, value: Any) -> None:
+        if self.spill_dir is None:
+            return
+        path = self._spill_path(key)
+        if path.exists():
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "wb") as fh:
+                pickle.dump((key, value), fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _load_spilled(self, key: str) -> Optional[Any]:
+        if self.spill_dir is None:
+            return None
+        try:
+            with open(self._spill_path(key), "rb") as fh:
+                stored_key, value = pickle.load(fh)
+        except Exception:
+            return None
+        return value if stored_key == key else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+_CACHE: Optional[ObjectCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_object_cache() -> ObjectCache:
+    """The cache shared by every agent in this process."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            try:
+                max_bytes = int(os.getenv("GIT_OBJECT_CACHE_BYTES") or DEFAULT_MAX_BYTES)
+            except ValueError:
+                max_bytes = DEFAULT_MAX_BYTES
+            _CACHE = ObjectCache(max_bytes, os.getenv("GIT_OBJECT_CACHE_DIR") or None)
+        return _CACHE
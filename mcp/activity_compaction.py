@@ -0,0 +1,205 @@
+"""Activity compaction and retention.
+
+Every task run adds `Activity` rows holding full agent outputs, so the
+`activities` table (and its indexes and backups) grows without bound. The
+compaction job works through old rows in chunks of
+ACTIVITY_COMPACTION_BATCH (500), one short write transaction per chunk:
+
+- rows older than ACTIVITY_COMPRESS_AFTER_DAYS (7) keep a `summary` and
+  move their `content` into gzip'd `content_gz`;
+- rows older than ACTIVITY_RETENTION_DAYS (90) move their payload to the
+  `activities_archive` table and stay behind as summary rows (`archived`).
+
+Either step is disabled with 0. Summaries keep task timelines unchanged
+(see `mcp.api._activity_page`), and `load_contents` restores full content
+from whichever place it lives in, so old activity is still served on demand.
+
+The API process runs the job every ACTIVITY_COMPACTION_INTERVAL_SECONDS
+(3600; 0 disables) via `CompactionJob`; `python -m mcp.activity_compaction`
+runs one pass, e.g. from cron.
+"""
+import asyncio
+import gzip
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import insert, or_, select, update
+
+from mcp import models
+from mcp.db import init_db, run_write_sync
+
+_logger = logging.getLogger(__name__)
+
+# Characters of content shown as an activity summary
+SUMMARY_CHARS = int(os.getenv("ACTIVITY_SUMMARY_CHARS", "280"))
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+def compress(text: Optional[str]) -> Optional[bytes]:
+    if text is None:
+        return None
+    return gzip.compress(text.encode("utf-8"), compresslevel=6)
+
+
+def decompress(blob: Optional[bytes]) -> Optional[str]:
+    if blob is None:
+        return None
+    return gzip.decompress(blob).decode("utf-8")
+
+
+def summarize(text: Optional[str]) -> str:
+    # One character past SUMMARY_CHARS is kept so readers can tell the summary was cut
+    return (text or "")[:SUMMARY_CHARS + 1]
+
+
+def load_contents(rows: Iterable, archived: Dict[int, Optional[bytes]]) -> Dict[int, Optional[str]]:
+    """Full content per activity id for rows with `id, content, content_gz, archived`.
+
+    `archived` maps activity ids to their `activities_archive.content_gz`.
+    """
+    out: Dict[int, Optional[str]] = {}
+    for r in rows:
+        if r.content is not None:
+            out[r.id] = r.content
+        elif r.content_gz is not None:
+            out[r.id] = decompress(r.content_gz)
+        elif r.archived:
+            out[r.id] = decompress(archived.get(r.id))
+        else:
+            out[r.id] = None
+    return out
+
+
+def _not_archived():
+    A = models.Activity
+    return or_(A.archived.is_(None), A.archived.is_(False))
+
+
+def _archive_chunk(db, cutoff: datetime, after: int, batch: int) -> Tuple[int, Optional[int]]:
+    A = models.Activity
+    rows = db.execute(
+        select(A.id, A.task_id, A.agent_id, A.content, A.content_gz, A.summary, A.created_at)
+        .where(A.id > after, A.created_at < cutoff, _not_archived())
+        .order_by(A.id)
+        .limit(batch)
+    ).all()
+    if not rows:
+        return 0, None
+    db.execute(insert(models.ActivityArchive), [
+        {
+            "activity_id": r.id,
+            "task_id": r.task_id,
+            "agent_id": r.agent_id,
+            "content_gz": r.content_gz if r.content_gz is not None else compress(r.content),
+            "created_at": r.created_at,
+        }
+        for r in rows
+    ])
+    db.execute(update(A), [
+        {
+            "id": r.id,
+            "content": None,
+            "content_gz": None,
+            "summary": r.summary if r.summary is not None else summarize(r.content),
+            "archived": True,
+        }
+        for r in rows
+    ])
+    return len(rows), (rows[-1].id if len(rows) == batch else None)
+
+
+def _compress_chunk(db, cutoff: datetime, after: int, batch: int) -> Tuple[int, Optional[int]]:
+    A = models.Activity
+    rows = db.execute(
+        select(A.id, A.content)
+        .where(A.id > after, A.created_at < cutoff, A.content.isnot(None), _not_archived())
+        .order_by(A.id)
+        .limit(batch)
+    ).all()
+    if not rows:
+        return 0, None
+    db.execute(update(A), [
+        {"id": r.id, "content": None, "content_gz": compress(r.content), "summary": summarize(r.content)}
+        for r in rows
+    ])
+    return len(rows), (rows[-1].id if len(rows) == batch else None)
+
+
+def _in_chunks(chunk: Callable, cutoff: datetime, batch: int) -> int:
+    # Keyset over id so each chunk starts where the last one stopped
+    total, after = 0, 0
+    while after is not None:
+        done, last = run_write_sync(lambda db: chunk(db, cutoff, after, batch))
+        total += done
+        after = last
+    return total
+
+
+def compact_activities(now: Optional[datetime] = None, compress_after_days: Optional[int] = None,
+                       retention_days: Optional[int] = None, batch_size: Optional[int] = None) -> Dict[str, int]:
+    """One compaction pass; returns how many rows were archived and compressed."""
+    now = now or datetime.utcnow()
+    if compress_after_days is None:
+        compress_after_days = _env_int("ACTIVITY_COMPRESS_AFTER_DAYS", 7)
+    if retention_days is None:
+        retention_days = _env_int("ACTIVITY_RETENTION_DAYS", 90)
+    batch = max(1, batch_size or _env_int("ACTIVITY_COMPACTION_BATCH", 500))
+
+    counts = {"archived": 0, "compressed": 0}
+    # Archive first so rows past retention aren't compressed only to be moved
+    if retention_days > 0:
+        counts["archived"] = _in_chunks(_archive_chunk, now - timedelta(days=retention_days), batch)
+    if compress_after_days > 0:
+        counts["compressed"] = _in_chunks(_compress_chunk, now - timedelta(days=compress_after_days), batch)
+    if counts["archived"] or counts["compressed"]:
+        _logger.info("Activity compaction: %(archived)d archived, %(compressed)d compressed", counts)
+    return counts
+
+
+class CompactionJob:
+    """Runs `compact_activities` periodically on the API's event loop."""
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval if interval is not None else _env_int("ACTIVITY_COMPACTION_INTERVAL_SECONDS", 3600)
+        self._stop_event = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._stop_event.set()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                # Blocking DB work; each chunk is its own short transaction
+                await asyncio.to_thread(compact_activities)
+            except Exception:
+                _logger.exception("Activity compaction failed")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    print(compact_activities())
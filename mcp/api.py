@@ -1,8 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
 from typing import Generator, Optional
-from .db import SessionLocal, init_db
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from .db import AsyncSessionLocal, SessionLocal, add_row, get_async_db, init_db, run_write
 from . import models
+from .activity_compaction import SUMMARY_CHARS, load_contents
+from .user_cache import MISSING, CachedUser, user_cache
+from .pagination import (
+    DEFAULT_LIMIT, NEXT_CURSOR_HEADER, clamp_limit, encode_cursor, keyset_after, keyset_order, page, parse_fields,
+)
+from agents.core.cancellation import get_registry as get_cancel_registry
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 import threading
 import json
@@ -12,8 +24,12 @@ import urllib.error
 
 router = APIRouter(prefix="/api")
 
+# Task statuses that can no longer be cancelled
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
 
 def get_db() -> Generator[Session, None, None]:
+    """Sync session for callers outside the request path; handlers use `get_async_db`."""
     db = SessionLocal()
     try:
         yield db
@@ -26,34 +42,71 @@ def init():
     init_db()
 
 
-def get_current_user(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)):
+def _auto_create_users() -> bool:
+    return (os.getenv("AUTH_AUTO_CREATE_USERS") or "1").lower() not in ("0", "false", "no", "off")
+
+
+def _upsert_user(db: Session, username: str, email: str, role: str):
+    """Insert the user unless it exists, then return the row (run via `run_write`).
+
+    A conflict-ignoring INSERT lets concurrent first requests for the same
+    username both succeed instead of one failing on the unique constraint.
+    """
+    values = {"username": username, "email": email, "role": role}
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        db.execute(sqlite_insert(models.User).values(**values).on_conflict_do_nothing())
+    elif dialect == "postgresql":
+        db.execute(pg_insert(models.User).values(**values).on_conflict_do_nothing())
+    elif dialect == "mysql":
+        stmt = mysql_insert(models.User).values(**values)
+        db.execute(stmt.on_duplicate_key_update(username=stmt.inserted.username))
+    else:
+        try:
+            with db.begin_nested():
+                db.add(models.User(**values))
+        except IntegrityError:
+            pass
+    return db.execute(select(models.User).where(models.User.username == username)).scalars().first()
+
+
+async def _get_or_create_user(username: str, email: str, role: str) -> CachedUser:
+    cached = user_cache.get(username)
+    if cached is MISSING:
+        raise HTTPException(status_code=401, detail="Unknown user")
+    if cached is not None:
+        return cached
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(select(models.User).where(models.User.username == username))).scalars().first()
+    if not user:
+        if not _auto_create_users():
+            user_cache.put_missing(username)
+            raise HTTPException(status_code=401, detail="Unknown user")
+        user = await run_write(lambda w: _upsert_user(w, username, email, role))
+        if user is None:
+            # The email belongs to a different username
+            raise HTTPException(status_code=409, detail=f"Cannot create user {username!r}")
+    return user_cache.put(CachedUser.from_row(user))
+
+
+async def get_current_user(authorization: Optional[str] = Header(None)) -> CachedUser:
     """Simple token -> user mapping for MVP. In production, wire OAuth SSO.
 
     Expected header: Authorization: Bearer <username>
-    This helper will create a user record if not present for quick testing.
+    This helper will create a user record if not present for quick testing
+    (AUTH_AUTO_CREATE_USERS=0 turns that off). Users are served from
+    `mcp.user_cache`, so a cache hit does no database work.
     """
     if authorization is None:
         # return an anonymous demo user
-        user = db.query(models.User).filter(models.User.username == "demo").first()
-        if not user:
-            user = models.User(username="demo", email="demo@example.com", role="admin")
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-        return user
+        return await _get_or_create_user("demo", "demo@example.com", "admin")
 
     # parse very small bearer token format
     parts = authorization.split()
     if len(parts) == 2 and parts[0].lower() == "bearer":
         token = parts[1]
         # treat token as username for MVP
-        user = db.query(models.User).filter(models.User.username == token).first()
-        if not user:
-            user = models.User(username=token, email=f"{token}@example.com", role="staff")
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-        return user
+        return await _get_or_create_user(token, f"{token}@example.com", "staff")
     raise HTTPException(status_code=401, detail="Invalid authorization header")
 
 
@@ -63,33 +116,57 @@ def _on_startup():
 
 
 @router.get("/agents")
-def list_agents(db: Session = Depends(get_db)):
-    agents = db.query(models.Agent).all()
+async def list_agents(db: AsyncSession = Depends(get_async_db)):
+    agents = (await db.execute(select(models.Agent))).scalars().all()
     return [ {"id": a.id, "name": a.name, "description": a.description, "logo_url": a.logo_url, "owner_id": a.owner_id} for a in agents ]
 
 
 @router.post("/agents")
-def create_agent(payload: dict, user = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_agent(payload: dict, user = Depends(get_current_user)):
     name = payload.get("name")
     description = payload.get("description")
     logo_url = payload.get("logo_url")
     if not name:
         raise HTTPException(status_code=400, detail="Missing 'name'")
     a = models.Agent(name=name, description=description or "", owner_id=user.id, logo_url=logo_url)
-    db.add(a)
-    db.commit()
-    db.refresh(a)
+    a = await run_write(lambda w: add_row(w, a))
     return {"id": a.id, "name": a.name, "logo_url": a.logo_url}
 
 
+# Columns `GET /api/tasks?fields=` may select, and the default projection
+TASK_FIELDS = ("id", "title", "status", "logo_url", "created_at", "description", "agent_id")
+TASK_LIST_FIELDS = ("id", "title", "status", "logo_url", "created_at")
+# Characters of Activity.content returned as the summary in task detail and activity pages
+ACTIVITY_SUMMARY_CHARS = SUMMARY_CHARS
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
 @router.get("/tasks")
-def list_tasks(db: Session = Depends(get_db), user = Depends(get_current_user)):
-    tasks = db.query(models.Task).filter(models.Task.owner_id == user.id).all()
-    return [ {"id": t.id, "title": t.title, "status": t.status, "logo_url": t.logo_url, "created_at": t.created_at.isoformat()} for t in tasks ]
+async def list_tasks(response: Response, cursor: Optional[str] = None, limit: int = DEFAULT_LIMIT,
+                     fields: Optional[str] = None, db: AsyncSession = Depends(get_async_db),
+                     user = Depends(get_current_user)):
+    """The user's tasks, newest first, one page at a time (see mcp/pagination.py)."""
+    try:
+        names = parse_fields(fields, TASK_FIELDS, TASK_LIST_FIELDS)
+        after = keyset_after(models.Task.created_at, models.Task.id, cursor, descending=True)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    limit = clamp_limit(limit)
+    # id and created_at are always read for the cursor
+    columns = [getattr(models.Task, n) for n in dict.fromkeys(("id", "created_at", *names))]
+    stmt = select(*columns).where(models.Task.owner_id == user.id)
+    if after is not None:
+        stmt = stmt.where(after)
+    stmt = stmt.order_by(*keyset_order(models.Task.created_at, models.Task.id, descending=True)).limit(limit + 1)
+    rows = page((await db.execute(stmt)).all(), limit, response)
+    return [ {n: _iso(r.created_at) if n == "created_at" else getattr(r, n) for n in names} for r in rows ]
 
 
 @router.post("/tasks")
-def create_task(payload: dict, user = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_task(payload: dict, user = Depends(get_current_user)):
     title = payload.get("title")
     description = payload.get("description")
     agent_id = payload.get("agent_id")
@@ -99,9 +176,7 @@ def create_task(payload: dict, user = Depends(get_current_user), db: Session = D
     if not title:
         raise HTTPException(status_code=400, detail="Missing 'title'")
     t = models.Task(title=title, description=description or "", owner_id=user.id, agent_id=agent_id, logo_url=logo_url)
-    db.add(t)
-    db.commit()
-    db.refresh(t)
+    t = await run_write(lambda w: add_row(w, t))
     result = {"id": t.id, "title": t.title, "status": t.status, "logo_url": t.logo_url}
 
     # Fire-and-forget: try to notify the run endpoint so agents begin processing.
@@ -131,7 +206,8 @@ def create_task(payload: dict, user = Depends(get_current_user), db: Session = D
                 pass
 
     try:
-        task_payload = {"id": t.id, "title": t.title, "description": t.description, "agent_id": t.agent_id}
+        # detach: the run must outlive this short-timeout notification request
+        task_payload = {"id": t.id, "title": t.title, "description": t.description, "agent_id": t.agent_id, "owner_id": t.owner_id, "detach": True}
         # Forward artifact paths (or defaults) to /run-agents if provided/requested
         if not artifact_paths and include_artifacts:
             artifact_paths = {
@@ -150,13 +226,114 @@ def create_task(payload: dict, user = Depends(get_current_user), db: Session = D
     return result
 
 
+async def _owned_task(db: AsyncSession, task_id: int, user):
+    stmt = select(models.Task).where(models.Task.id == task_id, models.Task.owner_id == user.id)
+    return (await db.execute(stmt)).scalars().first()
+
+
+@router.post("/tasks/{task_id}/cancel")
+async def cancel_task(task_id: int, user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """Stop a queued or running task; its agents stop before their next LLM call."""
+    t = await _owned_task(db, task_id, user)
+    if not t:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if t.status in FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Task {task_id} is already {t.status}")
+    running_here = get_cancel_registry().cancel(str(t.id), "cancelled by user")
+    await run_write(lambda w: w.execute(update(models.Task).where(models.Task.id == t.id).values(status="cancelled")))
+    return {"id": t.id, "status": "cancelled", "was_running": running_here}
+
+
+async def _load_contents(db: AsyncSession, rows):
+    """Full content for activity rows, including compacted and archived ones."""
+    archived_ids = [r.id for r in rows if r.archived and r.content is None and r.content_gz is None]
+    archived = {}
+    if archived_ids:
+        AA = models.ActivityArchive
+        archived = dict((await db.execute(
+            select(AA.activity_id, AA.content_gz).where(AA.activity_id.in_(archived_ids))
+        )).all())
+    return load_contents(rows, archived)
+
+
+async def _activity_page(db: AsyncSession, task_id: int, cursor: Optional[str], limit: int, full: bool = False):
+    """One page of a task's activities in timeline order, plus the next cursor.
+
+    Without `full`, only the first ACTIVITY_SUMMARY_CHARS characters of each
+    content (or the stored summary of a compacted row) are read.
+    """
+    A = models.Activity
+    after = keyset_after(A.created_at, A.id, cursor)
+    if full:
+        columns = (A.content, A.content_gz, A.archived)
+    else:
+        # One extra character tells whether the summary was cut short
+        columns = (func.coalesce(A.summary, func.substr(A.content, 1, ACTIVITY_SUMMARY_CHARS + 1)).label("body"),)
+    stmt = select(A.id, A.agent_id, A.created_at, *columns).where(A.task_id == task_id)
+    if after is not None:
+        stmt = stmt.where(after)
+    stmt = stmt.order_by(*keyset_order(A.created_at, A.id)).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+    contents = await _load_contents(db, rows[:limit]) if full else {}
+    items = []
+    for r in rows[:limit]:
+        item = {"id": r.id, "agent_id": r.agent_id, "created_at": _iso(r.created_at)}
+        if full:
+            item["content"] = contents[r.id]
+        else:
+            text = r.body or ""
+            item["summary"] = text[:ACTIVITY_SUMMARY_CHARS]
+            item["truncated"] = len(text) > ACTIVITY_SUMMARY_CHARS
+        items.append(item)
+    next_cursor = None
+    if len(rows) > limit and items:
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id)
+    return items, next_cursor
+
+
 @router.get("/tasks/{task_id}")
-def get_task(task_id: int, db: Session = Depends(get_db), user = Depends(get_current_user)):
-    t = db.query(models.Task).filter(models.Task.id == task_id, models.Task.owner_id == user.id).first()
+async def get_task(task_id: int, db: AsyncSession = Depends(get_async_db), user = Depends(get_current_user)):
+    """Task fields and the first page of activity summaries.
+
+    Further pages come from `/tasks/{id}/activities?cursor=<activities_cursor>`
+    and full content from `/tasks/{id}/activities/{activity_id}`.
+    """
+    t = await _owned_task(db, task_id, user)
     if not t:
         raise HTTPException(status_code=404, detail="Task not found")
+    acts, next_cursor = await _activity_page(db, t.id, None, DEFAULT_LIMIT)
+    return {"id": t.id, "title": t.title, "description": t.description, "status": t.status,
+            "created_at": _iso(t.created_at), "activities": acts, "activities_cursor": next_cursor}
+
+
+@router.get("/tasks/{task_id}/activities")
+async def list_activities(task_id: int, response: Response, cursor: Optional[str] = None,
+                          limit: int = DEFAULT_LIMIT, full: bool = False,
+                          db: AsyncSession = Depends(get_async_db), user = Depends(get_current_user)):
+    """A page of the task's activities, oldest first; summaries unless `full=true`."""
+    if not await _owned_task(db, task_id, user):
+        raise HTTPException(status_code=404, detail="Task not found")
+    try:
+        items, next_cursor = await _activity_page(db, task_id, cursor, clamp_limit(limit), full)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
 
-    activities = db.query(models.Activity).filter(models.Activity.task_id == t.id).order_by(models.Activity.created_at.asc()).all()
-    acts = [ {"id": a.id, "agent_id": a.agent_id, "content": a.content, "created_at": a.created_at.isoformat()} for a in activities ]
 
-    return {"id": t.id, "title": t.title, "description": t.description, "status": t.status, "created_at": t.created_at.isoformat(), "activities": acts}
+@router.get("/tasks/{task_id}/activities/{activity_id}")
+async def get_activity(task_id: int, activity_id: int, db: AsyncSession = Depends(get_async_db),
+                       user = Depends(get_current_user)):
+    """Full content of one activity, decompressed or loaded from the archive if compacted."""
+    if not await _owned_task(db, task_id, user):
+        raise HTTPException(status_code=404, detail="Task not found")
+    A = models.Activity
+    a = (await db.execute(
+        select(A.id, A.agent_id, A.created_at, A.content, A.content_gz, A.archived)
+        .where(A.id == activity_id, A.task_id == task_id)
+    )).first()
+    if not a:
+        raise HTTPException(status_code=404, detail="Activity not found")
+    content = (await _load_contents(db, [a]))[a.id]
+    return {"id": a.id, "agent_id": a.agent_id, "content": content, "created_at": _iso(a.created_at)}
@@ -3,25 +3,16 @@ import os
 import json
 from typing import Dict, Any
 
+from .config_store import token_roles
+
 
 def _load_token_roles() -> Dict[str, Any]:
-    """Load token->role mapping from env `RAG_ROLE_TOKENS` (JSON) or `agents/rbac.json` file.
+    """Token->role mapping from env `RAG_ROLE_TOKENS` (JSON) or `agents/rbac.json` file.
 
     Format example: {"token1": "admin", "token2": "viewer"}
+    Served from an in-memory snapshot (see mcp/config_store.py); don't mutate it.
     """
-    env = os.getenv("RAG_ROLE_TOKENS")
-    if env:
-        try:
-            return json.loads(env)
-        except Exception:
-            return {}
-    # try file
-    path = os.path.join(os.path.dirname(__file__), "..", "agents", "rbac.json")
-    try:
-        with open(path, "r", encoding="utf-8") as fh:
-            return json.load(fh)
-    except Exception:
-        return {}
+    return token_roles()
 
 
 def check_admin_token(authorization: str | None = Header(None), required_role: str | None = None) -> bool:
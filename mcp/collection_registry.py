@@ -0,0 +1,148 @@
+"""Per-collection embedding registry backed by the `collection_meta` table.
+
+Ingest registers the embedding model, dimension, distance and chunker
+version a collection was built with (`register_collection`). Query paths
+call `embed_for_collection`, which embeds with the registered model and
+refuses a dimension mismatch before any vector store round trip.
+
+Records are cached in-process for `RAG_COLLECTION_META_TTL` seconds since
+ingest usually runs in a separate process.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from mcp.db import SessionLocal, engine
+from mcp import models
+from mcp.embeddings import get_embedding
+
+_logger = logging.getLogger(__name__)
+
+_CACHE: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+_CACHE_LOCK = threading.Lock()
+_TABLE_READY = False
+
+
+class CollectionMismatchError(ValueError):
+    """Embeddings do not match the model/dimension a collection was built with."""
+
+
+def _ttl() -> float:
+    try:
+        return float(os.getenv("RAG_COLLECTION_META_TTL", "30"))
+    except ValueError:
+        return 30.0
+
+
+def _ensure_table() -> None:
+    # Ingest may run before the API has called init_db()
+    global _TABLE_READY
+    if not _TABLE_READY:
+        models.CollectionMeta.__table__.create(bind=engine, checkfirst=True)
+        _TABLE_READY = True
+
+
+def _to_dict(row) -> Dict[str, Any]:
+    return {
+        "collection": row.collection,
+        "embedding_model": row.embedding_model,
+        "dim": row.dim,
+        "distance": row.distance,
+        "chunker_version": row.chunker_version,
+    }
+
+
+def invalidate(collection: Optional[str] = None) -> None:
+    with _CACHE_LOCK:
+        if collection is None:
+            _CACHE.clear()
+        else:
+            _CACHE.pop(collection, None)
+
+
+def get_collection_meta(collection: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """Return the registry record for `collection`, or None if unregistered."""
+    now = time.monotonic()
+    if use_cache:
+        with _CACHE_LOCK:
+            hit = _CACHE.get(collection)
+        if hit is not None and now - hit[0] < _ttl():
+            return hit[1]
+    _ensure_table()
+    db = SessionLocal()
+    try:
+        row = db.query(models.CollectionMeta).filter(models.CollectionMeta.collection == collection).first()
+        meta = _to_dict(row) if row else None
+    finally:
+        db.close()
+    with _CACHE_LOCK:
+        _CACHE[collection] = (now, meta)
+    return meta
+
+
+def register_collection(collection: str, embedding_model: str, dim: int, distance: str = "cosine", chunker_version: Optional[str] = None) -> Dict[str, Any]:
+    """Create the record for a new collection or verify an existing one.
+
+    Raises `CollectionMismatchError` when the collection already exists with
+    a different model, dimension or distance. A changed chunker version is
+    recorded but allowed (old and new chunks remain comparable).
+    """
+    _ensure_table()
+    db = SessionLocal()
+    try:
+        row = db.query(models.CollectionMeta).filter(models.CollectionMeta.collection == collection).first()
+        if row is None:
+            row = models.CollectionMeta(
+                collection=collection,
+                embedding_model=embedding_model,
+                dim=int(dim),
+                distance=distance,
+                chunker_version=chunker_version,
+            )
+            db.add(row)
+        else:
+            problems = []
+            if row.embedding_model != embedding_model:
+                problems.append(f"model {embedding_model!r} != {row.embedding_model!r}")
+            if int(row.dim) != int(dim):
+                problems.append(f"dim {dim} != {row.dim}")
+            if (row.distance or "cosine") != distance:
+                problems.append(f"distance {distance!r} != {row.distance!r}")
+            if problems:
+                raise CollectionMismatchError(f"Collection '{collection}' was built with different embeddings: " + "; ".join(problems))
+            if chunker_version and row.chunker_version != chunker_version:
+                _logger.warning("Collection '%s' chunker version changed %s -> %s", collection, row.chunker_version, chunker_version)
+                row.chunker_version = chunker_version
+        db.commit()
+        meta = _to_dict(row)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    invalidate(collection)
+    return meta
+
+
+def embed_for_collection(text: str, collection: str) -> List[float]:
+    """Embed a query with the model `collection` was indexed with.
+
+    Unregistered (legacy) collections use the default `get_embedding` chain.
+    Raises `CollectionMismatchError` if the produced vector has the wrong
+    dimension and `EmbeddingUnavailableError` if the model cannot be served.
+    """
+    try:
+        meta = get_collection_meta(collection)
+    except Exception:
+        _logger.warning("Collection registry lookup failed for '%s'; using default embeddings", collection, exc_info=True)
+        meta = None
+    if meta is None:
+        return get_embedding(text)
+    vec = get_embedding(text, model=meta["embedding_model"], dim=meta["dim"])
+    if len(vec) != int(meta["dim"]):
+        raise CollectionMismatchError(
+            f"Query embedding has dim={len(vec)} but collection '{collection}' expects dim={meta['dim']} ({meta['embedding_model']})"
+        )
+    return vec
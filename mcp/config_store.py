@@ -0,0 +1,184 @@
+"""In-memory snapshots of file-backed configuration.
+
+`rag_config.json` is read on every similarity search, webhook and ingest,
+and the RBAC token map on every protected request. A `FileSnapshot` parses
+its file once and keeps the result in memory. It checks the file's mtime
+and size at most every CONFIG_CHECK_INTERVAL seconds (1.0; 0 checks on
+every read) and re-parses only when they change. A reload or a `write()`
+builds the new value off to the side and then swaps a single reference, so
+readers see either the old snapshot or the new one, never a partial one.
+
+Writes go to a temporary file that is renamed over the original, and they
+install the new snapshot directly. Other processes see the change on
+their next check. If a changed file fails to parse, the last good snapshot
+is kept.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+_logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _check_interval() -> float:
+    try:
+        return max(0.0, float(os.getenv("CONFIG_CHECK_INTERVAL") or 1.0))
+    except ValueError:
+        return 1.0
+
+
+class FileSnapshot(Generic[T]):
+    """Parsed view of a JSON file, re-read only when the file changes."""
+
+    def __init__(self, path: Path, normalize: Callable[[Any], T], default: Callable[[], T],
+                 check_interval: Optional[float] = None):
+        self.path = Path(path)
+        self.normalize = normalize
+        self.default = default
+        self.check_interval = _check_interval() if check_interval is None else check_interval
+        self._lock = threading.Lock()
+        # (stat signature, value) swapped as one tuple
+        self._state: Tuple[Optional[Tuple[int, int]], T] = (None, default())
+        self._loaded = False
+        self._checked_at = 0.0
+
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self) -> T:
+        """The current snapshot; shared, so callers must not mutate it."""
+        now = time.monotonic()
+        if not self._loaded or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._refresh()
+        return self._state[1]
+
+    def _refresh(self) -> None:
+        sig = self._signature()
+        if self._loaded and sig == self._state[0]:
+            return
+        with self._lock:
+            sig = self._signature()
+            if self._loaded and sig == self._state[0]:
+                return
+            if sig is None:
+                self._state = (None, self.default())
+            else:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as fh:
+                        value = self.normalize(json.load(fh))
+                    self._state = (sig, value)
+                except Exception:
+                    _logger.warning("Failed to load %s; keeping the previous snapshot", self.path, exc_info=True)
+                    if not self._loaded:
+                        self._state = (sig, self.default())
+            self._loaded = True
+
+    def write(self, raw: Any) -> T:
+        """Atomically replace the file with `raw` and install its normalized snapshot."""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=str(self.path.parent), prefix=self.path.name + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                    json.dump(raw, fh, indent=2)
+                os.replace(tmp, self.path)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+            value = self.normalize(json.loads(json.dumps(raw)))
+            self._state = (self._signature(), value)
+            self._loaded = True
+            self._checked_at = time.monotonic()
+            return value
+
+    def invalidate(self) -> None:
+        """Force a re-read on the next `get()`."""
+        self._loaded = False
+
+
+# --- rag_config.json ---
+
+RAG_CONFIG_PATH = Path(__file__).resolve().parent.parent / "agents" / "core" / "rag_config.json"
+
+
+def _default_rag_config() -> Dict[str, Any]:
+    return {"repos": [], "collection": "rag-poc"}
+
+
+def normalize_rag_config(cfg: Any) -> Dict[str, Any]:
+    if not isinstance(cfg, dict):
+        return _default_rag_config()
+    # normalize shape for backward compatibility
+    if "collection" not in cfg:
+        cfg.setdefault("collection", "rag-poc")
+    if "repos" not in cfg:
+        # support old `repo` key or missing repos
+        if cfg.get("repo"):
+            cfg["repos"] = [cfg.get("repo")]
+            cfg.pop("repo", None)
+        else:
+            cfg["repos"] = []
+    # normalize each repo entry to an object
+    out_repos = []
+    for r in cfg.get("repos", []):
+        if isinstance(r, str):
+            out_repos.append({"url": r, "auto_ingest": True})
+        elif isinstance(r, dict):
+            # ensure required keys and defaults
+            o = dict(r)
+            o.setdefault("url", "")
+            o.setdefault("auto_ingest", True)
+            # optional fields: collection, branches
+            if "branches" in o and o.get("branches") is None:
+                o.pop("branches", None)
+            out_repos.append(o)
+    cfg["repos"] = out_repos
+    return cfg
+
+
+rag_config = FileSnapshot(RAG_CONFIG_PATH, normalize_rag_config, _default_rag_config)
+
+
+# --- RBAC token -> role map ---
+
+RBAC_PATH = Path(__file__).resolve().parent.parent / "agents" / "rbac.json"
+
+
+def _roles(data: Any) -> Dict[str, Any]:
+    return data if isinstance(data, dict) else {}
+
+
+rbac_roles = FileSnapshot(RBAC_PATH, _roles, dict)
+
+_env_roles: Tuple[Optional[str], Dict[str, Any]] = (None, {})
+
+
+def token_roles() -> Dict[str, Any]:
+    """Token -> role map from `RAG_ROLE_TOKENS` (JSON) or `agents/rbac.json`."""
+    global _env_roles
+    raw = os.getenv("RAG_ROLE_TOKENS")
+    if raw:
+        cached_raw, roles = _env_roles
+        if raw != cached_raw:
+            try:
+                roles = _roles(json.loads(raw))
+            except Exception:
+                roles = {}
+            _env_roles = (raw, roles)
+        return roles
+    return rbac_roles.get()
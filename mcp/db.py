@@ -1,16 +1,266 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from typing import Any, AsyncIterator, Callable, Dict, Optional, TypeVar
 import os
+import threading
+
+from .sqlite_writer import SQLiteWriter
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+except Exception:
+    AsyncSession = None
+    create_async_engine = None
 
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data.db")
 
+T = TypeVar("T")
+
+# Async drivers for the sync URLs we support; ASYNC_DATABASE_URL overrides the mapping.
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "postgresql": "postgresql+psycopg",
+    "postgresql+psycopg": "postgresql+psycopg",
+    "postgresql+psycopg2": "postgresql+psycopg",
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+def async_database_url(url: str) -> str:
+    """The async-driver form of a sync database URL."""
+    explicit = os.getenv("ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+    scheme, sep, rest = url.partition("://")
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """Pool sizing, pre-ping and statement timeouts for `url`, from env.
+
+    DB_POOL_SIZE (10), DB_MAX_OVERFLOW (20), DB_POOL_TIMEOUT (30s),
+    DB_POOL_RECYCLE (1800s) and DB_STATEMENT_TIMEOUT_MS (30000; 0 disables).
+    SQLite keeps SQLAlchemy's default pool and only gets a busy timeout.
+    """
+    timeout_ms = _env_int("DB_STATEMENT_TIMEOUT_MS", 30000)
+    scheme = url.split("://", 1)[0]
+    if scheme.startswith("sqlite"):
+        connect_args: Dict[str, Any] = {"timeout": max(1, timeout_ms // 1000) if timeout_ms else 5}
+        if "aiosqlite" not in scheme:
+            connect_args["check_same_thread"] = False
+        return {"connect_args": connect_args}
+    opts: Dict[str, Any] = {
+        "pool_pre_ping": True,
+        "pool_size": _env_int("DB_POOL_SIZE", 10),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 20),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+    }
+    if timeout_ms and scheme.startswith("postgresql"):
+        if "asyncpg" in scheme:
+            opts["connect_args"] = {"server_settings": {"statement_timeout": str(timeout_ms)}}
+        else:
+            opts["connect_args"] = {"options": f"-c statement_timeout={timeout_ms}"}
+    return opts
+
+
+def _apply_mysql_timeout(sync_engine, url: str) -> None:
+    # MySQL has no connect option for it; set it per session on connect (SELECTs only)
+    timeout_ms = _env_int("DB_STATEMENT_TIMEOUT_MS", 30000)
+    if not timeout_ms or not url.startswith("mysql"):
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_timeout(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            cur.execute(f"SET SESSION MAX_EXECUTION_TIME={int(timeout_ms)}")
+        finally:
+            cur.close()
+
+
+def _is_file_sqlite(url: str) -> bool:
+    if not url.startswith("sqlite"):
+        return False
+    path = url.split("://", 1)[1] if "://" in url else ""
+    return path not in ("", "/", "/:memory:") and "mode=memory" not in path
+
+
+def sqlite_profile_enabled(url: str = DATABASE_URL) -> bool:
+    """Whether the production SQLite profile applies to `url`.
+
+    On by default for file-backed SQLite; `SQLITE_PROFILE=default` keeps
+    SQLite's stock settings. In-memory databases are never affected.
+    """
+    return _is_file_sqlite(url) and (os.getenv("SQLITE_PROFILE") or "production").lower() != "default"
+
+
+def sqlite_pragmas() -> Dict[str, str]:
+    """PRAGMAs set on every new SQLite connection under the production profile.
+
+    WAL lets readers proceed while a write is in progress and, with
+    `synchronous=NORMAL`, commits no longer fsync. SQLITE_BUSY_TIMEOUT_MS
+    (5000) bounds how long a writer from another process waits for the lock;
+    SQLITE_MMAP_SIZE (256 MiB; 0 disables) serves reads from mapped pages.
+    """
+    return {
+        "journal_mode": "WAL",
+        "synchronous": (os.getenv("SQLITE_SYNCHRONOUS") or "NORMAL").upper(),
+        "busy_timeout": str(_env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+        "mmap_size": str(_env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "temp_store": "MEMORY",
+    }
+
+
+def _apply_sqlite_pragmas(sync_engine, url: str) -> None:
+    if not sqlite_profile_enabled(url):
+        return
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cur.execute(f"PRAGMA {name}={value}")
+        finally:
+            cur.close()
+
+
 # For SQLite, echo=False by default; tune for production
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+_apply_mysql_timeout(engine, DATABASE_URL)
+_apply_sqlite_pragmas(engine, DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for FastAPI handlers; created on first use so scripts and
+# workers that only need the sync engine don't require an async driver.
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        if create_async_engine is None:
+            raise RuntimeError("SQLAlchemy asyncio support is not installed")
+        url = async_database_url(DATABASE_URL)
+        _async_engine = create_async_engine(url, **engine_options(url))
+        _apply_mysql_timeout(_async_engine.sync_engine, url)
+        _apply_sqlite_pragmas(_async_engine.sync_engine, url)
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    """A new AsyncSession on the shared async engine."""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        _async_sessionmaker = sessionmaker(
+            bind=get_async_engine(), class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_sessionmaker()
+
+
+async def get_async_db() -> AsyncIterator["AsyncSession"]:
+    """FastAPI dependency yielding an AsyncSession."""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_sessionmaker = None
+
+
+# One writer thread per process when the SQLite profile is on; see mcp.sqlite_writer
+_writer: Optional[SQLiteWriter] = None
+_writer_lock = threading.Lock()
+
+
+def single_writer_enabled() -> bool:
+    """SQLITE_SINGLE_WRITER (default on) funnels writes through one thread."""
+    if not sqlite_profile_enabled(DATABASE_URL):
+        return False
+    return (os.getenv("SQLITE_SINGLE_WRITER") or "1").lower() not in ("0", "false", "no", "off")
+
+
+def get_writer() -> Optional[SQLiteWriter]:
+    """The process's SQLite writer, or None when writes go straight to the engine."""
+    global _writer
+    if not single_writer_enabled():
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = SQLiteWriter(sessionmaker(bind=engine, autoflush=False, expire_on_commit=False))
+        return _writer
+
+
+def stop_writer() -> None:
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
+
+
+async def run_write(fn: Callable[[Any], T]) -> T:
+    """Run `fn(session)` as one committed write transaction and return its result.
+
+    `fn` receives a sync Session. On SQLite it runs on the writer thread;
+    otherwise on an AsyncSession via `run_sync`. Returned ORM objects are
+    not expired, so their attributes stay readable after the commit.
+    """
+    writer = get_writer()
+    if writer is not None:
+        return await writer.run(fn)
+    async with AsyncSessionLocal() as session:
+        result = await session.run_sync(fn)
+        await session.commit()
+        return result
+
+
+def run_write_sync(fn: Callable[[Any], T]) -> T:
+    """Blocking form of `run_write` for threads and workers without an event loop."""
+    writer = get_writer()
+    if writer is not None:
+        return writer.call(fn)
+    db = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+    try:
+        result = fn(db)
+        db.commit()
+        return result
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def add_row(db, row):
+    """`run_write` callable body: insert `row` and load its server defaults."""
+    db.add(row)
+    db.flush()
+    db.refresh(row)
+    return row
+
 
 def init_db():
-    # Create tables (simple approach for MVP)
+    # Create missing tables, then bring existing ones up to date (mcp/migrations.py)
+    from .migrations import run_migrations
+
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
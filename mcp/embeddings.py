@@ -0,0 +1,153 @@
+"""Shared deterministic embedding provider.
+
+Used wherever real embeddings are unavailable: `/similarity-search`
+(`mcp.mcp.get_embedding`), repository ingest (`scripts/ingest_repo.py`),
+the engineer agent's RAG lookup and the OpenAI mock's `/v1/embeddings`.
+Every caller goes through this module so query and ingested vectors agree
+on both values and dimension.
+
+Each text is hashed with SHA-256, the digest bytes are repeated to fill
+`dim` components mapped to [-1, 1], and rows are L2-normalized. A batch is
+built as a single NumPy matrix rather than element by element.
+
+`get_embedding` is the query-side entry point: it routes a text to the
+requested model (in-app mock, OpenAI client, LangChain wrapper) and only
+falls back to the deterministic provider when no model was requested.
+"""
+import hashlib
+import logging
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from langchain_openai import OpenAIEmbeddings  # type: ignore
+except Exception:
+    try:
+        from langchain.embeddings import OpenAIEmbeddings  # type: ignore
+    except Exception:
+        OpenAIEmbeddings = None
+
+# Prefer the OpenAI v1 client when available
+try:
+    from openai import OpenAI as OpenAIClient  # type: ignore
+except Exception:
+    OpenAIClient = None
+
+# Matches OpenAI text-embedding-3-small so deterministic and real vectors can
+# share a collection size. Override with RAG_EMBED_DIM.
+DEFAULT_EMBED_DIM = 1536
+
+DETERMINISTIC_MODEL = "deterministic-sha256"
+
+
+def embed_dim() -> int:
+    """The embedding dimension agreed across ingest, search and mocks."""
+    try:
+        return int(os.getenv("RAG_EMBED_DIM") or DEFAULT_EMBED_DIM)
+    except ValueError:
+        return DEFAULT_EMBED_DIM
+
+
+def deterministic_matrix(texts: Sequence[str], dim: Optional[int] = None) -> np.ndarray:
+    """Embed a batch of texts into a `(len(texts), dim)` float32 matrix."""
+    dim = dim or embed_dim()
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+    digests = b"".join(hashlib.sha256((t or "").encode("utf-8")).digest() for t in texts)
+    raw = np.frombuffer(digests, dtype=np.uint8).reshape(len(texts), 32)
+    reps = -(-dim // 32)
+    mat = np.tile(raw, (1, reps))[:, :dim].astype(np.float32)
+    mat = mat * np.float32(2.0 / 255.0) - np.float32(1.0)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def deterministic_embedding(text: str, dim: Optional[int] = None) -> List[float]:
+    return deterministic_matrix([text], dim)[0].tolist()
+
+
+class DeterministicEmbeddings:
+    """LangChain-compatible provider (`embed_documents` / `embed_query`)."""
+
+    model = DETERMINISTIC_MODEL
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim or embed_dim()
+
+    def embed_documents(self, texts):
+        return deterministic_matrix(list(texts), self.dim).tolist()
+
+    def embed_query(self, text):
+        return deterministic_embedding(text, self.dim)
+
+
+class EmbeddingUnavailableError(RuntimeError):
+    """No provider could embed text with the requested model."""
+
+
+def get_embedding(text: str, model: Optional[str] = None, dim: Optional[int] = None) -> List[float]:
+    """Embed a query string.
+
+    When `model` is given (e.g. from a collection's registry record) only
+    providers for that model are tried and `EmbeddingUnavailableError` is
+    raised if none succeeds; mixing models would return garbage matches.
+    Without `model` the historical chain applies: in-app mock, OpenAI v1
+    client, LangChain wrapper, then the deterministic fallback.
+    """
+    if model == DETERMINISTIC_MODEL:
+        return deterministic_embedding(text, dim)
+
+    # If in-app mock is configured, call the mock embeddings endpoint directly
+    try:
+        if os.getenv('IN_APP_OPENAI_MOCK'):
+            try:
+                import requests as _requests
+                base = os.getenv('IN_APP_OPENAI_MOCK_BASE') or os.getenv('OPENAI_API_BASE') or 'http://localhost:8001/openai-mock'
+                url = base.rstrip('/') + '/v1/embeddings'
+                payload = {'input': text, 'model': model or 'text-embedding-mock'}
+                r = _requests.post(url, json=payload, timeout=10)
+                r.raise_for_status()
+                j = r.json()
+                if isinstance(j, dict) and j.get('data') and isinstance(j['data'], list):
+                    return j['data'][0].get('embedding')
+            except Exception:
+                logging.exception('Failed to call in-app OpenAI mock embeddings; falling back')
+    except Exception:
+        pass
+    # 1) If an OpenAI API key is present prefer the OpenAI v1 client (higher-fidelity)
+    if os.getenv("OPENAI_API_KEY") and OpenAIClient is not None:
+        try:
+            client = OpenAIClient()
+            resp = client.embeddings.create(model=model or "text-embedding-3-small", input=text)
+            # resp.data[0].embedding is the vector
+            return resp.data[0].embedding
+        except Exception:
+            # fall through to other options
+            pass
+
+    # 2) Try LangChain's OpenAIEmbeddings wrapper if available
+    if OpenAIEmbeddings is not None:
+        try:
+            emb = OpenAIEmbeddings(model=model) if model else OpenAIEmbeddings()  # type: ignore
+            try:
+                return emb.embed_documents([text])[0]
+            except Exception:
+                return emb.embed_query(text)
+        except Exception:
+            pass
+
+    if model is not None:
+        raise EmbeddingUnavailableError(f"No embedding provider available for model '{model}'")
+
+    # 3) Deterministic fallback — dimension from RAG_EMBED_DIM
+    return deterministic_embedding(text, dim)
+
+
+def model_name(embeddings) -> str:
+    """Identify the model behind a LangChain-style embeddings object."""
+    if isinstance(embeddings, DeterministicEmbeddings):
+        return DETERMINISTIC_MODEL
+    return str(getattr(embeddings, "model", None) or type(embeddings).__name__)
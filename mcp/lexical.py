@@ -0,0 +1,224 @@
+"""Sparse lexical (BM25) index kept alongside the dense Qdrant collections.
+
+Dense embeddings are poor at exact identifiers (function names, error codes,
+JIRA keys). This module maintains a small local inverted index per
+collection, written at ingest time and read by `/similarity-search` when
+`mode` is `sparse` or `hybrid`. Dense and sparse rankings are merged with
+reciprocal-rank fusion (`reciprocal_rank_fusion`).
+
+Indexes are persisted as JSON under `RAG_LEXICAL_DIR` (default
+`data/lexical/` in the project root) so the ingest subprocess and the API
+process share them; readers reload when the file's mtime changes.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+_DEFAULT_DIR = Path(__file__).resolve().parent.parent / "data" / "lexical"
+
+# Identifier-ish runs: `get_commit_summary`, `PROJ-123`, `mcp.redis_lock`, `E1234`
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+(?:[-.][A-Za-z0-9_]+)*")
+_SUBTOKEN_SPLIT_RE = re.compile(r"[-._]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms, keeping whole identifiers as terms.
+
+    Each identifier contributes itself plus its snake/kebab/camel-case parts,
+    so `getCommitSummary` matches both the exact name and `commit`.
+    """
+    if not text:
+        return []
+    out: List[str] = []
+    for m in _TOKEN_RE.finditer(text):
+        tok = m.group(0)
+        out.append(tok.lower())
+        parts = [p for p in _SUBTOKEN_SPLIT_RE.split(tok) if p]
+        subparts: List[str] = []
+        for p in parts:
+            subparts.extend(_CAMEL_RE.findall(p) or [p])
+        if len(subparts) > 1:
+            out.extend(s.lower() for s in subparts)
+    return out
+
+
+def flatten_payload(payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Lift LangChain's nested `metadata` dict to the top level of a vector payload."""
+    payload = dict(payload or {})
+    meta = payload.pop("metadata", None)
+    if isinstance(meta, dict):
+        return {**meta, **payload}
+    if meta is not None:
+        payload["metadata"] = meta
+    return payload
+
+
+def doc_key(payload: Optional[Dict[str, Any]], text: Optional[str] = None) -> str:
+    """Stable key for a chunk, shared by the dense and sparse result lists."""
+    payload = flatten_payload(payload)
+    source = payload.get("file_path") or payload.get("source") or ""
+    body = text if text is not None else (payload.get("page_content") or payload.get("text") or "")
+    return hashlib.sha1(f"{source}\x00{body}".encode("utf-8")).hexdigest()[:20]
+
+
+class LexicalIndex:
+    """In-memory BM25 index over ingested chunks for a single collection."""
+
+    def __init__(self, collection: str, k1: float = 1.5, b: float = 0.75):
+        self.collection = collection
+        self.k1 = k1
+        self.b = b
+        # key -> {"text", "meta", "tf", "len"}
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._total_len = 0
+
+    # -- mutation ---------------------------------------------------------
+    def add(self, text: str, meta: Optional[Dict[str, Any]] = None) -> str:
+        meta = dict(meta or {})
+        key = doc_key(meta, text)
+        if key in self.docs:
+            self._drop(key)
+        tf = Counter(tokenize(text))
+        length = sum(tf.values())
+        self.docs[key] = {"text": text, "meta": meta, "tf": dict(tf), "len": length}
+        for term, n in tf.items():
+            self._postings[term][key] = n
+        self._total_len += length
+        return key
+
+    def remove_file(self, file_path: str) -> int:
+        """Drop every chunk whose `file_path` metadata matches; returns count."""
+        norm = file_path.replace("\\", "/")
+        keys = [k for k, d in self.docs.items() if (d["meta"].get("file_path") or "").replace("\\", "/") == norm]
+        for k in keys:
+            self._drop(k)
+        return len(keys)
+
+    def _drop(self, key: str) -> None:
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        for term in doc["tf"]:
+            plist = self._postings.get(term)
+            if plist is not None:
+                plist.pop(key, None)
+                if not plist:
+                    self._postings.pop(term, None)
+        self._total_len -= doc["len"]
+
+    # -- query ------------------------------------------------------------
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Return `(key, bm25_score)` pairs, best first."""
+        n_docs = len(self.docs)
+        if n_docs == 0:
+            return []
+        avgdl = (self._total_len / n_docs) or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            plist = self._postings.get(term)
+            if not plist:
+                continue
+            df = len(plist)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for key, tf in plist.items():
+                dl = self.docs[key]["len"]
+                denom = tf + self.k1 * (1.0 - self.b + self.b * dl / avgdl)
+                scores[key] += idf * (tf * (self.k1 + 1.0)) / denom
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        return ranked[:limit]
+
+    # -- persistence ------------------------------------------------------
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection,
+            "docs": {k: {"text": d["text"], "meta": d["meta"]} for k, d in self.docs.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LexicalIndex":
+        idx = cls(data.get("collection") or "rag-poc")
+        for d in (data.get("docs") or {}).values():
+            idx.add(d.get("text") or "", d.get("meta") or {})
+        return idx
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        path = path or index_path(self.collection)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.to_dict(), fh)
+        os.replace(tmp, path)
+        return path
+
+
+def index_path(collection: str) -> Path:
+    base = Path(os.getenv("RAG_LEXICAL_DIR") or _DEFAULT_DIR)
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", collection or "rag-poc")
+    return base / f"{safe}.json"
+
+
+def load_index(collection: str) -> LexicalIndex:
+    """Load a collection's index from disk, or return an empty one."""
+    path = index_path(collection)
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return LexicalIndex.from_dict(json.load(fh))
+    except Exception:
+        return LexicalIndex(collection)
+
+
+# Process-wide cache of loaded indexes keyed by collection, refreshed on mtime.
+_CACHE: Dict[str, Tuple[float, LexicalIndex]] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def get_index(collection: str) -> LexicalIndex:
+    path = index_path(collection)
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        mtime = -1.0
+    with _CACHE_LOCK:
+        cached = _CACHE.get(collection)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    idx = load_index(collection)
+    with _CACHE_LOCK:
+        _CACHE[collection] = (mtime, idx)
+    return idx
+
+
+def update_index(collection: str, chunks: Iterable[Tuple[str, Dict[str, Any]]], deleted_files: Sequence[str] = (),
+                 replace: bool = False) -> LexicalIndex:
+    """Merge freshly ingested chunks into the collection's persisted index.
+
+    Chunks for any file present in `chunks` replace that file's previous
+    entries, and `deleted_files` are dropped entirely. With `replace` (a full
+    ingest) the index is rebuilt from `chunks` alone, like the vector store.
+    """
+    idx = LexicalIndex(collection) if replace else load_index(collection)
+    chunks = list(chunks)
+    touched = {(meta or {}).get("file_path") for _, meta in chunks}
+    for fp in list(deleted_files) + [t for t in touched if t]:
+        idx.remove_file(fp)
+    for text, meta in chunks:
+        idx.add(text, meta)
+    idx.save()
+    return idx
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked key lists: score(d) = sum(1 / (k + rank_i(d)))."""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
@@ -3,11 +3,13 @@ from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import asyncio
 from fastapi.middleware.cors import CORSMiddleware
+import copy
 import os
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from pathlib import Path
 from agents.core.agents import MasterControlPanel
+from agents.core.cancellation import get_registry as get_cancel_registry, task_key
 from agents.services.task_queue import TaskQueue
 from agents.services.scheduler import SimpleScheduler
 from mcp.auth import check_admin_token
@@ -15,16 +17,24 @@ from mcp.metrics import TASKS_ENQUEUED, AGENT_RUNS, INGEST_COUNTER, metrics_resp
 from mcp.api import router as api_router
 from mcp.oauth import router as oauth_router
 from mcp.scheduler_api import router as scheduler_router
-from mcp.db import SessionLocal
+from mcp.db import SessionLocal, dispose_async_engine, run_write, stop_writer
 from mcp import models
+from mcp.config_store import rag_config as rag_config_snapshot
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 import logging
 import threading
 import subprocess
 import sys
 from datetime import datetime
-from mcp.redis_lock import acquire_lock_async, release_lock_async, acquire_lock_sync, release_lock_sync
+from mcp.redis_lock import LockManager
+from mcp.sentinels import ENTERED, LOCK_ACQUIRED, LOCK_CONFLICT, sentinel
 from mcp.artifacts import summarize_artifacts
+from mcp.embeddings import EmbeddingUnavailableError, deterministic_embedding, get_embedding
+from mcp.collection_registry import CollectionMismatchError, embed_for_collection
+from mcp.lexical import doc_key, flatten_payload, get_index as get_lexical_index, reciprocal_rank_fusion
+from mcp.rerank import rerank as rerank_hits
+from mcp.vector_store import backend_name as vector_backend_name, get_local_store, search_with_fallback
 
 app = FastAPI()
 # Configure CORS for local development. You can override origins with the
@@ -45,6 +55,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Page cursor of the /api list endpoints (mcp/pagination.py)
+    expose_headers=["X-Next-Cursor"],
 )
 app.include_router(api_router)
 app.include_router(oauth_router)
@@ -100,6 +112,10 @@ task_queue = None
 from agents.services.scheduler import DatabaseScheduler
 scheduler = DatabaseScheduler()
 
+# Periodic activity compression/archiving (mcp/activity_compaction.py)
+from mcp.activity_compaction import CompactionJob
+compaction_job = CompactionJob()
+
 # In-memory pubsub for server-sent events (SSE) per task id.
 # Maps task_id -> list of asyncio.Queue instances to push events to connected clients.
 TASK_EVENT_QUEUES: dict[int, list[asyncio.Queue]] = {}
@@ -111,6 +127,43 @@ try:
 except Exception:
     aioredis = None
 
+# Lease-based task locks (mcp/redis_lock.py); created at startup when Redis is available
+lock_manager = None
+# task_id -> Lease held by the /run-agents call running it in this process
+TASK_LEASES: dict = {}
+
+# Task statuses that end a run; their write is fenced against newer lock holders
+FINAL_STATUSES = ("done", "failed", "cancelled")
+
+
+def _lease_fence(task_id) -> Optional[int]:
+    try:
+        lease = TASK_LEASES.get(int(task_id))
+    except (TypeError, ValueError):
+        return None
+    return lease.fence if lease is not None else None
+
+
+async def _holds_current_lease(task_id) -> bool:
+    """False if this process's run of `task_id` was overtaken by a newer lock holder."""
+    try:
+        lease = TASK_LEASES.get(int(task_id))
+    except (TypeError, ValueError):
+        return True
+    if lease is None or lock_manager is None:
+        return True
+    try:
+        return await lock_manager.is_current(lease)
+    except Exception:
+        # Can't verify here; the fenced UPDATE in _publish_task_event still applies
+        return True
+
+
+def _redis_url() -> str:
+    # Prefer explicit REDIS_URL / CELERY_BROKER_URL but default to docker-compose service
+    return os.getenv('REDIS_URL') or os.getenv('CELERY_BROKER_URL') or 'redis://redis:6379/0'
+
+
 def _register_task_queue(task_id: int, q: asyncio.Queue):
     lst = TASK_EVENT_QUEUES.get(task_id)
     if lst is None:
@@ -151,51 +204,50 @@ async def _publish_task_event(task_id: int, event: dict):
             # ignore per-queue failures
             pass
 
+    if event.get("type") == "status" and event.get("status") in FINAL_STATUSES:
+        # The run is over; a cancel remembered for it in this process must not hit a rerun
+        get_cancel_registry().discard(str(task_id))
+        # A stale run (its lock was taken over) must not overwrite the final status
+        if not await _holds_current_lease(task_id):
+            logging.warning("Skipping final status %r for task %s: lock fence superseded by a newer run",
+                            event.get("status"), task_id)
+            return
+
+    # The final UPDATE only applies while the row still carries our fence
+    fence = _lease_fence(task_id) if event.get("type") == "status" and event.get("status") in FINAL_STATUSES else None
+
     # Persist certain event types to the database using a session-per-event
-    try:
-        async def _persist_event():
-            try:
-                def _sync_persist():
-                    db = SessionLocal()
-                    try:
-                        etype = event.get("type")
-                        if etype == "activity":
-                            # persist Activity row
-                            agent_name = event.get("agent")
-                            try:
-                                agent_obj = db.query(models.Agent).filter(models.Agent.name == agent_name).first() if agent_name else None
-                                agent_id = agent_obj.id if agent_obj else None
-                            except Exception:
-                                agent_id = None
-                            a = models.Activity(task_id=task_id, agent_id=agent_id, content=str(event.get("content")))
-                            db.add(a)
-                            db.commit()
-                        elif etype == "status":
-                            # update task status field
-                            try:
-                                t = db.query(models.Task).filter(models.Task.id == int(task_id)).first()
-                                if t is not None:
-                                    t.status = event.get("status")
-                                    db.add(t)
-                                    db.commit()
-                            except Exception:
-                                try:
-                                    db.rollback()
-                                except Exception:
-                                    pass
-                    finally:
-                        try:
-                            db.close()
-                        except Exception:
-                            pass
-
-                # run the sync DB work in a thread to avoid blocking the event loop
-                import asyncio as _asyncio
-                _asyncio.get_running_loop().run_in_executor(None, _sync_persist)
-            except Exception:
-                pass
+    async def _persist_event():
+        etype = event.get("type")
+        if etype not in ("activity", "status"):
+            return
+
+        def _write(db):
+            if etype == "activity":
+                # persist Activity row
+                agent_name = event.get("agent")
+                agent_id = None
+                if agent_name:
+                    agent_id = db.execute(
+                        select(models.Agent.id).where(models.Agent.name == agent_name)
+                    ).scalars().first()
+                db.add(models.Activity(task_id=task_id, agent_id=agent_id, content=str(event.get("content"))))
+            else:
+                # update task status field
+                stmt = update(models.Task).where(models.Task.id == int(task_id))
+                if fence is not None:
+                    stmt = stmt.where(models.Task.lock_fence == fence)
+                if not db.execute(stmt.values(status=event.get("status"))).rowcount and fence is not None:
+                    logging.warning("Skipping final status %r for task %s: fence %d superseded",
+                                    event.get("status"), task_id, fence)
+
+        try:
+            await run_write(_write)
+        except Exception:
+            logging.exception("Failed to persist %s event for task %s", etype, task_id)
 
-        # kick off persistence but don't await so publishing remains fast
+    # kick off persistence but don't await so publishing remains fast
+    try:
         asyncio.create_task(_persist_event())
     except Exception:
         pass
@@ -234,15 +286,15 @@ async def _startup():
 
 
     # If aioredis is available and a redis URL is configured, create a redis client
-    global redis_client, mcp
+    global redis_client, mcp, lock_manager
     try:
-        # Prefer explicit REDIS_URL / CELERY_BROKER_URL but default to docker-compose service
-        redis_url = os.getenv('REDIS_URL') or os.getenv('CELERY_BROKER_URL') or 'redis://redis:6379/0'
+        redis_url = _redis_url()
         if aioredis is not None and redis_url:
             try:
                 redis_client = aioredis.from_url(redis_url, decode_responses=True)
             except Exception:
                 redis_client = None
+            lock_manager = LockManager(redis_url)
     except Exception:
         redis_client = None
 
@@ -262,6 +314,8 @@ async def _startup():
         scheduler.mcp = mcp
         scheduler.start()
 
+    compaction_job.start()
+
 
 @app.on_event("shutdown")
 async def _shutdown():
@@ -276,93 +330,53 @@ async def _shutdown():
         await scheduler.stop_all()
     except Exception:
         pass
-
-# Optional imports for embeddings and qdrant client (used by the similarity endpoint)
-OpenAIEmbeddings = None
-try:
-    from langchain_openai import OpenAIEmbeddings  # type: ignore
-except Exception:
     try:
-        from langchain.embeddings import OpenAIEmbeddings  # type: ignore
+        await compaction_job.stop()
     except Exception:
-        OpenAIEmbeddings = None
+        pass
+    try:
+        await dispose_async_engine()
+    except Exception:
+        pass
+    try:
+        await asyncio.to_thread(stop_writer)
+    except Exception:
+        pass
 
+# Optional qdrant client (used by the similarity endpoint)
 try:
     from qdrant_client import QdrantClient  # type: ignore
 except Exception:
     QdrantClient = None
 
-# Prefer the OpenAI v1 client when available
-try:
-    from openai import OpenAI as OpenAIClient  # type: ignore
-except Exception:
-    OpenAIClient = None
-
-
-def deterministic_embedding(text: str, dim: int = 1536):
-    import hashlib
-    import numpy as _np
 
-    h = hashlib.sha256(text.encode("utf-8")).digest()
-    vals = []
-    i = 0
-    while len(vals) < dim:
-        b = h[i % len(h)]
-        vals.append((b / 255.0) * 2.0 - 1.0)
-        i += 1
-    vec = _np.array(vals[:dim], dtype=float)
-    norm = _np.linalg.norm(vec)
-    if norm > 0:
-        vec = vec / norm
-    return vec.tolist()
+async def _handle_until_disconnect(request: Request, task: dict):
+    """Run `mcp.handle_task`, cancelling the run if the caller goes away first.
 
-
-def get_embedding(text: str):
-    # If in-app mock is configured, call the mock embeddings endpoint directly
-    try:
-        if os.getenv('IN_APP_OPENAI_MOCK'):
-            try:
-                import requests as _requests
-                base = os.getenv('IN_APP_OPENAI_MOCK_BASE') or os.getenv('OPENAI_API_BASE') or 'http://localhost:8001/openai-mock'
-                url = base.rstrip('/') + '/v1/embeddings'
-                payload = {'input': text, 'model': 'text-embedding-mock'}
-                r = _requests.post(url, json=payload, timeout=10)
-                r.raise_for_status()
-                j = r.json()
-                if isinstance(j, dict) and j.get('data') and isinstance(j['data'], list):
-                    return j['data'][0].get('embedding')
-            except Exception:
-                logging.exception('Failed to call in-app OpenAI mock embeddings; falling back')
-    except Exception:
-        pass
-    # 1) If an OpenAI API key is present prefer the OpenAI v1 client (higher-fidelity)
-    if os.getenv("OPENAI_API_KEY") and OpenAIClient is not None:
-        try:
-            client = OpenAIClient()
-            resp = client.embeddings.create(model="text-embedding-3-small", input=text)
-            # resp.data[0].embedding is the vector
-            return resp.data[0].embedding
-        except Exception:
-            # fall through to other options
-            pass
-
-    # 2) Try LangChain's OpenAIEmbeddings wrapper if available
-    if OpenAIEmbeddings is not None:
+    Callers that fire and forget (e.g. /api/tasks) set `"detach": true` so the
+    run outlives their request.
+    """
+    run = asyncio.ensure_future(mcp.handle_task(task))
+    if task.get("detach"):
+        return await run
+    key = task_key(task)
+    interval = float(os.getenv("RUN_AGENTS_DISCONNECT_POLL", "1.0") or 1.0)
+    while True:
+        done, _ = await asyncio.wait({run}, timeout=interval)
+        if done:
+            return run.result()
         try:
-            emb = OpenAIEmbeddings()  # type: ignore
-            try:
-                return emb.embed_documents([text])[0]
-            except Exception:
-                return emb.embed_query(text)
+            gone = await request.is_disconnected()
         except Exception:
-            pass
-
-    # 3) Deterministic fallback — use 1536 to match common OpenAI embedding size
-    return deterministic_embedding(text, dim=1536)
+            gone = False
+        if gone:
+            logging.info("Client disconnected from /run-agents; cancelling task %s", key)
+            get_cancel_registry().cancel(key, "client disconnected")
+            return await run
 
 
 @app.post("/run-agents")
-async def run_agents(task: dict):
+async def run_agents(task: dict, request: Request):
     """Accept a task JSON and dispatch to the Agent framework.
 
     Example request body:
@@ -371,23 +385,13 @@ async def run_agents(task: dict):
         "description": "Integration tests failing on branch X",
         "files": ["pipeline.py"]
     }
+
+    If the client disconnects before the agents finish, the run is cancelled
+    (see agents/core/cancellation.py) unless the body sets `"detach": true`.
     """
-    # Verbose debug: log incoming payload and mark entry so we can trace
-    # whether the lock path is being exercised in production runs.
-    try:
-        logging.info("RUN_AGENTS_DBG: received task payload: %s", json.dumps(task))
-    except Exception:
-        logging.info("RUN_AGENTS_DBG: received task (non-serializable)")
-    # Sentinel: write a small line to /tmp so tests can deterministically detect handler entry
-    try:
-        try:
-            tid = task.get('id') if isinstance(task, dict) else 'N/A'
-        except Exception:
-            tid = 'N/A'
-        with open('/tmp/run_agents_entered.log', 'a', encoding='utf-8') as _fh:
-            _fh.write(f"{datetime.utcnow().isoformat()} RUN_AGENTS_ENTERED id={tid}\n")
-    except Exception:
-        logging.exception("RUN_AGENTS_DBG: failed to write run_agents sentinel")
+    task_id_repr = task.get('id') if isinstance(task, dict) else None
+    logging.debug("run-agents: received task id=%s", task_id_repr)
+    sentinel(ENTERED, f"RUN_AGENTS_ENTERED id={task_id_repr if task_id_repr is not None else 'N/A'}")
 
     # If caller provided artifact paths, build a concise summary and attach to description
     try:
@@ -432,250 +436,102 @@ async def run_agents(task: dict):
     except Exception:
         pass
 
-    # Quick up-front Redis lock existence check: if an external process already
-    # holds the lock for this task, return 409 immediately. This avoids doing
-    # DB lookups when a worker or another API instance already owns the task.
+    # One atomic lock attempt (SET NX + fencing token in a single script on the
+    # pooled client) before any DB work, so a duplicate run is rejected after one
+    # Redis round trip. The lease is renewed in the background while we run.
+    lock_key = None
+    lease = None
     try:
         if isinstance(task, dict) and task.get('id') is not None:
-            task_id_quick = int(task.get('id'))
-            try:
-                redis_url = os.getenv('REDIS_URL') or os.getenv('CELERY_BROKER_URL') or 'redis://redis:6379/0'
-                key = f"task:{task_id_quick}:lock"
-                logging.info("RUN_AGENTS_DBG: up-front check for key=%s using redis_url=%s aioredis=%s redis_client=%s", key, redis_url, bool(aioredis), bool(redis_client))
-                # prefer existing async client
-                if aioredis is not None and redis_client is not None:
-                    try:
-                        v = await redis_client.get(key)
-                        logging.info("RUN_AGENTS_DBG: async redis get for %s -> %s", key, str(v))
-                        if v:
-                            logging.info("Up-front check: lock present for %s, rejecting run", key)
-                            try:
-                                with open('/tmp/run_agents_lock_conflict.log', 'a', encoding='utf-8') as _cf:
-                                    _cf.write(f"{datetime.utcnow().isoformat()} UPFRONT_CONFLICT key={key} method=async value={str(v)}\n")
-                            except Exception:
-                                logging.exception('RUN_AGENTS_DBG: failed writing upfront conflict sentinel')
-                            raise HTTPException(status_code=409, detail=f"Task {task_id_quick} is already running")
-                    except Exception:
-                        logging.exception("RUN_AGENTS_DBG: Up-front async redis check failed for %s", key)
-                else:
-                    # try a short sync get via executor (redis-py)
-                    if redis_url:
-                        try:
-                            import redis as _redis
-                            def _get():
-                                c = _redis.from_url(redis_url, decode_responses=True)
-                                return c.get(key)
-                            val = await asyncio.get_running_loop().run_in_executor(None, _get)
-                            logging.info("RUN_AGENTS_DBG: sync redis get for %s -> %s", key, str(val))
-                            if val:
-                                logging.info("Up-front check: lock present for %s (sync), rejecting run", key)
-                                try:
-                                    with open('/tmp/run_agents_lock_conflict.log', 'a', encoding='utf-8') as _cf:
-                                        _cf.write(f"{datetime.utcnow().isoformat()} UPFRONT_CONFLICT key={key} method=sync value={str(val)}\n")
-                                except Exception:
-                                    logging.exception('RUN_AGENTS_DBG: failed writing upfront sync conflict sentinel')
-                                raise HTTPException(status_code=409, detail=f"Task {task_id_quick} is already running")
-                        except HTTPException:
-                            raise
-                        except Exception:
-                            logging.exception("RUN_AGENTS_DBG: Up-front sync redis check failed for %s", key)
-            except HTTPException:
-                # propagate conflict
-                raise
-            except Exception:
-                # non-fatal: proceed to DB-level checks
-                logging.exception("RUN_AGENTS_DBG: Up-front redis existence check encountered an error; continuing with DB fallback")
-
-    except Exception:
-        # keep behavior conservative: fall through to existing logic on unexpected errors
-        pass
+            lock_key = f"task:{int(task.get('id'))}:lock"
+    except (TypeError, ValueError):
+        lock_key = None
+    if lock_key is not None:
+        try:
+            if lock_manager is None:
+                raise RuntimeError("no redis lock manager available")
+            run_key = task_key(task)
+
+            async def _lease_lost(lost):
+                # Another run may take over; stop spending tokens on this one
+                get_cancel_registry().cancel(run_key, "lock lease lost")
+
+            lease = await lock_manager.acquire(lock_key, on_lost=_lease_lost)
+            if lease is None:
+                logging.info("Lock %s already held; rejecting run", lock_key)
+                sentinel(LOCK_CONFLICT, f"LOCK_CONFLICT key={lock_key} method=async")
+                raise HTTPException(status_code=409, detail=f"Task {task.get('id')} is already running")
+            sentinel(LOCK_ACQUIRED, f"LOCK_ACQUIRED key={lock_key} method=async token_len={len(lease.token)} fence={lease.fence}")
+            TASK_LEASES[int(task.get('id'))] = lease
+        except HTTPException:
+            raise
+        except Exception:
+            logging.warning("Redis lock unavailable for %s; falling back to DB-only duplicate protection", lock_key, exc_info=True)
+            lease = None
 
-    # If a task id was provided (from /api/tasks creation), persist status and activities
-    db: Session = None
+    # If a task id was provided (from /api/tasks creation), mark it running and
+    # enrich the task from its row. The session is closed before agents start so
+    # a long run doesn't hold a pooled connection.
     task_record = None
-    lock_acquired = False
-    lock_token = None
-    lock_client = None
-
-    try:
-        if isinstance(task, dict) and task.get('id') is not None:
-            db = SessionLocal()
-            try:
-                task_record = db.query(models.Task).filter(models.Task.id == int(task.get('id'))).first()
-                if task_record:
-                    # Attempt distributed lock first (if redis is configured)
-                    try:
-                        redis_url = os.getenv('REDIS_URL') or os.getenv('CELERY_BROKER_URL') or 'redis://redis:6379/0'
-                        lock_key = f"task:{task_record.id}:lock"
-                        lock_ttl = int(os.getenv('TASK_LOCK_TTL', '3600'))
-                        logging.info("RUN_AGENTS_DBG: attempting lock acquisition for %s using redis_url=%s aioredis=%s redis_client=%s",
-                                     lock_key, redis_url, bool(aioredis), bool(redis_client))
-
-                        # Prefer module-level async client
-                        if aioredis is not None and redis_client is not None:
-                            logging.info("RUN_AGENTS_DBG: Attempting async redis lock for %s via module client", lock_key)
-                            lock_token = await acquire_lock_async(redis_client, lock_key, lock_ttl)
-                            if lock_token is None:
-                                logging.info("RUN_AGENTS_DBG: Redis lock for %s already held (async client)", lock_key)
-                                try:
-                                    with open('/tmp/run_agents_lock_conflict.log', 'a', encoding='utf-8') as _cf:
-                                        _cf.write(f"{datetime.utcnow().isoformat()} LOCK_CONFLICT key={lock_key} method=async\n")
-                                except Exception:
-                                    logging.exception('RUN_AGENTS_DBG: failed writing async conflict sentinel')
-                                try:
-                                    db.close()
-                                except Exception:
-                                    pass
-                                raise HTTPException(status_code=409, detail=f"Task {task_record.id} is already running")
-                            # success
-                            try:
-                                with open('/tmp/run_agents_lock_acquired.log', 'a', encoding='utf-8') as _af:
-                                    _af.write(f"{datetime.utcnow().isoformat()} LOCK_ACQUIRED key={lock_key} method=async token_len={len(lock_token) if lock_token else 0}\n")
-                            except Exception:
-                                logging.exception('RUN_AGENTS_DBG: failed writing async acquired sentinel')
-                            lock_acquired = True
-                            lock_client = redis_client
-
-                        else:
-                            # Try a sync redis client via executor
-                            if redis_url:
-                                try:
-                                    import asyncio as _asyncio
-
-                                    def _acquire_sync():
-                                        return acquire_lock_sync(redis_url, lock_key, lock_ttl)
-
-                                    client_token = await _asyncio.get_running_loop().run_in_executor(None, _acquire_sync)
-                                    if client_token and client_token[1] is not None:
-                                        lock_client, lock_token = client_token
-                                        lock_acquired = True
-                                        try:
-                                            with open('/tmp/run_agents_lock_acquired.log', 'a', encoding='utf-8') as _af:
-                                                _af.write(f"{datetime.utcnow().isoformat()} LOCK_ACQUIRED key={lock_key} method=sync token_len={len(lock_token) if lock_token else 0}\n")
-                                        except Exception:
-                                            logging.exception('RUN_AGENTS_DBG: failed writing sync acquired sentinel')
-                                    else:
-                                        try:
-                                            with open('/tmp/run_agents_lock_conflict.log', 'a', encoding='utf-8') as _cf:
-                                                _cf.write(f"{datetime.utcnow().isoformat()} LOCK_CONFLICT key={lock_key} method=sync\n")
-                                        except Exception:
-                                            logging.exception('RUN_AGENTS_DBG: failed writing sync conflict sentinel')
-                                        try:
-                                            db.close()
-                                        except Exception:
-                                            pass
-                                        raise HTTPException(status_code=409, detail=f"Task {task_record.id} is already running")
-                                except HTTPException:
-                                    raise
-                                except Exception:
-                                    logging.exception("Sync redis lock attempt failed; falling back to DB-only duplicate protection")
-
-                    except HTTPException:
-                        raise
-                    except Exception:
-                        logging.exception("Redis lock acquisition failed; falling back to DB-only duplicate protection")
-
-                    # If we didn't get a redis lock, perform an atomic DB update
-                    if not lock_acquired:
-                        try:
-                            rows = db.query(models.Task).filter(models.Task.id == int(task_record.id), models.Task.status != 'running').update({"status": "running"}, synchronize_session=False)
-                            db.commit()
-                            if not rows:
-                                try:
-                                    db.close()
-                                except Exception:
-                                    pass
-                                raise HTTPException(status_code=409, detail=f"Task {task_record.id} is already running")
-                        except HTTPException:
-                            raise
-                        except Exception:
-                            try:
-                                db.rollback()
-                            except Exception:
-                                pass
-                            try:
-                                task_record.status = 'running'
-                                db.add(task_record)
-                                db.commit()
-                            except Exception:
-                                try:
-                                    db.rollback()
-                                except Exception:
-                                    pass
-                    else:
-                        try:
-                            task_record.status = 'running'
-                            db.add(task_record)
-                            db.commit()
-                        except Exception:
-                            try:
-                                db.rollback()
-                            except Exception:
-                                pass
+    if lock_key is not None:
+
+        def _mark_running(db):
+            record = db.get(models.Task, int(task.get('id')))
+            if record is None:
+                return None, False
+            if lease is None:
+                # Without a redis lock, an atomic DB update guards against duplicate runs
+                result = db.execute(
+                    update(models.Task)
+                    .where(models.Task.id == record.id, models.Task.status != 'running')
+                    .values(status='running', lock_fence=None)
+                )
+                return record, bool(result.rowcount)
+            record.status = 'running'
+            record.lock_fence = lease.fence
+            return record, True
 
-                    try:
-                        asyncio.create_task(_publish_task_event(task_record.id, {"type": "status", "status": "running"}))
-                    except Exception:
-                        pass
-                    
-                    # Enrich task dict with database fields for agent processing
-                    task["description"] = task_record.description or ""
-                    task["id"] = task_record.id
-                    task["title"] = task_record.title or task.get("title", "")
-                    logging.info(f"RUN_AGENTS_DBG: Enriched task dict with description (len={len(task.get('description',''))}), title={task.get('title')}")
-            except Exception:
-                try:
-                    db.rollback()
-                except Exception:
-                    pass
-    except HTTPException:
-        raise
-    except Exception:
         try:
-            if db:
-                db.rollback()
+            task_record, claimed = await run_write(_mark_running)
+            if task_record is not None and not claimed:
+                sentinel(LOCK_CONFLICT, f"LOCK_CONFLICT key={lock_key} method=db")
+                raise HTTPException(status_code=409, detail=f"Task {task_record.id} is already running")
+        except HTTPException:
+            if lease is not None:
+                TASK_LEASES.pop(int(task.get('id')), None)
+                await lock_manager.release(lease)
+            raise
         except Exception:
-            pass
+            logging.exception("Failed to mark task %s running", task.get('id'))
+
+        if task_record is not None:
+            try:
+                asyncio.create_task(_publish_task_event(task_record.id, {"type": "status", "status": "running"}))
+            except Exception:
+                pass
+
+            # Enrich task dict with database fields for agent processing
+            task["description"] = task_record.description or ""
+            task["id"] = task_record.id
+            task["title"] = task_record.title or task.get("title", "")
 
     try:
-        results = await mcp.handle_task(task)
+        results = await _handle_until_disconnect(request, task)
         return {"results": results}
     except Exception as e:
-        try:
-            if task_record is not None:
-                try:
-                    task_record.status = 'failed'
-                    db.add(task_record)
-                    db.commit()
-                except Exception:
-                    try:
-                        db.rollback()
-                    except Exception:
-                        pass
-                try:
-                    await _publish_task_event(task_record.id, {"type": "status", "status": "failed"})
-                except Exception:
-                    pass
-        except Exception:
-            pass
+        if task_record is not None:
+            # Persisted by the publisher, which skips it if a newer run holds the lock
+            try:
+                await _publish_task_event(task_record.id, {"type": "status", "status": "failed"})
+            except Exception:
+                pass
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         # release redis lock if we acquired it
-        try:
-            if lock_acquired and lock_client is not None and lock_token is not None:
-                try:
-                    logging.info("Releasing redis lock for task:%s", task_record.id if task_record else 'N/A')
-                    await release_lock_async(lock_client, f"task:{task_record.id}:lock" if task_record else None, lock_token)
-                    logging.debug("Released redis lock for task:%s", task_record.id if task_record else 'N/A')
-                except Exception:
-                    logging.exception("Failed to release redis lock for task:%s", task_record.id if task_record else 'N/A')
-        except Exception:
-            pass
-        try:
-            if db:
-                db.close()
-        except Exception:
-            pass
+        if lease is not None:
+            if TASK_LEASES.get(int(task.get('id'))) is lease:
+                TASK_LEASES.pop(int(task.get('id')), None)
+            await lock_manager.release(lease)
 
 
 @app.get("/health")
@@ -683,6 +539,83 @@ async def health():
     return {"status": "ok"}
 
 
+def _normalize_hit(item) -> Dict[str, Any]:
+    """Convert a Qdrant point (object or dict) into the `/similarity-search` hit shape."""
+    payload = None
+    if hasattr(item, "payload"):
+        payload = item.payload
+    elif isinstance(item, dict):
+        payload = item.get("payload") or item.get("document")
+    else:
+        payload = getattr(item, "point", None)
+
+    if isinstance(payload, dict):
+        # Qdrant points written by LangChain nest file_path/source under `metadata`
+        payload = flatten_payload(payload)
+    if isinstance(payload, dict):
+        text = payload.get("text") or payload.get("page_content") or str(payload)
+    else:
+        text = str(payload)
+    # Extract score/metadata if present
+    score = None
+    source = None
+    try:
+        if hasattr(item, "score"):
+            score = float(item.score)
+        elif isinstance(item, dict):
+            score = item.get("score") or item.get("payload", {}).get("score")
+    except Exception:
+        score = None
+
+    if isinstance(payload, dict):
+        # look for common source/metadata fields
+        source = payload.get("source") or payload.get("source_id")
+
+    hit = {"text": text}
+    if score is not None:
+        hit["score"] = score
+    if source is not None:
+        hit["source"] = source
+    hit["_key"] = doc_key(payload if isinstance(payload, dict) else None, text)
+    return hit
+
+
+def _query_vector(query: str, collection: str) -> list:
+    """Embed `query` with the model the collection was indexed with (see `mcp.collection_registry`)."""
+    try:
+        return embed_for_collection(query, collection)
+    except CollectionMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except EmbeddingUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+def _dense_search(q_vector: list, collection: str, limit: int) -> list:
+    if vector_backend_name() != "local" and QdrantClient is None and not get_local_store().has_collection(collection):
+        raise HTTPException(status_code=500, detail="qdrant-client is not installed in the environment")
+
+    # Qdrant (QDRANT_URL) first; in `auto` mode a failed query falls back to the
+    # embedded local store when the collection has been ingested there.
+    try:
+        items = search_with_fallback(collection, q_vector, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Qdrant query failed: {e}")
+    return [_normalize_hit(item) for item in items]
+
+
+def _sparse_search(query: str, collection: str, limit: int) -> list:
+    idx = get_lexical_index(collection)
+    hits = []
+    for key, score in idx.search(query, limit=limit):
+        doc = idx.docs[key]
+        hit = {"text": doc["text"], "score": score, "_key": key}
+        source = doc["meta"].get("source") or doc["meta"].get("source_id")
+        if source is not None:
+            hit["source"] = source
+        hits.append(hit)
+    return hits
+
+
 @app.post("/similarity-search")
 async def similarity_search(body: dict):
     """Run a similarity search against Qdrant.
@@ -691,134 +624,103 @@ async def similarity_search(body: dict):
     {
       "query": "search text",
       "k": 3,
-      "collection": "rag-poc"
+      "collection": "rag-poc",
+      "mode": "dense" | "sparse" | "hybrid",
+      "rerank": false,
+      "token_budget": 1500
     }
+
+    `hybrid` over-fetches from both the dense (Qdrant) and sparse (BM25)
+    indexes and fuses the two rankings with reciprocal-rank fusion, which
+    recovers exact identifiers (function names, error codes, JIRA keys)
+    that pure vector search misses.
+
+    With `rerank` set, `k * RAG_RERANK_OVERFETCH` candidates are retrieved,
+    rescored by the configured reranker (see `mcp.rerank`) and trimmed to
+    at most `k` results whose combined size fits `token_budget`.
     """
     query = body.get("query")
     if not query:
         raise HTTPException(status_code=400, detail="Missing 'query' in request body")
     k = int(body.get("k", 3))
     collection = body.get("collection")
-
-    # If collection not provided, try to read from persisted RAG config
+    mode = (body.get("mode") or "dense").lower()
+    if mode not in ("dense", "sparse", "hybrid"):
+        raise HTTPException(status_code=400, detail="'mode' must be one of: dense, sparse, hybrid")
+    do_rerank = bool(body.get("rerank"))
+    token_budget = body.get("token_budget")
+    token_budget = int(token_budget) if token_budget is not None else None
+    fetch_k = k * int(os.getenv("RAG_RERANK_OVERFETCH", "4")) if do_rerank else k
+
+    # If collection not provided, try to read from persisted RAG config (read-only snapshot)
     try:
-        cfg = load_rag_config()
+        cfg = rag_config_snapshot.get()
         if collection is None:
             collection = cfg.get("collection", "rag-poc")
     except Exception:
         collection = collection or "rag-poc"
 
-    if QdrantClient is None:
-        raise HTTPException(status_code=500, detail="qdrant-client is not installed in the environment")
-
-    q_vector = get_embedding(query)
+    # Embed once, up front: a model/dimension mismatch with the collection's
+    # registry record is refused here rather than failing inside Qdrant.
+    q_vector = None
+    if mode != "sparse":
+        q_vector = await asyncio.to_thread(_query_vector, query, collection)
 
-    # Determine Qdrant host (when running inside container use service name)
-    qdrant_url = os.getenv("QDRANT_URL") or "http://qdrant:6333"
-
-    try:
-        client = QdrantClient(url=qdrant_url)
-        resp = client.query_points(collection_name=collection, query=q_vector, limit=k)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Qdrant query failed: {e}")
-
-    # Normalize results
-    hits = []
-    if hasattr(resp, "result"):
-        items = resp.result
+    if mode == "dense":
+        hits = await asyncio.to_thread(_dense_search, q_vector, collection, fetch_k)
+    elif mode == "sparse":
+        hits = await asyncio.to_thread(_sparse_search, query, collection, fetch_k)
     else:
-        items = getattr(resp, "hits", getattr(resp, "points", []))
-
-    for item in items:
-        payload = None
-        if hasattr(item, "payload"):
-            payload = item.payload
-        elif isinstance(item, dict):
-            payload = item.get("payload") or item.get("document")
-        else:
-            payload = getattr(item, "point", None)
-
-        if isinstance(payload, dict):
-            text = payload.get("text") or payload.get("page_content") or str(payload)
-        else:
-            text = str(payload)
-        # Extract score/metadata if present
-        score = None
-        source = None
-        try:
-            if hasattr(item, "score"):
-                score = float(item.score)
-            elif isinstance(item, dict):
-                score = item.get("score") or item.get("payload", {}).get("score")
-        except Exception:
-            score = None
-
-        if isinstance(payload, dict):
-            # look for common source/metadata fields
-            source = payload.get("source") or payload.get("metadata") or payload.get("source_id")
-
-        hit = {"text": text}
-        if score is not None:
+        fetch = max(fetch_k * int(os.getenv("RAG_HYBRID_OVERFETCH", "4")), 20)
+        sparse_hits, dense_hits = await asyncio.gather(
+            asyncio.to_thread(_sparse_search, query, collection, fetch),
+            asyncio.to_thread(_dense_search, q_vector, collection, fetch),
+            return_exceptions=True,
+        )
+        if isinstance(sparse_hits, BaseException):
+            raise sparse_hits
+        if isinstance(dense_hits, HTTPException) and sparse_hits:
+            # Lexical results alone are still useful when Qdrant is unavailable
+            dense_hits = []
+        elif isinstance(dense_hits, BaseException):
+            raise dense_hits
+        by_key: Dict[str, Dict[str, Any]] = {}
+        for h in sparse_hits + dense_hits:
+            by_key.setdefault(h["_key"], h)
+        fused = reciprocal_rank_fusion(
+            [[h["_key"] for h in dense_hits], [h["_key"] for h in sparse_hits]],
+            k=int(os.getenv("RAG_RRF_K", "60")),
+        )
+        hits = []
+        for key, score in fused[:fetch_k]:
+            hit = dict(by_key[key])
             hit["score"] = score
-        if source is not None:
-            hit["source"] = source
+            hits.append(hit)
 
-        hits.append(hit)
+    if do_rerank:
+        hits = await asyncio.to_thread(rerank_hits, query, hits, k, token_budget)
 
-    return {"query": query, "results": hits}
+    for h in hits:
+        h.pop("_key", None)
+    return {"query": query, "mode": mode, "results": hits}
 
 
 # --- RAG selection persistence and API ---
-RAG_CONFIG_PATH = Path(__file__).resolve().parent.parent / "agents" / "core" / "rag_config.json"
+RAG_CONFIG_PATH = rag_config_snapshot.path
 
 
 def load_rag_config() -> Dict[str, Any]:
-    try:
-        if not RAG_CONFIG_PATH.exists():
-            return {"repos": [], "collection": "rag-poc"}
-        with open(RAG_CONFIG_PATH, "r", encoding="utf-8") as fh:
-            cfg = json.load(fh)
-            # normalize shape for backward compatibility
-            if "collection" not in cfg:
-                cfg.setdefault("collection", "rag-poc")
-            if "repos" not in cfg:
-                # support old `repo` key or missing repos
-                if cfg.get("repo"):
-                    cfg["repos"] = [cfg.get("repo")]
-                    cfg.pop("repo", None)
-                else:
-                    cfg["repos"] = []
-            # normalize each repo entry to an object
-            out_repos = []
-            for r in cfg.get("repos", []):
-                if isinstance(r, str):
-                    out_repos.append({"url": r, "auto_ingest": True})
-                elif isinstance(r, dict):
-                    # ensure required keys and defaults
-                    o = dict(r)
-                    o.setdefault("url", "")
-                    o.setdefault("auto_ingest", True)
-                    # optional fields: collection, branches
-                    if "branches" in o and o.get("branches") is None:
-                        o.pop("branches", None)
-                    out_repos.append(o)
-            cfg["repos"] = out_repos
-            return cfg
-    except Exception:
-        return {"repos": [], "collection": "rag-poc"}
+    """The normalized RAG config; a private copy of the in-memory snapshot."""
+    return copy.deepcopy(rag_config_snapshot.get())
 
 
 def save_rag_config(cfg: Dict[str, Any]):
-    try:
-        RAG_CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
-        # normalize: ensure repos is a list
-        if "repos" not in cfg:
-            cfg["repos"] = [] if cfg.get("repo") is None else [cfg.get("repo")]
-            cfg.pop("repo", None)
-        with open(RAG_CONFIG_PATH, "w", encoding="utf-8") as fh:
-            json.dump(cfg, fh, indent=2)
-    except Exception as e:
-        raise
+    # normalize: ensure repos is a list
+    if "repos" not in cfg:
+        cfg["repos"] = [] if cfg.get("repo") is None else [cfg.get("repo")]
+        cfg.pop("repo", None)
+    # atomic file replace; readers in this process see the new snapshot at once
+    rag_config_snapshot.write(cfg)
 
 
 # Background ingest helper: spawn a daemon thread that runs the ingest script
@@ -1018,6 +920,15 @@ async def webhook_github(request: Request):
         description = issue.get("body", "")
 
     task = {"title": title, "description": description, "files": files, "source": "github"}
+    if event == "push" and body.get("ref"):
+        # A newer push to the same branch supersedes any run still queued or in flight for it
+        repo_info = body.get("repository") or {}
+        repo_name = repo_info.get("full_name") or repo_info.get("clone_url") or repo_info.get("html_url") or ""
+        task["supersede_key"] = f"github:{repo_name}:{body.get('ref')}"
+        try:
+            await asyncio.to_thread(get_cancel_registry().supersede, task["supersede_key"], task_key(task))
+        except Exception:
+            _logger.exception("Failed to supersede earlier runs for %s", task["supersede_key"])
     task_queue.enqueue(task)
     try:
         TASKS_ENQUEUED.inc()
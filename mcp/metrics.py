@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Gauge, generate_latest, CollectorRegistry
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CollectorRegistry
 from prometheus_client import CONTENT_TYPE_LATEST
 from prometheus_client import multiprocess
 import os
@@ -9,9 +9,21 @@ registry = CollectorRegistry()
 INGEST_COUNTER = Counter("rag_ingest_total", "Total RAG ingests", registry=registry)
 TASKS_ENQUEUED = Counter("mcp_tasks_enqueued_total", "Tasks enqueued to MCP", registry=registry)
 AGENT_RUNS = Counter("mcp_agent_runs_total", "Agent runs", ["agent"], registry=registry)
+LLM_PROMPT_TOKENS = Counter("llm_prompt_tokens_total", "Prompt tokens sent to the LLM", ["agent"], registry=registry)
+LLM_CACHED_PROMPT_TOKENS = Counter("llm_cached_prompt_tokens_total", "Prompt tokens served from the provider prefix cache", ["agent"], registry=registry)
 
 # Gauges
 QDRANT_POINTS = Gauge("qdrant_points", "Number of points in a qdrant collection", ["collection"], registry=registry)
+LLM_INFLIGHT = Gauge("llm_governor_inflight", "LLM calls currently admitted by the governor", registry=registry)
+LLM_QUEUE_DEPTH = Gauge("llm_governor_queue_depth", "LLM calls waiting for a governor slot", registry=registry)
+
+# Histograms
+LLM_QUEUE_WAIT = Histogram(
+    "llm_governor_queue_wait_seconds",
+    "Time LLM calls wait for rate-limit/concurrency admission",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120),
+    registry=registry,
+)
 
 
 def metrics_response():
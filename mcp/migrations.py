@@ -0,0 +1,132 @@
+"""Lightweight schema migrations run by `init_db`.
+
+`Base.metadata.create_all` only creates missing tables, so columns and
+indexes added to the models never reach databases created earlier. Each
+entry in `MIGRATIONS` is a `(version, apply)` pair; `apply(conn)` runs in
+its own transaction and the version is then recorded in the
+`schema_migrations` table, so every migration runs once per database.
+Migrations must be idempotent (check before creating) because a fresh
+database already gets the current schema from `create_all`, and two
+processes may start at the same time.
+
+Migrations describe tables by name rather than through `mcp.models`, so
+later model changes don't alter what an old migration does.
+"""
+import logging
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Index, Integer, LargeBinary, MetaData, String, Table, Text, inspect, insert, select,
+)
+from sqlalchemy.dialects.mysql import LONGBLOB
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import false, func
+
+_logger = logging.getLogger(__name__)
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", String(128), primary_key=True),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def create_index(conn: Connection, name: str, table: str, *columns: str,
+                 mysql_length: Optional[Dict[str, int]] = None) -> bool:
+    """Create index `name` on `table(columns)` unless it (or the table) is missing; True if created."""
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        return False
+    if any(ix.get("name") == name for ix in inspector.get_indexes(table)):
+        return False
+    t = Table(table, MetaData(), *(Column(c) for c in columns))
+    kwargs = {"mysql_length": mysql_length} if mysql_length else {}
+    Index(name, *(t.c[c] for c in columns), **kwargs).create(bind=conn)
+    _logger.info("Created index %s on %s(%s)", name, table, ", ".join(columns))
+    return True
+
+
+def add_column(conn: Connection, table: str, column: Column) -> bool:
+    """`ALTER TABLE ... ADD COLUMN` unless the column (or the table) is missing; True if added."""
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        return False
+    if any(c["name"] == column.name for c in inspector.get_columns(table)):
+        return False
+    Table(table, MetaData(), column)
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f"ALTER TABLE {conn.dialect.identifier_preparer.quote(table)} ADD COLUMN {ddl}")
+    _logger.info("Added column %s.%s", table, column.name)
+    return True
+
+
+def _hot_path_indexes(conn: Connection) -> None:
+    # list_tasks, get_task, event persistence, the scheduler and incremental ingest
+    create_index(conn, "ix_tasks_owner_created", "tasks", "owner_id", "created_at", "id")
+    create_index(conn, "ix_activities_task_created", "activities", "task_id", "created_at", "id")
+    create_index(conn, "ix_agents_name", "agents", "name")
+    create_index(conn, "ix_scheduled_tasks_due", "scheduled_tasks", "is_active", "next_run_at")
+    create_index(conn, "ix_indexed_commits_lookup", "indexed_commits",
+                 "repo_url", "branch", "collection", "indexed_at",
+                 mysql_length={"repo_url": 255, "branch": 100, "collection": 100})
+
+
+def _activity_compaction(conn: Connection) -> None:
+    # Columns and archive table used by mcp/activity_compaction.py
+    payload = LargeBinary().with_variant(LONGBLOB(), "mysql")
+    add_column(conn, "activities", Column("summary", Text, nullable=True))
+    add_column(conn, "activities", Column("content_gz", payload, nullable=True))
+    add_column(conn, "activities", Column("archived", Boolean, nullable=False, server_default=false()))
+    Table(
+        "activities_archive",
+        MetaData(),
+        Column("activity_id", Integer, primary_key=True),
+        Column("task_id", Integer, nullable=True, index=True),
+        Column("agent_id", Integer, nullable=True),
+        Column("content_gz", payload, nullable=True),
+        Column("created_at", DateTime(timezone=True), nullable=True),
+        Column("archived_at", DateTime(timezone=True), server_default=func.now()),
+    ).create(bind=conn, checkfirst=True)
+
+
+def _task_lock_fence(conn: Connection) -> None:
+    # Fencing token of the run that last claimed the task (mcp.mcp.run_agents)
+    add_column(conn, "tasks", Column("lock_fence", Integer, nullable=True))
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_hot_path_indexes", _hot_path_indexes),
+    ("0002_activity_compaction", _activity_compaction),
+    ("0003_task_lock_fence", _task_lock_fence),
+]
+
+
+def applied_versions(conn: Connection) -> Set[str]:
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """Apply pending migrations in order; returns the versions applied now."""
+    schema_migrations.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+    done: List[str] = []
+    for version, apply in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                apply(conn)
+                conn.execute(insert(schema_migrations).values(version=version))
+        except Exception:
+            # Another process may have applied it concurrently
+            with engine.connect() as conn:
+                if version in applied_versions(conn):
+                    continue
+            raise
+        _logger.info("Applied schema migration %s", version)
+        done.append(version)
+    return done
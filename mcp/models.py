@@ -1,7 +1,11 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, LargeBinary
+from sqlalchemy.dialects.mysql import LONGBLOB
+from sqlalchemy.sql import false, func
 from .db import Base
 
+# gzip'd activity content; MySQL's plain BLOB stops at 64 KiB
+CompressedPayload = LargeBinary().with_variant(LONGBLOB(), "mysql")
+
 
 class User(Base):
     __tablename__ = "users"
@@ -13,6 +17,7 @@ class User(Base):
 
 class Agent(Base):
     __tablename__ = "agents"
+    __table_args__ = (Index("ix_agents_name", "name"),)
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(256), nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -23,6 +28,7 @@ class Agent(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (Index("ix_tasks_owner_created", "owner_id", "created_at", "id"),)
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(512), nullable=False)
     description = Column(Text, nullable=True)
@@ -31,15 +37,40 @@ class Task(Base):
     status = Column(String(32), default="pending")
     logo_url = Column(String(512), nullable=True)  # URL or data:image/png;base64 for logo display
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Lock fencing token of the run that claimed the task; its final status
+    # write only applies while this still matches (see mcp.mcp._publish_task_event)
+    lock_fence = Column(Integer, nullable=True)
 
 
 class Activity(Base):
     __tablename__ = "activities"
+    __table_args__ = (Index("ix_activities_task_created", "task_id", "created_at", "id"),)
     id = Column(Integer, primary_key=True, index=True)
     task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True)
     agent_id = Column(Integer, ForeignKey("agents.id"), nullable=True)
     content = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set by the compaction job (mcp/activity_compaction.py): older rows keep
+    # only `summary` and gzip'd `content_gz`; past retention the payload moves
+    # to ActivityArchive and `archived` is set.
+    summary = Column(Text, nullable=True)
+    content_gz = Column(CompressedPayload, nullable=True)
+    archived = Column(Boolean, nullable=False, default=False, server_default=false())
+
+
+class ActivityArchive(Base):
+    """Full content of activities past the retention window.
+
+    The `activities` row stays behind as a summary row with `archived` set,
+    so timelines are unchanged and the content is loaded only on request.
+    """
+    __tablename__ = "activities_archive"
+    activity_id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=True, index=True)
+    agent_id = Column(Integer, nullable=True)
+    content_gz = Column(CompressedPayload, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
 class IndexedCommit(Base):
@@ -48,6 +79,11 @@ class IndexedCommit(Base):
     Used for incremental git diff-based updates to Qdrant vector database.
     """
     __tablename__ = "indexed_commits"
+    __table_args__ = (
+        # Prefix lengths keep the key under InnoDB's 3072-byte limit with utf8mb4
+        Index("ix_indexed_commits_lookup", "repo_url", "branch", "collection", "indexed_at",
+              mysql_length={"repo_url": 255, "branch": 100, "collection": 100}),
+    )
     id = Column(Integer, primary_key=True, index=True)
     repo_url = Column(String(512), nullable=False, index=True)
     branch = Column(String(256), nullable=False, index=True, default="main")
@@ -58,9 +94,28 @@ class IndexedCommit(Base):
     chunk_count = Column(Integer, nullable=True)  # Number of chunks created
 
 
+class CollectionMeta(Base):
+    """Embedding settings a vector collection was created with.
+
+    Written on first ingest into a collection and checked on every later
+    ingest and query, so vectors from a different model or dimension are
+    refused up front instead of failing (or silently mismatching) at Qdrant.
+    """
+    __tablename__ = "collection_meta"
+    id = Column(Integer, primary_key=True, index=True)
+    collection = Column(String(256), nullable=False, unique=True, index=True)
+    embedding_model = Column(String(256), nullable=False)
+    dim = Column(Integer, nullable=False)
+    distance = Column(String(32), nullable=False, default="cosine")
+    chunker_version = Column(String(64), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class ScheduledTask(Base):
     """Represents a user-defined recurring task."""
     __tablename__ = "scheduled_tasks"
+    __table_args__ = (Index("ix_scheduled_tasks_due", "is_active", "next_run_at"),)
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(256), nullable=False)
     # schedule_type: 'interval' (seconds) or 'cron'
@@ -8,6 +8,7 @@ import jwt
 from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import RedirectResponse, JSONResponse
 from .db import SessionLocal
+from .user_cache import invalidate_user
 from .models import User
 
 router = APIRouter()
@@ -166,6 +167,8 @@ def auth_callback(request: Request, provider: str = Query("github"), code: Optio
             db.add(user)
             db.commit()
             db.refresh(user)
+            # Clear any cached "unknown user" left by an earlier API call
+            invalidate_user(username)
     finally:
         db.close()
 
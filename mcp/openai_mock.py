@@ -1,26 +1,10 @@
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-import hashlib
-import typing
+from mcp.embeddings import deterministic_matrix
 
 app = FastAPI()
 
 
-def _deterministic_vector(text: str, dim: int = 1536) -> typing.List[float]:
-    h = hashlib.sha256(text.encode('utf-8')).digest()
-    vals: typing.List[float] = []
-    i = 0
-    while len(vals) < dim:
-        b = h[i % len(h)]
-        vals.append((b / 255.0) * 2.0 - 1.0)
-        i += 1
-    # normalize
-    norm = sum(x * x for x in vals) ** 0.5
-    if norm > 0:
-        vals = [x / norm for x in vals]
-    return vals
-
-
 @app.post('/v1/chat/completions')
 async def chat_completions(req: Request):
     body = await req.json()
@@ -102,10 +86,10 @@ async def embeddings(req: Request):
     else:
         texts = [str(input_data)]
     
-    # Generate deterministic embeddings for each text
+    # Generate deterministic embeddings for the whole batch in one pass
+    vectors = deterministic_matrix([text or 'empty' for text in texts]).tolist()
     data = []
-    for idx, text in enumerate(texts):
-        vec = _deterministic_vector(text or 'empty')
+    for idx, vec in enumerate(vectors):
         data.append({
             'object': 'embedding',
             'embedding': vec,
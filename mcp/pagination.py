@@ -0,0 +1,93 @@
+"""Keyset (cursor) pagination over `(created_at, id)`.
+
+List endpoints return a plain JSON array, as before, and put the cursor for
+the following page in the `X-Next-Cursor` response header (absent on the
+last page). Clients pass it back as `?cursor=`. Each page is one index range
+scan on `(..., created_at, id)` (see `mcp/migrations.py`), so the cost of a
+page does not grow with the number of rows before it, unlike OFFSET.
+
+Cursors are opaque base64url tokens; a malformed one raises `ValueError`.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import Response
+from sqlalchemy import DateTime, and_, literal, or_
+from sqlalchemy.dialects.sqlite import DATETIME as SQLITE_DATETIME
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# SQLite's CURRENT_TIMESTAMP (our server default) has no fractional part;
+# bind second-precision cursors the same way so equal timestamps compare equal.
+_SQLITE_SECONDS = SQLITE_DATETIME(
+    storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+)
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_LIMIT
+    return min(int(limit), MAX_LIMIT)
+
+
+def encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat() if created_at else None, int(row_id)])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return (datetime.fromisoformat(created) if created else None), int(row_id)
+    except Exception as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+def _timestamp(value: datetime):
+    if value.microsecond:
+        return literal(value, DateTime(timezone=True))
+    return literal(value, DateTime(timezone=True).with_variant(_SQLITE_SECONDS, "sqlite"))
+
+
+def keyset_after(created_col, id_col, cursor: Optional[str], descending: bool = False):
+    """WHERE clause selecting rows after `cursor` in `(created_at, id)` order, or None."""
+    if not cursor:
+        return None
+    created_at, row_id = decode_cursor(cursor)
+    if created_at is None:
+        return id_col < row_id if descending else id_col > row_id
+    ts = _timestamp(created_at)
+    if descending:
+        return or_(created_col < ts, and_(created_col == ts, id_col < row_id))
+    return or_(created_col > ts, and_(created_col == ts, id_col > row_id))
+
+
+def keyset_order(created_col, id_col, descending: bool = False) -> List[Any]:
+    if descending:
+        return [created_col.desc(), id_col.desc()]
+    return [created_col.asc(), id_col.asc()]
+
+
+def page(rows: Sequence[Any], limit: int, response: Optional[Response] = None) -> List[Any]:
+    """Trim a `limit + 1` fetch to `limit` rows and set the next-page header."""
+    items = list(rows[:limit])
+    if len(rows) > limit and items and response is not None:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return items
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str], default: Sequence[str]) -> List[str]:
+    """Validate a comma-separated `fields=` projection; raises `ValueError` on unknown names."""
+    if not fields:
+        return list(default)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [n for n in names if n not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names
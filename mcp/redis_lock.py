@@ -5,11 +5,29 @@ so multiple processes (FastAPI + Celery workers) can coordinate task runs.
 
 It prefers `redis.asyncio` for async usage and `redis` (sync) for worker
 processes. Functions are intentionally small and tolerate missing Redis.
+
+`LockManager` is the lease-based variant used by `/run-agents`: locks get a
+short TTL (`TASK_LEASE_TTL`, default 30s) that a background task keeps
+renewing while the holder is alive (every `TASK_LEASE_RENEW_SECONDS`,
+default a third of the TTL), so long runs keep their lock and a crashed
+process releases it within one TTL. Every acquisition also takes a
+monotonically increasing fencing token from `<key>:fence`; a run that lost its lease can't overwrite the
+result of the run that took over because `is_current` compares fences (and
+the task row records the fence of the run that claimed it). Clients come from a
+per-event-loop connection pool (`REDIS_LOCK_POOL_SIZE`, default 10).
 """
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
 from uuid import uuid4
-from typing import Optional, Tuple
+from typing import Awaitable, Callable, Dict, Optional, Tuple
 
 DEFAULT_TTL = 60 * 60  # 1 hour
+DEFAULT_LEASE_TTL = 30.0
+
+_logger = logging.getLogger(__name__)
 
 try:
     import redis.asyncio as aioredis  # type: ignore
@@ -22,8 +40,12 @@ except Exception:
     redis_sync = None
 
 
-async def acquire_lock_async(redis_client, key: str, ttl: int = DEFAULT_TTL) -> Optional[str]:
-    """Attempt to set a lock key with a random token. Returns the token if acquired, else None."""
+async def acquire_lock_async(redis_client, key: str, ttl: int = DEFAULT_TTL, raise_errors: bool = False) -> Optional[str]:
+    """Attempt to set a lock key with a random token. Returns the token if acquired, else None.
+
+    With `raise_errors`, Redis failures propagate instead of looking like a
+    held lock, so the caller can fall back to DB-only protection.
+    """
     if redis_client is None or aioredis is None:
         return None
     token = uuid4().hex
@@ -33,7 +55,8 @@ async def acquire_lock_async(redis_client, key: str, ttl: int = DEFAULT_TTL) ->
             return token
     except Exception:
         # swallow — caller can fallback to DB-only protection
-        pass
+        if raise_errors:
+            raise
     return None
 
 
@@ -63,18 +86,35 @@ async def release_lock_async(redis_client, key: str, token: str) -> None:
         pass
 
 
-def acquire_lock_sync(redis_url: str, key: str, ttl: int = DEFAULT_TTL) -> Tuple[Optional[object], Optional[str]]:
+# One pooled sync client per URL; redis-py clients are thread-safe.
+_SYNC_CLIENTS: Dict[str, object] = {}
+_SYNC_CLIENTS_LOCK = threading.Lock()
+
+
+def get_sync_client(redis_url: str):
+    """Shared sync client for `redis_url` (None if redis-py is missing)."""
+    if redis_sync is None or not redis_url:
+        return None
+    with _SYNC_CLIENTS_LOCK:
+        client = _SYNC_CLIENTS.get(redis_url)
+        if client is None:
+            client = _SYNC_CLIENTS[redis_url] = redis_sync.from_url(redis_url, decode_responses=True)
+        return client
+
+
+def acquire_lock_sync(redis_url: str, key: str, ttl: int = DEFAULT_TTL, raise_errors: bool = False) -> Tuple[Optional[object], Optional[str]]:
     """Synchronous acquire for worker processes. Returns (client, token) if acquired else (None, None)."""
     if redis_sync is None or not redis_url:
         return (None, None)
     try:
-        client = redis_sync.from_url(redis_url, decode_responses=True)
+        client = get_sync_client(redis_url)
         token = uuid4().hex
         ok = client.set(key, token, nx=True, ex=ttl)
         if ok:
             return (client, token)
     except Exception:
-        pass
+        if raise_errors:
+            raise
     return (None, None)
 
 
@@ -106,3 +146,123 @@ def release_lock_sync(redis_client, key: str, token: str) -> None:
                     pass
     except Exception:
         pass
+
+
+# SET NX the lock and, only if that succeeded, take the next fencing token.
+_ACQUIRE_LUA = """
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    local fence = redis.call('incr', KEYS[2])
+    redis.call('expire', KEYS[2], 604800)
+    return fence
+end
+return 0
+"""
+
+# Extend the lease only while we still hold it.
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+@dataclass
+class Lease:
+    key: str
+    token: str
+    fence: int
+    lost: bool = False
+    _renewer: Optional["asyncio.Task"] = field(default=None, repr=False)
+
+
+class LockManager:
+    """Short-TTL task locks with background renewal and fencing tokens."""
+
+    def __init__(self, url: str, ttl: Optional[float] = None, renew_every: Optional[float] = None, pool_size: Optional[int] = None):
+        self.url = url
+        self.ttl = ttl if ttl is not None else _env_float("TASK_LEASE_TTL", DEFAULT_LEASE_TTL)
+        self.renew_every = renew_every if renew_every is not None else _env_float("TASK_LEASE_RENEW_SECONDS", self.ttl / 3)
+        self.pool_size = pool_size if pool_size is not None else int(_env_float("REDIS_LOCK_POOL_SIZE", 10))
+        self._clients: Dict[int, object] = {}
+
+    def client(self):
+        """The pooled client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(id(loop))
+        if client is None:
+            pool = aioredis.BlockingConnectionPool.from_url(
+                self.url, max_connections=self.pool_size, timeout=self.ttl, decode_responses=True
+            )
+            client = self._clients[id(loop)] = aioredis.Redis(connection_pool=pool)
+        return client
+
+    async def acquire(self, key: str, on_lost: Optional[Callable[[Lease], Awaitable[None]]] = None) -> Optional[Lease]:
+        """Take the lock or return None if it is held. Redis errors propagate.
+
+        While held, the lease is renewed in the background; if renewal fails
+        for a whole TTL (or the key now belongs to someone else) the lease is
+        marked lost and `on_lost(lease)` is awaited.
+        """
+        token = uuid4().hex
+        fence = int(await self.client().eval(_ACQUIRE_LUA, 2, key, f"{key}:fence", token, int(self.ttl * 1000)))
+        if not fence:
+            return None
+        lease = Lease(key, token, fence)
+        lease._renewer = asyncio.ensure_future(self._renew(lease, on_lost))
+        return lease
+
+    async def _renew(self, lease: Lease, on_lost) -> None:
+        expires = asyncio.get_running_loop().time() + self.ttl
+        while True:
+            await asyncio.sleep(self.renew_every)
+            now = asyncio.get_running_loop().time()
+            try:
+                held = await self.client().eval(_RENEW_LUA, 1, lease.key, lease.token, int(self.ttl * 1000))
+            except Exception:
+                _logger.warning("Lease renewal for %s failed", lease.key, exc_info=True)
+                if now < expires - self.renew_every:
+                    continue
+                held = 0  # the key has (or is about to have) expired
+            if held:
+                expires = now + self.ttl
+                continue
+            lease.lost = True
+            _logger.warning("Lost lock %s (fence %d); another run may take over", lease.key, lease.fence)
+            if on_lost is not None:
+                try:
+                    await on_lost(lease)
+                except Exception:
+                    _logger.exception("on_lost callback failed for %s", lease.key)
+            return
+
+    async def is_current(self, lease: Lease) -> bool:
+        """True unless someone acquired the lock after us (their fence is higher).
+
+        Decided by the fence alone: a lease flagged `lost` after a renewal
+        hiccup is still current as long as nobody else took the lock.
+        """
+        latest = await self.client().get(f"{lease.key}:fence")
+        return latest is None or int(latest) == lease.fence
+
+    async def release(self, lease: Lease) -> None:
+        if lease._renewer is not None:
+            lease._renewer.cancel()
+        try:
+            await self.client().eval(_RELEASE_LUA, 1, lease.key, lease.token)
+        except Exception:
+            _logger.warning("Failed to release lock %s; it expires within %ss", lease.key, self.ttl, exc_info=True)
@@ -0,0 +1,148 @@
+"""Second-stage reranking for retrieved chunks, with a prompt token budget.
+
+Retrieval over-fetches candidates; a reranker rescores them against the
+query and `select_within_budget` keeps the best few that fit in a token
+budget, so agent prompts carry fewer, better chunks.
+
+Two scorers are available, chosen with `RAG_RERANKER`:
+
+- `lexical` (default): deterministic, dependency-free term-overlap scorer.
+- `cross-encoder`: a local `sentence_transformers.CrossEncoder` model
+  (`RAG_RERANK_MODEL`, CPU-friendly MiniLM by default). Falls back to the
+  lexical scorer when the package or model is unavailable.
+"""
+import logging
+import math
+import os
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+from mcp.lexical import tokenize
+
+try:
+    from sentence_transformers import CrossEncoder  # type: ignore
+except Exception:
+    CrossEncoder = None
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token) used for budgeting."""
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
+
+
+class LexicalReranker:
+    """Scores candidates by weighted query-term overlap.
+
+    Terms are weighted by their rarity within the candidate set, and a small
+    prior from the original retrieval rank breaks ties.
+    """
+
+    name = "lexical"
+
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        q_terms = set(tokenize(query))
+        if not q_terms or not texts:
+            return [0.0 for _ in texts]
+        tfs = [Counter(tokenize(t)) for t in texts]
+        n = len(texts)
+        df = Counter()
+        for tf in tfs:
+            df.update(term for term in q_terms if term in tf)
+        scores = []
+        for rank, tf in enumerate(tfs, start=1):
+            s = 0.0
+            matched = 0
+            for term in q_terms:
+                c = tf.get(term, 0)
+                if not c:
+                    continue
+                matched += 1
+                idf = math.log(1.0 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                s += (1.0 + math.log(c)) * idf
+            coverage = matched / len(q_terms)
+            scores.append(s * (0.5 + coverage) + 1.0 / (60 + rank))
+        return scores
+
+
+class CrossEncoderReranker:
+    name = "cross-encoder"
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.model = CrossEncoder(model_name or os.getenv("RAG_RERANK_MODEL") or DEFAULT_CROSS_ENCODER, device="cpu")
+
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        if not texts:
+            return []
+        return [float(s) for s in self.model.predict([(query, t) for t in texts])]
+
+
+_RERANKER = None
+
+
+def get_reranker():
+    """Return the process-wide reranker configured by `RAG_RERANKER`."""
+    global _RERANKER
+    if _RERANKER is not None:
+        return _RERANKER
+    kind = (os.getenv("RAG_RERANKER") or "lexical").lower()
+    if kind == "cross-encoder" and CrossEncoder is not None:
+        try:
+            _RERANKER = CrossEncoderReranker()
+            return _RERANKER
+        except Exception:
+            _logger.exception("Failed to load cross-encoder reranker; using lexical scorer")
+    _RERANKER = LexicalReranker()
+    return _RERANKER
+
+
+def select_within_budget(items: Sequence[Dict[str, Any]], top_k: int, token_budget: Optional[int] = None, text_key: str = "text") -> List[Dict[str, Any]]:
+    """Take items in order until `top_k` or `token_budget` is reached.
+
+    The first item is always kept (truncated to the budget if needed) so a
+    tight budget never yields an empty context.
+    """
+    out: List[Dict[str, Any]] = []
+    used = 0
+    for item in items:
+        if len(out) >= top_k:
+            break
+        text = str(item.get(text_key) or "")
+        cost = estimate_tokens(text)
+        if token_budget is not None and used + cost > token_budget:
+            if out:
+                break
+            item = dict(item)
+            item[text_key] = text[: max(0, token_budget) * 4]
+            cost = estimate_tokens(item[text_key])
+        out.append(item)
+        used += cost
+    return out
+
+
+def rerank(query: str, items: Sequence[Dict[str, Any]], top_k: int, token_budget: Optional[int] = None, text_key: str = "text", reranker=None) -> List[Dict[str, Any]]:
+    """Rescore `items` against `query` and return the best `top_k` within budget.
+
+    Each returned item gains a `rerank_score` field; the original `score`
+    (vector or fusion score) is left untouched.
+    """
+    if not items:
+        return []
+    reranker = reranker or get_reranker()
+    texts = [str(it.get(text_key) or "") for it in items]
+    try:
+        scores = reranker.score(query, texts)
+    except Exception:
+        _logger.exception("Reranker %s failed; keeping retrieval order", getattr(reranker, "name", reranker))
+        scores = [-float(i) for i in range(len(items))]
+    ranked = []
+    for it, s in sorted(zip(items, scores), key=lambda p: p[1], reverse=True):
+        it = dict(it)
+        it["rerank_score"] = s
+        ranked.append(it)
+    return select_within_budget(ranked, top_k, token_budget, text_key=text_key)
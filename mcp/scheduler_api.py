@@ -1,17 +1,18 @@
 
 from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 import json
-from mcp.db import SessionLocal
+from mcp.db import add_row, get_async_db, run_write
 from mcp import models
-from mcp.api import get_db, get_current_user
+from mcp.api import get_current_user
 
 router = APIRouter(prefix="/api/scheduler", tags=["scheduler"])
 
 @router.get("/tasks")
-def list_scheduled_tasks(db: Session = Depends(get_db), user = Depends(get_current_user)):
-    tasks = db.query(models.ScheduledTask).order_by(models.ScheduledTask.id.desc()).all()
+async def list_scheduled_tasks(db: AsyncSession = Depends(get_async_db), user = Depends(get_current_user)):
+    tasks = (await db.execute(select(models.ScheduledTask).order_by(models.ScheduledTask.id.desc()))).scalars().all()
     out = []
     for t in tasks:
         out.append({
@@ -28,7 +29,7 @@ def list_scheduled_tasks(db: Session = Depends(get_db), user = Depends(get_curre
     return out
 
 @router.post("/tasks")
-def create_scheduled_task(payload: dict, user = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_scheduled_task(payload: dict, user = Depends(get_current_user)):
     """
     Create a new scheduled task.
     Payload: {
@@ -57,17 +58,14 @@ def create_scheduled_task(payload: dict, user = Depends(get_current_user), db: S
         task_payload=tPayload,
         is_active=True
     )
-    db.add(st)
-    db.commit()
-    db.refresh(st)
+    st = await run_write(lambda w: add_row(w, st))
     return {"id": st.id, "name": st.name}
 
 @router.delete("/tasks/{task_id}")
-def delete_scheduled_task(task_id: int, user = Depends(get_current_user), db: Session = Depends(get_db)):
-    t = db.query(models.ScheduledTask).filter(models.ScheduledTask.id == task_id).first()
+async def delete_scheduled_task(task_id: int, user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    t = await db.get(models.ScheduledTask, task_id)
     if not t:
         raise HTTPException(status_code=404, detail="Scheduled task not found")
     
-    db.delete(t)
-    db.commit()
+    await run_write(lambda w: w.execute(delete(models.ScheduledTask).where(models.ScheduledTask.id == task_id)))
     return {"status": "deleted", "id": task_id}
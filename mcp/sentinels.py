@@ -0,0 +1,89 @@
+"""Opt-in debug sentinel files for the /run-agents lock smoke tests.
+
+With `RUN_AGENTS_DEBUG_SENTINELS=1` the handler records entry, lock
+acquisition and lock conflicts as one line each in
+
+- `/tmp/run_agents_entered.log`
+- `/tmp/run_agents_lock_acquired.log`
+- `/tmp/run_agents_lock_conflict.log`
+
+(directory overridable with `RUN_AGENTS_SENTINEL_DIR`), which
+`scripts/run_lock_smoke.*` read from the container. Lines go through a
+`QueueHandler`, so the request path only enqueues a record; a background
+`QueueListener` thread does the file writes. When the flag is off,
+`sentinel()` returns immediately.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Optional
+
+ENTERED = "entered"
+LOCK_ACQUIRED = "lock_acquired"
+LOCK_CONFLICT = "lock_conflict"
+
+_FILES = {
+    ENTERED: "run_agents_entered.log",
+    LOCK_ACQUIRED: "run_agents_lock_acquired.log",
+    LOCK_CONFLICT: "run_agents_lock_conflict.log",
+}
+
+_logger: Optional[logging.Logger] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_init_lock = threading.Lock()
+
+
+def sentinels_enabled() -> bool:
+    return (os.getenv("RUN_AGENTS_DEBUG_SENTINELS") or "").lower() in ("1", "true", "yes", "on")
+
+
+class _KindFilter(logging.Filter):
+    def __init__(self, kind: str):
+        super().__init__()
+        self.kind = kind
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return getattr(record, "sentinel", None) == self.kind
+
+
+def _stop(listener: logging.handlers.QueueListener) -> None:
+    # Flush pending lines; tolerate a listener already stopped
+    if getattr(listener, "_thread", None) is not None:
+        listener.stop()
+
+
+def _sentinel_logger() -> logging.Logger:
+    global _logger, _listener
+    with _init_lock:
+        if _logger is None:
+            base = os.getenv("RUN_AGENTS_SENTINEL_DIR") or "/tmp"
+            handlers = []
+            for kind, name in _FILES.items():
+                fh = logging.FileHandler(os.path.join(base, name), encoding="utf-8", delay=True)
+                fh.setFormatter(logging.Formatter("%(message)s"))
+                fh.addFilter(_KindFilter(kind))
+                handlers.append(fh)
+            q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+            _listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=False)
+            _listener.start()
+            atexit.register(_stop, _listener)
+            logger = logging.getLogger("mcp.run_agents.sentinels")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            logger.handlers = [logging.handlers.QueueHandler(q)]
+            _logger = logger
+        return _logger
+
+
+def sentinel(kind: str, message: str) -> None:
+    """Record one `<timestamp> <message>` line in the sentinel file for `kind`."""
+    if not sentinels_enabled():
+        return
+    try:
+        _sentinel_logger().info("%s %s", datetime.utcnow().isoformat(), message, extra={"sentinel": kind})
+    except Exception:
+        logging.getLogger(__name__).debug("Failed to record %s sentinel", kind, exc_info=True)
@@ -0,0 +1,100 @@
+"""Single writer thread for SQLite deployments.
+
+SQLite allows one writer at a time; with several threads and processes
+inserting `Activity` rows, committing status changes and advancing
+schedules, writers queue on the database lock and stall ("database is
+locked"). `SQLiteWriter` owns one thread and one session factory, and every
+write in the process is submitted to it as a callable `fn(session)` which
+runs in its own transaction. Reads keep using the normal engines and, with
+WAL enabled (see `mcp.db.sqlite_pragmas`), never wait for the writer.
+
+Writes from other processes (the Celery worker) still contend for the file
+lock, which `busy_timeout` absorbs.
+"""
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class SQLiteWriter:
+    """Runs write callables one at a time on a dedicated thread."""
+
+    def __init__(self, session_factory: Callable[[], Any], name: str = "sqlite-writer"):
+        self.session_factory = session_factory
+        self.name = name
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            fn, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._execute(fn))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+    def _execute(self, fn: Callable[[Any], T]) -> T:
+        session = self.session_factory()
+        try:
+            result = fn(session)
+            session.commit()
+            return result
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def in_writer_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, fn: Callable[[Any], T]) -> "Future[T]":
+        """Queue `fn(session)`; the future resolves once it has committed."""
+        future: "Future[T]" = Future()
+        if self.in_writer_thread():
+            # Nested write from inside a write callable: run it inline
+            try:
+                future.set_result(self._execute(fn))
+            except BaseException as exc:
+                future.set_exception(exc)
+            return future
+        self._ensure_started()
+        self._queue.put((fn, future))
+        return future
+
+    def call(self, fn: Callable[[Any], T]) -> T:
+        """Run `fn(session)` on the writer and wait for its result."""
+        return self.submit(fn).result()
+
+    async def run(self, fn: Callable[[Any], T]) -> T:
+        """Await `fn(session)` on the writer without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn))
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """Finish queued writes and stop the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
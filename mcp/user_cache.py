@@ -0,0 +1,99 @@
+"""In-process cache of bearer token -> user for `mcp.api.get_current_user`.
+
+Every API call authenticates, so a hit must not touch the database. Entries
+are immutable `CachedUser` snapshots, kept for USER_CACHE_TTL seconds (60).
+Unknown users (only possible with AUTH_AUTO_CREATE_USERS=0) are cached as
+misses for USER_CACHE_NEGATIVE_TTL seconds (30) so a bad token can't force
+a lookup per request. At most USER_CACHE_MAX_ENTRIES (10000) are kept, least
+recently used first out.
+
+Nothing in the app changes a user's role after creation, and there is
+deliberately no endpoint for it while the API runs on MVP bearer-as-username
+auth. A role edited directly in the database is therefore picked up once the
+cached entry expires: USER_CACHE_TTL is the only bound on staleness.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    id: int
+    username: str
+    email: Optional[str]
+    role: Optional[str]
+
+    @classmethod
+    def from_row(cls, row) -> "CachedUser":
+        return cls(id=row.id, username=row.username, email=row.email, role=row.role)
+
+
+# Marker for a cached "no such user"
+MISSING = object()
+
+
+class UserCache:
+    def __init__(self, ttl: Optional[float] = None, negative_ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else _env_float("USER_CACHE_TTL", 60)
+        self.negative_ttl = negative_ttl if negative_ttl is not None else _env_float("USER_CACHE_NEGATIVE_TTL", 30)
+        self.max_entries = max_entries or int(_env_float("USER_CACHE_MAX_ENTRIES", 10000))
+        self._entries: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Union[CachedUser, object, None]:
+        """The cached user, `MISSING` for a cached miss, or None if not cached."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+            return value
+
+    def _store(self, username: str, value: object, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[username] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, user: CachedUser) -> CachedUser:
+        self._store(user.username, user, self.ttl)
+        return user
+
+    def put_missing(self, username: str) -> None:
+        self._store(username, MISSING, self.negative_ttl)
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def invalidate_user(username: str) -> None:
+    """Drop `username` from this process's cache (after any change to the row)."""
+    user_cache.invalidate(username)
+
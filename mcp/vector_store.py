@@ -0,0 +1,366 @@
+"""Vector store backends behind a common interface.
+
+`QdrantVectorStore` wraps the remote Qdrant service. `LocalVectorStore` is an
+in-process alternative for dev boxes, CI and edge deployments: each
+collection is a float32 matrix persisted to disk and memory-mapped for
+search, with brute-force cosine search for small collections and a simple
+IVF (inverted file over k-means centroids) once a collection grows past
+`RAG_LOCAL_IVF_MIN` rows. Every write produces a new generation directory
+and then atomically repoints the collection's `CURRENT` file at it.
+
+Backend selection uses `RAG_VECTOR_BACKEND`:
+
+- `qdrant`: always use Qdrant.
+- `local`: always use the local store (no network).
+- `auto` (default): use Qdrant, falling back to the local store when
+  `qdrant-client` is missing or the query fails. Ingest writes both, so the
+  fallback serves the same collection.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from qdrant_client import QdrantClient  # type: ignore
+    from qdrant_client.http import models as qdrant_models  # type: ignore
+except Exception:
+    QdrantClient = None
+    qdrant_models = None
+
+_logger = logging.getLogger(__name__)
+
+_DEFAULT_DIR = Path(__file__).resolve().parent.parent / "data" / "vectors"
+
+
+class VectorStore:
+    """Minimal interface shared by ingest and search."""
+
+    name = "base"
+
+    def ensure_collection(self, collection: str, dim: int) -> None:
+        raise NotImplementedError
+
+    def upsert(self, collection: str, vectors: Sequence[Sequence[float]], payloads: Sequence[Dict[str, Any]]) -> int:
+        raise NotImplementedError
+
+    def replace(self, collection: str, vectors: Sequence[Sequence[float]], payloads: Sequence[Dict[str, Any]]) -> int:
+        """Make the collection hold exactly these rows (a full re-ingest)."""
+        raise NotImplementedError
+
+    def delete_by_file_path(self, collection: str, file_path: str) -> None:
+        raise NotImplementedError
+
+    def search(self, collection: str, vector: Sequence[float], limit: int) -> List[Dict[str, Any]]:
+        """Return hits shaped as `{"id", "score", "payload"}`, best first."""
+        raise NotImplementedError
+
+
+class QdrantVectorStore(VectorStore):
+    name = "qdrant"
+
+    def __init__(self, url: Optional[str] = None):
+        if QdrantClient is None:
+            raise RuntimeError("qdrant-client is not installed in the environment")
+        self.url = url or os.getenv("QDRANT_URL") or "http://qdrant:6333"
+        self.client = QdrantClient(url=self.url)
+
+    def ensure_collection(self, collection: str, dim: int) -> None:
+        try:
+            self.client.get_collection(collection_name=collection)
+        except Exception:
+            params = qdrant_models.VectorParams(size=dim, distance=qdrant_models.Distance.COSINE)
+            self.client.recreate_collection(collection_name=collection, vectors_config=params)
+
+    @staticmethod
+    def _point_ids(payloads: Sequence[Dict[str, Any]]) -> List[str]:
+        # file_path + chunk ordinal within the file: re-ingesting a file overwrites its
+        # points instead of colliding with other batches
+        seen: Dict[str, int] = {}
+        ids = []
+        for p in payloads:
+            path = str(p.get("file_path") or p.get("source") or "")
+            n = seen[path] = seen.get(path, -1) + 1
+            ids.append(str(uuid.uuid5(uuid.NAMESPACE_URL, f"{path}\x00{n}")))
+        return ids
+
+    def upsert(self, collection, vectors, payloads) -> int:
+        ids = self._point_ids(payloads)
+        points = [qdrant_models.PointStruct(id=i, vector=list(v), payload=p) for i, v, p in zip(ids, vectors, payloads)]
+        if points:
+            self.client.upsert(collection_name=collection, points=points)
+        return len(points)
+
+    def replace(self, collection, vectors, payloads) -> int:
+        n = self.upsert(collection, vectors, payloads)
+        # Then drop every point this ingest didn't write (removed files, shrunk files)
+        keep = self._point_ids(payloads)
+        selector = qdrant_models.Filter(must_not=[qdrant_models.HasIdCondition(has_id=keep)]) if keep else qdrant_models.Filter()
+        self.client.delete(collection_name=collection, points_selector=qdrant_models.FilterSelector(filter=selector))
+        return n
+
+    def delete_by_file_path(self, collection, file_path) -> None:
+        self.client.delete(
+            collection_name=collection,
+            points_selector=qdrant_models.FilterSelector(
+                filter=qdrant_models.Filter(
+                    must=[qdrant_models.FieldCondition(key="file_path", match=qdrant_models.MatchValue(value=file_path))]
+                )
+            ),
+        )
+
+    def search(self, collection, vector, limit) -> List[Dict[str, Any]]:
+        resp = self.client.query_points(collection_name=collection, query=list(vector), limit=limit)
+        items = getattr(resp, "points", None) or getattr(resp, "result", None) or []
+        return [{"id": getattr(p, "id", None), "score": float(getattr(p, "score", 0.0)), "payload": getattr(p, "payload", None) or {}} for p in items]
+
+
+class _LocalCollection:
+    """One generation of a collection: vectors.f32 (row-major float32), payloads.json,
+    meta.json and, for large collections, ivf_centroids.npy / ivf_assign.npy."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.meta: Dict[str, Any] = {}
+        self.vectors: Optional[np.ndarray] = None
+        self.payloads: List[Dict[str, Any]] = []
+        self.centroids: Optional[np.ndarray] = None
+        self.assign: Optional[np.ndarray] = None
+
+    @property
+    def dim(self) -> int:
+        return int(self.meta.get("dim") or 0)
+
+    def load(self) -> "_LocalCollection":
+        with open(self.path / "meta.json", "r", encoding="utf-8") as fh:
+            self.meta = json.load(fh)
+        with open(self.path / "payloads.json", "r", encoding="utf-8") as fh:
+            self.payloads = json.load(fh)
+        count = int(self.meta.get("count") or 0)
+        if count and self.dim:
+            self.vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r", shape=(count, self.dim))
+        else:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        if (self.path / "ivf_centroids.npy").exists():
+            self.centroids = np.load(self.path / "ivf_centroids.npy")
+            self.assign = np.load(self.path / "ivf_assign.npy")
+        else:
+            self.centroids = None
+            self.assign = None
+        return self
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32)
+
+
+def _kmeans(data: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means on normalized rows; returns (centroids, assignment)."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    assign = np.zeros(len(data), dtype=np.int32)
+    for _ in range(iters):
+        assign = np.argmax(data @ centroids.T, axis=1).astype(np.int32)
+        for c in range(k):
+            members = data[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize_rows(centroids)
+    return centroids, assign
+
+
+class LocalVectorStore(VectorStore):
+    """Embedded float32 vector index persisted under `RAG_LOCAL_VECTOR_DIR`."""
+
+    name = "local"
+
+    def __init__(self, base_dir: Optional[str] = None):
+        self.base_dir = Path(base_dir or os.getenv("RAG_LOCAL_VECTOR_DIR") or _DEFAULT_DIR)
+        self.ivf_min = int(os.getenv("RAG_LOCAL_IVF_MIN", "50000"))
+        self.nprobe = int(os.getenv("RAG_LOCAL_IVF_NPROBE", "8"))
+        self._cache: Dict[str, _LocalCollection] = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, collection: str) -> Path:
+        return self.base_dir / re.sub(r"[^A-Za-z0-9_.-]", "_", collection or "rag-poc")
+
+    def _generation(self, collection: str) -> Optional[Path]:
+        """Directory of the collection's current generation, or None if it has none."""
+        path = self._dir(collection)
+        try:
+            name = (path / "CURRENT").read_text(encoding="utf-8").strip()
+        except OSError:
+            # Collections written before generations kept their files at the top level
+            return path if (path / "meta.json").exists() else None
+        return path / name if name else None
+
+    def has_collection(self, collection: str) -> bool:
+        return self._generation(collection) is not None
+
+    def _open(self, collection: str) -> Optional[_LocalCollection]:
+        gen = self._generation(collection)
+        if gen is None:
+            return None
+        with self._lock:
+            cached = self._cache.get(collection)
+            if cached is not None and cached.path == gen:
+                return cached
+            try:
+                coll = _LocalCollection(gen).load()
+            except OSError:
+                # Superseded and cleaned up between reading CURRENT and loading it
+                return self._cache.get(collection)
+            self._cache[collection] = coll
+            return coll
+
+    def _write(self, collection: str, dim: int, vectors: np.ndarray, payloads: List[Dict[str, Any]]) -> None:
+        """Write a complete new generation, then switch `CURRENT` to it in one rename.
+
+        Readers resolve `CURRENT` once per load, so they see either the old
+        generation or the new one, never vectors of one and payloads of another.
+        """
+        path = self._dir(collection)
+        path.mkdir(parents=True, exist_ok=True)
+        vectors = _normalize_rows(vectors.reshape(-1, dim)) if len(vectors) else np.zeros((0, dim), dtype=np.float32)
+        with self._lock:
+            current = self._generation(collection)
+            seq = int(current.name[4:]) + 1 if current is not None and current.name.startswith("gen-") else 1
+            gen = path / f"gen-{seq:06d}"
+            # Leftovers of a write that died before switching CURRENT
+            shutil.rmtree(gen, ignore_errors=True)
+            gen.mkdir()
+            vectors.tofile(gen / "vectors.f32")
+            with open(gen / "payloads.json", "w", encoding="utf-8") as fh:
+                json.dump(payloads, fh)
+            if len(vectors) >= self.ivf_min:
+                nlist = max(1, int(np.sqrt(len(vectors))))
+                centroids, assign = _kmeans(vectors, nlist)
+                np.save(gen / "ivf_centroids.npy", centroids)
+                np.save(gen / "ivf_assign.npy", assign)
+            with open(gen / "meta.json", "w", encoding="utf-8") as fh:
+                json.dump({"dim": dim, "count": int(len(vectors)), "distance": "cosine"}, fh)
+            with open(path / "CURRENT.tmp", "w", encoding="utf-8") as fh:
+                fh.write(gen.name)
+            os.replace(path / "CURRENT.tmp", path / "CURRENT")
+            self._cache.pop(collection, None)
+            self._prune(path, keep=(gen.name, current.name if current is not None else ""))
+
+    @staticmethod
+    def _prune(path: Path, keep: Sequence[str]) -> None:
+        # The previous generation stays for readers that resolved CURRENT just before the switch
+        for child in path.iterdir():
+            if child.is_dir() and child.name.startswith("gen-") and child.name not in keep:
+                shutil.rmtree(child, ignore_errors=True)
+        for name in ("vectors.f32", "payloads.json", "ivf_centroids.npy", "ivf_assign.npy", "meta.json"):
+            try:
+                (path / name).unlink()
+            except OSError:
+                pass
+
+    def _current(self, collection: str) -> Tuple[int, np.ndarray, List[Dict[str, Any]]]:
+        coll = self._open(collection)
+        if coll is None:
+            return 0, np.zeros((0, 0), dtype=np.float32), []
+        return coll.dim, np.array(coll.vectors, dtype=np.float32), list(coll.payloads)
+
+    def ensure_collection(self, collection: str, dim: int) -> None:
+        coll = self._open(collection)
+        if coll is None:
+            self._write(collection, dim, np.zeros((0, dim), dtype=np.float32), [])
+        elif coll.dim != dim:
+            raise ValueError(f"Local collection '{collection}' has dim={coll.dim}, not {dim}")
+
+    def upsert(self, collection, vectors, payloads) -> int:
+        new = np.asarray(vectors, dtype=np.float32)
+        if new.ndim != 2 or not len(new):
+            return 0
+        dim, existing, old_payloads = self._current(collection)
+        dim = dim or new.shape[1]
+        if new.shape[1] != dim:
+            raise ValueError(f"Vector dim {new.shape[1]} does not match collection dim {dim}")
+        merged = np.vstack([existing.reshape(-1, dim), new]) if len(existing) else new
+        self._write(collection, dim, merged, old_payloads + [dict(p) for p in payloads])
+        return len(new)
+
+    def replace(self, collection: str, vectors, payloads) -> int:
+        """Swap the whole collection for `vectors`/`payloads` (a full re-ingest)."""
+        new = np.asarray(vectors, dtype=np.float32)
+        dim = new.shape[1] if new.ndim == 2 and len(new) else self._current(collection)[0]
+        self._write(collection, dim, new, [dict(p) for p in payloads])
+        return len(new)
+
+    def delete_by_file_path(self, collection, file_path) -> None:
+        dim, existing, payloads = self._current(collection)
+        if not payloads:
+            return
+        norm = file_path.replace("\\", "/")
+        keep = [i for i, p in enumerate(payloads) if (p.get("file_path") or "").replace("\\", "/") != norm]
+        if len(keep) == len(payloads):
+            return
+        self._write(collection, dim, existing[keep], [payloads[i] for i in keep])
+
+    def search(self, collection, vector, limit) -> List[Dict[str, Any]]:
+        coll = self._open(collection)
+        if coll is None or coll.vectors is None or not len(coll.vectors):
+            return []
+        q = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if q.shape[0] != coll.dim:
+            raise ValueError(f"Query dim {q.shape[0]} does not match collection dim {coll.dim}")
+        n = float(np.linalg.norm(q))
+        if n > 0:
+            q = q / n
+        if coll.centroids is not None and coll.assign is not None:
+            probe = np.argsort(-(coll.centroids @ q))[: self.nprobe]
+            rows = np.nonzero(np.isin(coll.assign, probe))[0]
+            scores = np.asarray(coll.vectors[rows]) @ q
+        else:
+            rows = None
+            scores = np.asarray(coll.vectors) @ q
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        out = []
+        for i in top:
+            row = int(rows[i]) if rows is not None else int(i)
+            out.append({"id": row, "score": float(scores[i]), "payload": coll.payloads[row]})
+        return out
+
+
+_LOCAL_STORE: Optional[LocalVectorStore] = None
+
+
+def get_local_store() -> LocalVectorStore:
+    global _LOCAL_STORE
+    if _LOCAL_STORE is None:
+        _LOCAL_STORE = LocalVectorStore()
+    return _LOCAL_STORE
+
+
+def backend_name() -> str:
+    return (os.getenv("RAG_VECTOR_BACKEND") or "auto").lower()
+
+
+def search_with_fallback(collection: str, vector: Sequence[float], limit: int) -> List[Dict[str, Any]]:
+    """Search the configured backend, falling back to the local store in `auto` mode."""
+    backend = backend_name()
+    if backend == "local":
+        return get_local_store().search(collection, vector, limit)
+    try:
+        return QdrantVectorStore().search(collection, vector, limit)
+    except Exception:
+        local = get_local_store()
+        if backend == "auto" and local.has_collection(collection):
+            _logger.warning("Qdrant search failed for '%s'; using local vector store", collection)
+            return local.search(collection, vector, limit)
+        raise
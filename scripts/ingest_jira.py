@@ -7,9 +7,19 @@ This script uses environment variables `JIRA_API_URL`, `JIRA_API_USER`, `JIRA_AP
 and `OPENAI_API_KEY` if available for embeddings; otherwise uses deterministic fallback.
 """
 import os
+import sys
 import argparse
 import json
 from datetime import datetime
+from pathlib import Path
+
+# Make the project root importable when run as `python scripts/ingest_jira.py`
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(_PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(_PROJECT_ROOT))
+
+from mcp.collection_registry import register_collection
+from mcp.embeddings import DeterministicEmbeddings, model_name
 
 try:
     from qdrant_client import QdrantClient
@@ -24,20 +34,6 @@ except Exception:
     requests = None
 
 
-def get_embedding(text: str):
-    # lightweight fallback deterministic embedding
-    import hashlib, math
-    h = hashlib.sha256(text.encode("utf-8")).digest()
-    dim = int(os.getenv("RAG_EMBED_DIM", "64"))
-    reps = (dim + len(h) - 1) // len(h)
-    data = (h * reps)[:dim]
-    vec = [((b / 255.0) * 2.0 - 1.0) for b in data]
-    norm = math.sqrt(sum(v * v for v in vec))
-    if norm > 0:
-        vec = [v / norm for v in vec]
-    return vec
-
-
 def fetch_issues(jql: str, max_results: int = 50):
     base = os.getenv("JIRA_API_URL")
     user = os.getenv("JIRA_API_USER")
@@ -66,27 +62,28 @@ def ingest_issues(issues, collection: str, qdrant_url: str = "http://qdrant:6333
     if QdrantClient is None:
         raise RuntimeError("qdrant-client is required to ingest")
     client = QdrantClient(url=qdrant_url)
-    # probe vector size
-    vec = get_embedding("probe")
-    vec_size = len(vec)
-    ensure_collection(client, collection, vec_size)
-
-    points = []
-    for i, issue in enumerate(issues):
+    embeddings = DeterministicEmbeddings()
+    # Refuse to mix embeddings into a collection built with another model/dim
+    register_collection(collection, model_name(embeddings), embeddings.dim)
+    ensure_collection(client, collection, embeddings.dim)
+
+    texts = []
+    payloads = []
+    for issue in issues:
         key = issue.get("key")
         fields = issue.get("fields", {})
         title = fields.get("summary")
         desc = fields.get("description") or ""
-        text = f"{title}\n\n{desc}"
-        vec = get_embedding(text)
-        payload = {
+        texts.append(f"{title}\n\n{desc}")
+        payloads.append({
             "source": "jira",
             "issue_key": key,
             "title": title,
             "description": desc,
             "ingested_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
-        }
-        points.append(qdrant_models.PointStruct(id=i, vector=vec, payload=payload))
+        })
+    vectors = embeddings.embed_documents(texts)
+    points = [qdrant_models.PointStruct(id=i, vector=vec, payload=payload) for i, (vec, payload) in enumerate(zip(vectors, payloads))]
 
     client.upsert(collection_name=collection, points=points)
     print(f"Ingested {len(points)} JIRA issues into collection '{collection}'")
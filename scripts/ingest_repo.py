@@ -15,10 +15,29 @@ import argparse
 from typing import Optional
 import tempfile
 import subprocess
-import hashlib
 import datetime
 import getpass
 import socket
+
+
+def _ensure_project_on_path():
+    """Make the project root importable when run as `python scripts/ingest_repo.py`."""
+    import sys
+    from pathlib import Path
+    project_root = Path(__file__).resolve().parent.parent
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+
+
+_ensure_project_on_path()
+from mcp.embeddings import DeterministicEmbeddings, embed_dim, model_name
+from mcp.vector_store import QdrantVectorStore, backend_name as vector_backend_name, get_local_store
+
+# Recorded in the collection registry; bump when chunking parameters change.
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+CHUNKER_VERSION = f"recursive-char-{CHUNK_SIZE}-{CHUNK_OVERLAP}"
+
 try:
     from qdrant_client import QdrantClient
     from qdrant_client.http import models as qdrant_models
@@ -27,6 +46,87 @@ except Exception:
     qdrant_models = None
 
 
+def _register_collection(collection: str, embeddings) -> int:
+    """Record or verify the collection's embedding model/dimension; returns the dimension.
+
+    Raises `CollectionMismatchError` if the collection was built with another
+    model or dimension, so mismatched vectors are never written.
+    """
+    from mcp.collection_registry import CollectionMismatchError, get_collection_meta, register_collection
+
+    model = model_name(embeddings)
+    try:
+        meta = get_collection_meta(collection, use_cache=False)
+    except Exception as e:
+        print(f"Warning: could not read collection registry: {e}")
+        meta = None
+    dim = getattr(embeddings, "dim", None)
+    if not dim and meta and meta["embedding_model"] == model:
+        # Registered model determines the size; skip the probe round trip
+        dim = meta["dim"]
+    if not dim:
+        try:
+            dim = len(embeddings.embed_query("__vector_size_probe__"))
+        except Exception:
+            dim = embed_dim()
+    try:
+        register_collection(collection, model, dim, chunker_version=CHUNKER_VERSION)
+    except CollectionMismatchError:
+        raise
+    except Exception as e:
+        print(f"Warning: could not record collection metadata: {e}")
+    return int(dim)
+
+
+def _write_vector_store(store, collection: str, dim: int, vectors, payloads, incremental: bool, stale_files) -> int:
+    """Apply one ingest to a `VectorStore`: delete-then-upsert when incremental, else replace."""
+    store.ensure_collection(collection, dim)
+    if not incremental:
+        return store.replace(collection, vectors, payloads)
+    for stale in stale_files:
+        store.delete_by_file_path(collection, stale)
+    return store.upsert(collection, vectors, payloads)
+
+
+class _PrecomputedEmbeddings:
+    """Hands already computed chunk vectors to the LangChain wrapper."""
+
+    def __init__(self, base, texts, vectors):
+        self._base = base
+        self._known = dict(zip(texts, vectors))
+
+    def embed_documents(self, texts):
+        if all(t in self._known for t in texts):
+            return [list(self._known[t]) for t in texts]
+        return self._base.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self._base.embed_query(text)
+
+    def __getattr__(self, name):
+        return getattr(self._base, name)
+
+
+def _update_lexical_index(collection: str, chunks, deleted_files=(), replace: bool = False):
+    """Write ingested chunks into the local BM25 index used by hybrid search.
+
+    A full ingest (`replace`) rebuilds the index, so files removed since the
+    last one drop out of sparse results as they do from the vector store.
+    """
+    try:
+        from mcp.lexical import update_index
+
+        idx = update_index(
+            collection,
+            [(d.page_content, dict(d.metadata or {})) for d in chunks],
+            deleted_files=[f.replace("\\", "/") for f in deleted_files],
+            replace=replace,
+        )
+        print(f"Updated lexical index for '{collection}' ({len(idx.docs)} chunks)")
+    except Exception as e:
+        print(f"Warning: could not update lexical index: {e}")
+
+
 def _save_indexed_commit(repo_url: str, branch: str, commit_sha: str, collection: str, file_count: int, chunk_count: int):
     """Save indexed commit information to database for future incremental updates.
     
@@ -77,32 +177,6 @@ def _save_indexed_commit(repo_url: str, branch: str, commit_sha: str, collection
         print(f"Warning: could not save indexed commit to database: {e}")
 
 
-class DeterministicEmbeddings:
-    """Fallback embeddings provider that deterministically maps text -> fixed-dim vector.
-    Implements `embed_documents` and `embed_query` to match LangChain's Embeddings API."""
-    def __init__(self, dim: int = 64):
-        self.dim = dim
-
-    def _embed(self, text: str):
-        h = hashlib.sha256(text.encode("utf-8")).digest()
-        reps = (self.dim + len(h) - 1) // len(h)
-        data = (h * reps)[: self.dim]
-        # map bytes 0..255 to float -1..1
-        vec = [((b / 255.0) * 2.0 - 1.0) for b in data]
-        # normalize
-        import math
-
-        norm = math.sqrt(sum(v * v for v in vec))
-        if norm > 0:
-            vec = [v / norm for v in vec]
-        return vec
-
-    def embed_documents(self, texts):
-        return [self._embed(t) for t in texts]
-
-    def embed_query(self, text):
-        return self._embed(text)
-
 # Load environment variables from .env file
 load_dotenv()
 
@@ -263,14 +337,14 @@ def ingest_repo(repo_dir: Optional[str] = None, collection: Optional[str] = None
         print(" -", doc.metadata.get("source", "<unknown>"))
 
     # Split documents into chunks
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
     chunks = splitter.split_documents(docs)
     print(f"Split into {len(chunks)} chunks")
 
     # Embed and store in Qdrant
     print("Creating embeddings and storing in Qdrant...")
-    # Determine embedding dimension from env or default
-    dim = int(os.getenv("RAG_EMBED_DIM", "64"))
+    # Embedding dimension is agreed in one place (mcp.embeddings / RAG_EMBED_DIM)
+    dim = embed_dim()
     embeddings = None
     if OpenAIEmbeddings is not None:
         try:
@@ -325,115 +399,84 @@ def ingest_repo(repo_dir: Optional[str] = None, collection: Optional[str] = None
         meta.setdefault("indexed_at", ingested_at)  # Queryable timestamp
         doc.metadata = meta
 
-    # Ensure the Qdrant collection exists with the correct vector size.
-    # Prefer the LangChain `Qdrant` wrapper by default to allow tests to
-    # monkeypatch that symbol without the code trying to connect to a
-    # real qdrant instance. Use the lower-level `qdrant_client` only when
-    # explicitly requested via `QDRANT_FORCE_CLIENT=1`.
-    use_qdrant_client = bool(QdrantClient is not None and qdrant_models is not None and os.getenv("QDRANT_FORCE_CLIENT") == "1")
+    vec_size = _register_collection(collection, embeddings)
+    print(f"Collection '{collection}': model={model_name(embeddings)} dim={vec_size}")
+
+    # Vector stores go through mcp.vector_store.VectorStore:
+    # - RAG_VECTOR_BACKEND=local: only the embedded local store (no Qdrant needed,
+    #   suitable for dev boxes, CI and edge deployments);
+    # - qdrant / auto: Qdrant, via qdrant-client when QDRANT_FORCE_CLIENT=1 and the
+    #   LangChain `Qdrant` wrapper otherwise (tests monkeypatch that symbol);
+    # - auto also mirrors into the local store, which search falls back to.
+    backend = vector_backend_name()
+    use_qdrant_client = bool(
+        backend != "local" and QdrantClient is not None and qdrant_models is not None
+        and os.getenv("QDRANT_FORCE_CLIENT") == "1"
+    )
+    stores = []
     if use_qdrant_client:
+        stores.append(QdrantVectorStore(url=qdrant_url))
+    if backend != "qdrant":
+        stores.append(get_local_store())
+    # Points of removed files and the stale chunks of files being re-indexed
+    stale_files = [f.replace("\\", "/") for f in files_to_delete + (files_to_index or [])] if incremental else []
+
+    texts = [d.page_content for d in chunks]
+    vectors = None
+    if stores:
         try:
-            client = QdrantClient(url=qdrant_url)
-            # determine vector size from the embeddings implementation
-            try:
-                sample_vec = embeddings.embed_query("__vector_size_probe__")
-                vec_size = len(sample_vec)
-            except Exception:
-                vec_size = int(os.getenv("RAG_EMBED_DIM", "64"))
-
-            try:
-                client.get_collection(collection_name=collection)
-                print(f"Qdrant collection '{collection}' already exists.")
-            except Exception:
-                print(f"Creating Qdrant collection '{collection}' with size={vec_size}...")
-                params = qdrant_models.VectorParams(size=vec_size, distance=qdrant_models.Distance.COSINE)
-                client.recreate_collection(collection_name=collection, vectors_config=params)
+            vectors = embeddings.embed_documents(texts) if texts else []
         except Exception as e:
-            print("Warning: failed to precreate collection via qdrant-client:", e)
+            if backend == "local" or use_qdrant_client:
+                raise
+            # auto mode through the LangChain wrapper: Qdrant is still written below
+            print(f"Warning: could not embed chunks for the local vector store: {e}")
+            stores = []
+    payloads = []
+    for doc in chunks:
+        payload = dict(doc.metadata or {})
+        payload["page_content"] = doc.page_content
+        payloads.append(payload)
 
-    # Prefer direct qdrant-client upsert to avoid LangChain wrapper/version incompatibilities
-    if use_qdrant_client:
-        client = QdrantClient(url=qdrant_url)
-        # determine vector size
+    for store in stores:
         try:
-            sample_vec = embeddings.embed_query("__vector_size_probe__")
-            vec_size = len(sample_vec)
-        except Exception:
-            vec_size = int(os.getenv("RAG_EMBED_DIM", "64"))
+            n = _write_vector_store(store, collection, vec_size, vectors, payloads, incremental, stale_files)
+            print(f"Upserted {n} points into {store.name} vector store '{collection}'")
+        except Exception as e:
+            # The local mirror in auto mode is best effort; the primary backend isn't
+            if backend == "auto" and store.name == "local":
+                print(f"Warning: could not update local vector store mirror: {e}")
+            else:
+                raise
+
+    if backend != "local" and not use_qdrant_client:
+        # Reuse the vectors computed above instead of embedding every chunk twice
+        wrapper_embeddings = _PrecomputedEmbeddings(embeddings, texts, vectors) if vectors is not None else embeddings
+        Qdrant.from_documents(
+            chunks,
+            wrapper_embeddings,
+            url=qdrant_url,
+            collection_name=collection,
+        )
+        print(f"Ingested via LangChain Qdrant wrapper into '{collection}'")
 
+    _update_lexical_index(collection, chunks, files_to_delete if incremental else (), replace=not incremental)
+
+    # Store indexed commit info for future incremental updates
+    if current_commit_sha:
         try:
-            client.get_collection(collection_name=collection)
-            print(f"Qdrant collection '{collection}' already exists.")
-        except Exception:
-            print(f"Creating collection '{collection}' (vec_size={vec_size}) via qdrant-client")
-            params = qdrant_models.VectorParams(size=vec_size, distance=qdrant_models.Distance.COSINE)
-            client.recreate_collection(collection_name=collection, vectors_config=params)
-
-        # Delete points for deleted files (incremental update)
-        if incremental and files_to_delete:
-            print(f"Deleting {len(files_to_delete)} removed files from Qdrant...")
-            for deleted_file in files_to_delete:
-                try:
-                    # Normalize path to match what's stored in metadata
-                    normalized_path = deleted_file.replace("\\", "/")
-                    client.delete(
-                        collection_name=collection,
-                        points_selector=qdrant_models.FilterSelector(
-                            filter=qdrant_models.Filter(
-                                must=[
-                                    qdrant_models.FieldCondition(
-                                        key="file_path",
-                                        match=qdrant_models.MatchValue(value=normalized_path)
-                                    )
-                                ]
-                            )
-                        )
-                    )
-                    print(f"  Deleted points for: {deleted_file}")
-                except Exception as e:
-                    print(f"  Warning: failed to delete {deleted_file}: {e}")
-
-        texts = [d.page_content for d in chunks]
-        vectors = embeddings.embed_documents(texts)
-        points = []
-        for i, (vec, doc) in enumerate(zip(vectors, chunks)):
-            payload = dict(doc.metadata or {})
-            payload["page_content"] = doc.page_content
-            # use integer id to satisfy PointStruct validation
-            points.append(qdrant_models.PointStruct(id=i, vector=vec, payload=payload))
-
-        if points:
-            client.upsert(collection_name=collection, points=points)
-            print(f"Upserted {len(points)} points into '{collection}' via qdrant-client")
-        
-        # Store indexed commit info for future incremental updates
-        if current_commit_sha:
-            # Use repo_url if available, otherwise use repo_dir as identifier
-            repo_identifier = repo_url or repo_dir or "unknown"
-            try:
-                # Save to database via API call or direct DB access
-                _save_indexed_commit(
-                    repo_url=repo_identifier,
-                    branch=current_branch or branch or "main",
-                    commit_sha=current_commit_sha,
-                    collection=collection,
-                    file_count=len(docs),
-                    chunk_count=len(chunks)
-                )
-            except Exception as e:
-                print(f"Warning: failed to save indexed commit: {e}")
-        
-        return
-    # Fall back to LangChain wrapper only if qdrant-client isn't available
-    vectorstore = Qdrant.from_documents(
-        chunks,
-        embeddings,
-        url=qdrant_url,
-        collection_name=collection,
-    )
-    print(f"Ingested via LangChain Qdrant wrapper into '{collection}'")
-    return
-    print(f"Ingested {len(chunks)} chunks into Qdrant collection '{collection}'.")
+            _save_indexed_commit(
+                repo_url=repo_url or repo_dir or "unknown",
+                branch=current_branch or branch or "main",
+                commit_sha=current_commit_sha,
+                collection=collection,
+                file_count=len(docs),
+                chunk_count=len(chunks)
+            )
+        except Exception as e:
+            print(f"Warning: failed to save indexed commit: {e}")
+
+    print(f"Ingested {len(chunks)} chunks into collection '{collection}'.")
     if temp_dir:
         try:
             import shutil
@@ -12,6 +12,8 @@ Usage:
 Requirements:
 - `docker` / `docker compose` must be available in PATH and compose services running.
 - Run from the repo root so `docker compose exec mcp` targets the correct service.
+- The `mcp` service must run with RUN_AGENTS_DEBUG_SENTINELS=1 so the sentinel files are written
+  (docker-compose.override.mock.yml sets it).
 #>
 
 param(
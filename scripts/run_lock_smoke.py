@@ -4,7 +4,9 @@ Python sentinel-based lock smoke test.
 
 Runs two near-concurrent POSTs to /run-agents for the same task id and
 reads sentinel files from the `mcp` container to validate that one run
-acquired the redis lock and the other observed a conflict.
+acquired the redis lock and the other observed a conflict. The `mcp`
+service must run with `RUN_AGENTS_DEBUG_SENTINELS=1` for the sentinel
+files to be written (docker-compose.override.mock.yml sets it).
 
 Usage:
   python scripts/run_lock_smoke.py --task-id 11
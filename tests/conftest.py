@@ -1,5 +1,7 @@
 import asyncio
+import os
 import sys
+import tempfile
 from pathlib import Path
 
 import pytest
@@ -17,6 +19,9 @@ def _ensure_repo_on_path() -> None:
 
 _ensure_repo_on_path()
 
+# Keep tests off the checked-in ./data.db; must be set before mcp.db is imported.
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + str(Path(tempfile.mkdtemp(prefix="intell-swe-tests-")) / "test.db"))
+
 
 # Ensure a default event loop exists for each test.
 # Provide an autouse fixture so tests that call
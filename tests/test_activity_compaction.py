@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from mcp import activity_compaction as compaction
+from mcp import db, models
+
+
+def _seed(now):
+    db.init_db()
+    long_text = "finding " * 100
+    rows = [
+        {"task_id": 4801, "content": long_text, "created_at": now - timedelta(days=200)},
+        {"task_id": 4801, "content": "short old", "created_at": now - timedelta(days=120)},
+        {"task_id": 4801, "content": long_text + "x", "created_at": now - timedelta(days=30)},
+        {"task_id": 4801, "content": "week old", "created_at": now - timedelta(days=10)},
+        {"task_id": 4801, "content": "fresh", "created_at": now - timedelta(hours=1)},
+    ]
+    with db.engine.begin() as conn:
+        conn.execute(insert(models.Activity), rows)
+    return [r["content"] for r in rows]
+
+
+def _rows(conn):
+    A = models.Activity
+    return conn.execute(
+        select(A.id, A.content, A.content_gz, A.summary, A.archived).where(A.task_id == 4801).order_by(A.id)
+    ).all()
+
+
+def test_compaction_compresses_archives_and_keeps_content_retrievable():
+    now = datetime.utcnow()
+    originals = _seed(now)
+
+    counts = compaction.compact_activities(now=now, compress_after_days=7, retention_days=90, batch_size=2)
+    assert counts == {"archived": 2, "compressed": 2}
+    assert compaction.compact_activities(now=now, compress_after_days=7, retention_days=90) == {"archived": 0, "compressed": 0}
+
+    with db.engine.connect() as conn:
+        rows = _rows(conn)
+        assert [bool(r.archived) for r in rows] == [True, True, False, False, False]
+        assert [r.content is None for r in rows] == [True, True, True, True, False]
+        # Summary rows stay behind with at most SUMMARY_CHARS + 1 characters
+        assert rows[0].summary == originals[0][:compaction.SUMMARY_CHARS + 1]
+        assert rows[3].summary == "week old" and rows[3].content_gz is not None
+        AA = models.ActivityArchive
+        archived = dict(conn.execute(select(AA.activity_id, AA.content_gz)).all())
+        assert conn.execute(select(func.count()).select_from(AA)).scalar() == 2
+
+        contents = compaction.load_contents(rows, archived)
+        assert [contents[r.id] for r in rows] == originals
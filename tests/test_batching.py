@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+from agents.core.agents import Agent, MasterControlPanel
+from agents.core.batching import parse_batched_response
+
+
+class RoleAgent(Agent):
+    def __init__(self, name, role="Review it."):
+        super().__init__(name)
+        self.role = role
+        self.calls = 0
+
+    async def process(self, task):
+        self.calls += 1
+        return f"{self.name}: separate"
+
+
+class FakeAdapter:
+    def __init__(self, answers):
+        self.answers = answers
+        self.prompts = []
+
+    async def run(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return {"text": "```json\n" + json.dumps(self.answers) + "\n```"}
+
+
+def test_parse_batched_response_tolerates_fences_and_case():
+    text = 'Here:\n```json\n{"enginEERagent": "looks fine", "Other": "x", "AuditAgent": ""}\n```'
+    assert parse_batched_response(text, ["EngineerAgent", "AuditAgent"]) == {"EngineerAgent": "looks fine"}
+    assert parse_batched_response("[stub] not json", ["EngineerAgent"]) == {}
+
+
+def test_batched_mode_single_call_with_per_agent_events():
+    events = []
+
+    async def publisher(task_id, event):
+        events.append(event)
+
+    mcp = MasterControlPanel(publisher=publisher)
+    a, b, c = RoleAgent("A"), RoleAgent("B"), RoleAgent("C")
+    no_role = RoleAgent("D", role=None)
+    mcp.agent_manager.agents = [a, b, c, no_role]
+    mcp.batch_adapter = FakeAdapter({"A": "answer a", "B": "answer b"})
+
+    results = asyncio.run(mcp.handle_task({"id": 7, "title": "t", "description": "d", "execution_mode": "batched"}))
+    assert len(mcp.batch_adapter.prompts) == 1
+    assert results == {"A": "answer a", "B": "answer b", "C": "C: separate", "D": "D: separate"}
+    assert (a.calls, b.calls, c.calls, no_role.calls) == (0, 0, 1, 1)
+    activities = {e["agent"]: e["content"] for e in events if e["type"] == "activity"}
+    assert activities == results
+
+
+def test_batched_deadline_reports_the_same_timeout_as_single_agents(monkeypatch):
+    monkeypatch.setenv("AGENT_TASK_DEADLINE", "0.1")
+    events = []
+
+    async def publisher(task_id, event):
+        events.append(event)
+
+    class HungAdapter(FakeAdapter):
+        async def run(self, prompt, **kwargs):
+            await asyncio.sleep(5)
+
+    mcp = MasterControlPanel(publisher=publisher)
+    a, b = RoleAgent("A"), RoleAgent("B")
+    mcp.agent_manager.agents = [a, b]
+    mcp.batch_adapter = HungAdapter({})
+
+    results = asyncio.run(mcp.handle_task({"id": 8, "title": "t", "description": "d", "execution_mode": "batched"}))
+    assert results == {"A": "A: timed out after 0.1s; no result", "B": "B: timed out after 0.1s; no result"}
+    # not rerun separately after the shared call used the deadline
+    assert (a.calls, b.calls) == (0, 0)
+    statuses = {e["agent"]: e["status"] for e in events if e["type"] == "agent_status"}
+    assert statuses == {"A": "timeout", "B": "timeout"}
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agents.core.agents import MasterControlPanel
+from agents.core.cancellation import CancellationRegistry, TaskCancelled, get_registry, run_cancellable
+from agents.core.crewai_adapter import CrewAIAdapter
+from agents.services.task_queue import TaskQueue
+
+
+class SlowAgent:
+    def __init__(self, name, delay, log):
+        self.name = name
+        self.delay = delay
+        self.log = log
+
+    async def process(self, task):
+        await asyncio.sleep(self.delay)
+        self.log.append(self.name)
+        return f"{self.name} done"
+
+
+def _panel(agents):
+    events = []
+
+    async def publisher(task_id, event):
+        events.append(event)
+
+    mcp = MasterControlPanel(publisher=publisher)
+    mcp.agent_manager.agents = agents
+    mcp.agent_manager.agent_dag = {}
+    return mcp, events
+
+
+def test_cancel_stops_in_flight_agents_and_reports_cancelled():
+    log = []
+    mcp, events = _panel([SlowAgent("Fast", 0, log), SlowAgent("Slow", 5, log)])
+
+    async def main():
+        run = asyncio.ensure_future(mcp.handle_task({"id": 9101, "title": "t", "description": ""}))
+        await asyncio.sleep(0.1)
+        # Cancel from another thread, as the sync /api endpoint does
+        threading.Thread(target=get_registry().cancel, args=("9101", "cancelled by user")).start()
+        return await asyncio.wait_for(run, 2)
+
+    results = asyncio.run(main())
+    assert results["Fast"] == "Fast done"
+    assert "cancelled" in results["Slow"]
+    assert log == ["Fast"]
+    assert {"type": "agent_status", "agent": "Slow", "status": "cancelled"} in events
+    assert events[-1] == {"type": "status", "status": "cancelled", "reason": "cancelled by user"}
+    assert get_registry().get("9101") is None
+
+
+def test_supersede_cancels_previous_run_and_early_cancel_skips_queue():
+    registry = CancellationRegistry()
+    first = registry.register("a")
+    assert registry.supersede("github:repo:refs/heads/main", "a") is None
+    assert registry.supersede("github:repo:refs/heads/main", "b") == "a"
+    assert first.cancelled and first.reason == "superseded"
+
+    # "b" has not started yet: the cancel is remembered and applied on register
+    assert registry.supersede("github:repo:refs/heads/main", "c") == "b"
+    assert registry.is_cancelled("b")
+    assert registry.register("b").reason == "superseded"
+
+
+class FakeRemoteFlags:
+    def __init__(self):
+        self.flags = {}
+
+    def mark(self, key, reason):
+        self.flags[key] = reason
+
+    def reason(self, key):
+        return self.flags.get(key)
+
+    def take(self, key):
+        return self.flags.pop(key, None)
+
+    def clear(self, key):
+        self.flags.pop(key, None)
+
+
+def test_remote_cancel_flag_does_not_outlive_its_run(monkeypatch):
+    from agents.core import agents as agents_module
+
+    remote = FakeRemoteFlags()
+    monkeypatch.setattr(agents_module, "get_registry", lambda: CancellationRegistry(remote))
+    log = []
+    mcp, events = _panel([SlowAgent("A", 0, log)])
+
+    # Flagged by another process while queued: the run is cancelled and consumes the flag
+    remote.mark("9102", "cancelled by user")
+    asyncio.run(mcp.handle_task({"id": 9102, "title": "t", "description": ""}))
+    assert events[-1]["status"] == "cancelled" and "9102" not in remote.flags
+
+    # A flag raised during a run is cleared when it ends, so a rerun goes ahead
+    monkeypatch.setenv("TASK_CANCEL_POLL_SECONDS", "0.1")
+    mcp.agent_manager.agents = [SlowAgent("B", 1, log)]
+
+    async def cancel_mid_run():
+        run = asyncio.ensure_future(mcp.handle_task({"id": 9102, "title": "t", "description": ""}))
+        await asyncio.sleep(0.2)
+        remote.mark("9102", "cancelled elsewhere")
+        return await asyncio.wait_for(run, 2)
+
+    assert "cancelled" in asyncio.run(cancel_mid_run())["B"]
+    assert "9102" not in remote.flags
+    results = asyncio.run(mcp.handle_task({"id": 9102, "title": "t", "description": ""}))
+    assert results == {"B": "B done"}
+
+
+def test_task_queue_skips_cancelled_tasks():
+    ran = []
+
+    async def main():
+        queue = TaskQueue()
+
+        async def worker(task):
+            ran.append(task["title"])
+
+        queue.start(worker)
+        stale = {"title": "stale"}
+        queue.enqueue(stale)
+        queue.enqueue({"title": "fresh"})
+        from agents.core.cancellation import task_key
+        get_registry().cancel(task_key(stale), "superseded")
+        await asyncio.wait_for(queue._queue.join(), 1)
+        await queue.stop()
+
+    asyncio.run(main())
+    assert ran == ["fresh"]
+
+
+def test_adapter_refuses_calls_for_cancelled_run():
+    registry = CancellationRegistry()
+    token = registry.register("x")
+    token.cancel("client disconnected")
+
+    async def call():
+        from agents.core.cancellation import current_token
+        current_token.set(token)
+        return await CrewAIAdapter(agent="test").run("prompt")
+
+    with pytest.raises(TaskCancelled):
+        asyncio.run(call())
+
+
+def test_run_cancellable_returns_result_when_not_cancelled():
+    registry = CancellationRegistry()
+
+    async def work():
+        await asyncio.sleep(0)
+        return 42
+
+    assert asyncio.run(run_cancellable(work(), registry.register("y"), registry)) == 42
+
+
+def test_early_cancel_for_a_run_elsewhere_expires(monkeypatch):
+    registry = CancellationRegistry()
+    monkeypatch.setenv("TASK_CANCEL_EARLY_TTL", "0.05")
+    # e.g. /cancel on the API for a task that is running in a Celery worker
+    assert registry.cancel("9103", "cancelled by user") is False
+    assert registry.is_cancelled("9103")
+    time.sleep(0.1)
+    assert not registry.is_cancelled("9103")
+    assert not registry.register("9103").cancelled
+
+    monkeypatch.setenv("TASK_CANCEL_EARLY_TTL", "60")
+    registry.cancel("9104", "cancelled by user")
+    registry.discard("9104")  # the task reached a final status
+    assert not registry.register("9104").cancelled
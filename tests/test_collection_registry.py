@@ -0,0 +1,30 @@
+import pytest
+
+from mcp import collection_registry as registry
+from mcp.collection_registry import CollectionMismatchError, embed_for_collection, register_collection
+from mcp.embeddings import DETERMINISTIC_MODEL
+
+
+def test_register_is_idempotent_and_refuses_mismatch():
+    meta = register_collection("reg-a", DETERMINISTIC_MODEL, 32, chunker_version="v1")
+    assert meta["dim"] == 32
+    again = register_collection("reg-a", DETERMINISTIC_MODEL, 32, chunker_version="v2")
+    assert again["chunker_version"] == "v2"
+    with pytest.raises(CollectionMismatchError):
+        register_collection("reg-a", DETERMINISTIC_MODEL, 64)
+    with pytest.raises(CollectionMismatchError):
+        register_collection("reg-a", "text-embedding-3-small", 32)
+
+
+def test_query_embedding_routed_by_registry(monkeypatch):
+    monkeypatch.setenv("RAG_EMBED_DIM", "1536")
+    register_collection("reg-b", DETERMINISTIC_MODEL, 48)
+    vec = embed_for_collection("find acquire_lock_async", "reg-b")
+    assert len(vec) == 48
+
+
+def test_query_dimension_mismatch_refused(monkeypatch):
+    register_collection("reg-c", "some-remote-model", 8)
+    monkeypatch.setattr(registry, "get_embedding", lambda text, model=None, dim=None: [0.0] * 4)
+    with pytest.raises(CollectionMismatchError):
+        embed_for_collection("q", "reg-c")
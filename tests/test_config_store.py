@@ -0,0 +1,48 @@
+import json
+import os
+
+from mcp import auth, config_store
+from mcp.config_store import FileSnapshot, normalize_rag_config
+
+
+def test_snapshot_reloads_only_when_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / "rag_config.json"
+    path.write_text(json.dumps({"repo": "https://example.com/a.git"}))
+    snap = FileSnapshot(path, normalize_rag_config, lambda: {"repos": [], "collection": "rag-poc"}, check_interval=0)
+    first = snap.get()
+    assert first["repos"] == [{"url": "https://example.com/a.git", "auto_ingest": True}]
+
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *a, **k: opened.append(a[0]) or real_open(*a, **k))
+    assert snap.get() is first and opened == []  # unchanged file: no I/O, same object
+
+    path.write_text(json.dumps({"repos": ["https://example.com/b.git"], "collection": "c2"}))
+    os.utime(path, ns=(1, 1))
+    assert snap.get()["collection"] == "c2" and opened == [path]
+
+    # A broken edit keeps the last good snapshot
+    path.write_text("{not json")
+    os.utime(path, ns=(2, 2))
+    assert snap.get()["collection"] == "c2"
+
+
+def test_write_swaps_snapshot_and_replaces_file(tmp_path):
+    path = tmp_path / "cfg" / "rag_config.json"
+    snap = FileSnapshot(path, normalize_rag_config, lambda: {"repos": [], "collection": "rag-poc"}, check_interval=3600)
+    assert snap.get()["repos"] == []
+    raw = {"repos": ["https://example.com/c.git"], "collection": "c3"}
+    snap.write(raw)
+    assert snap.get()["repos"][0]["url"] == "https://example.com/c.git"
+    assert raw["repos"] == ["https://example.com/c.git"]  # caller's dict is not normalized in place
+    assert json.loads(path.read_text()) == raw
+    assert [p.name for p in path.parent.iterdir()] == ["rag_config.json"]
+
+
+def test_token_roles_from_env_are_parsed_once(monkeypatch):
+    monkeypatch.setenv("RAG_ROLE_TOKENS", json.dumps({"t1": "admin"}))
+    roles = auth._load_token_roles()
+    assert roles == {"t1": "admin"} and auth._load_token_roles() is roles
+    assert auth.check_admin_token("Bearer t1", required_role="editor") is True
+    monkeypatch.setenv("RAG_ROLE_TOKENS", json.dumps({"t2": "viewer"}))
+    assert config_store.token_roles() == {"t2": "viewer"}
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from agents.core.agents import MasterControlPanel
+from agents.core.dag import resolve_dag
+
+
+class RecordingAgent:
+    def __init__(self, name, delay, log):
+        self.name = name
+        self.delay = delay
+        self.log = log
+
+    async def process(self, task):
+        self.log.append(("start", self.name, dict(task.get("upstream_results") or {})))
+        await asyncio.sleep(self.delay)
+        self.log.append(("end", self.name))
+        return f"{self.name} findings"
+
+
+def test_dependents_start_after_inputs_with_upstream_results():
+    log = []
+    mcp = MasterControlPanel()
+    mcp.agent_manager.agents = [RecordingAgent("Discovery", 0.05, log), RecordingAgent("RootCause", 0, log),
+                                RecordingAgent("Metrics", 0.01, log)]
+    task = {"title": "t", "description": "", "agent_dag": {"RootCause": ["Discovery"]}}
+    results = mcp.submit_task(task)
+
+    assert results["RootCause"] == "RootCause findings"
+    starts = {entry[1]: i for i, entry in enumerate(log) if entry[0] == "start"}
+    ends = {entry[1]: i for i, entry in enumerate(log) if entry[0] == "end"}
+    assert starts["Metrics"] < ends["Discovery"]  # independent agents run concurrently
+    assert starts["RootCause"] > ends["Discovery"]
+    root_start = next(e for e in log if e[:2] == ("start", "RootCause"))
+    assert root_start[2] == {"Discovery": "Discovery findings"}
+    assert "upstream_results" not in task
+
+
+def test_resolve_dag_filters_and_detects_cycles():
+    assert resolve_dag({"A": ["B", "X"], "B": []}, ["A", "B"]) == {"A": ["B"], "B": []}
+    with pytest.raises(ValueError):
+        resolve_dag({"A": ["B"], "B": ["A"]}, ["A", "B"])
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from mcp import db
+
+
+def test_async_url_maps_sync_drivers(monkeypatch):
+    monkeypatch.delenv("ASYNC_DATABASE_URL", raising=False)
+    assert db.async_database_url("sqlite:///./data.db") == "sqlite+aiosqlite:///./data.db"
+    assert db.async_database_url("mysql+pymysql://u:p@h/db") == "mysql+aiomysql://u:p@h/db"
+    assert db.async_database_url("postgresql://u:p@h/db") == "postgresql+psycopg://u:p@h/db"
+    monkeypatch.setenv("ASYNC_DATABASE_URL", "postgresql+asyncpg://u:p@h/db")
+    assert db.async_database_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+
+
+def test_engine_options_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "4")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "5000")
+    pg = db.engine_options("postgresql+psycopg://u:p@h/db")
+    assert pg["pool_size"] == 4 and pg["pool_pre_ping"] is True
+    assert pg["connect_args"] == {"options": "-c statement_timeout=5000"}
+    apg = db.engine_options("postgresql+asyncpg://u:p@h/db")
+    assert apg["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+    lite = db.engine_options("sqlite+aiosqlite:///x.db")
+    assert lite == {"connect_args": {"timeout": 5}}
+
+
+def test_async_session_round_trip():
+    pytest.importorskip("aiosqlite")
+    pytest.importorskip("greenlet")
+    from sqlalchemy import select
+    from mcp import models
+
+    db.init_db()
+
+    async def main():
+        async with db.AsyncSessionLocal() as session:
+            session.add(models.User(username="async-user", email="a@example.com", role="staff"))
+            await session.commit()
+            found = (await session.execute(select(models.User).where(models.User.username == "async-user"))).scalars().first()
+        await db.dispose_async_engine()
+        return found
+
+    assert asyncio.run(main()).email == "a@example.com"
+
+
+def test_sqlite_profile_pragmas_and_single_writer(tmp_path, monkeypatch):
+    import threading
+    from sqlalchemy import create_engine, func, select, text
+    from sqlalchemy.orm import sessionmaker
+    from mcp import models
+    from mcp.sqlite_writer import SQLiteWriter
+
+    monkeypatch.delenv("SQLITE_PROFILE", raising=False)
+    url = f"sqlite:///{tmp_path / 'profile.db'}"
+    assert db.sqlite_profile_enabled(url)
+    assert not db.sqlite_profile_enabled("sqlite:///:memory:")
+    eng = create_engine(url, **db.engine_options(url))
+    db._apply_sqlite_pragmas(eng, url)
+    db.Base.metadata.create_all(bind=eng)
+    with eng.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+    writer = SQLiteWriter(sessionmaker(bind=eng, expire_on_commit=False))
+    seen = set()
+
+    def insert(i):
+        def fn(session):
+            seen.add(threading.current_thread().name)
+            return db.add_row(session, models.Activity(task_id=1, content=f"event {i}"))
+        return writer.call(fn)
+
+    threads = [threading.Thread(target=insert, args=(i,)) for i in range(20)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert seen == {"sqlite-writer"}
+
+    row = asyncio.run(writer.run(lambda s: db.add_row(s, models.Activity(task_id=2, content="x"))))
+    assert row.id and row.created_at is not None
+
+    def failing(session):
+        session.add(models.Activity(task_id=3, content="rolled back"))
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        writer.call(failing)
+    writer.stop()
+    with eng.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.Activity.__table__)).scalar() == 21
+    eng.dispose()
@@ -0,0 +1,134 @@
+import subprocess
+
+import pytest
+
+from agents.impl.engineer_crewai import get_commit_summary, get_file_content
+from agents.tools.git_reader import get_pool
+
+
+def _git(repo, *args):
+    return subprocess.run(
+        ["git", "--git-dir", str(repo / ".git"), "--work-tree", str(repo / "workspace"), *args],
+        check=True, capture_output=True, text=True,
+        env={"GIT_AUTHOR_NAME": "Dev", "GIT_AUTHOR_EMAIL": "dev@example.com", "GIT_COMMITTER_NAME": "Dev",
+             "GIT_COMMITTER_EMAIL": "dev@example.com", "GIT_AUTHOR_DATE": "2024-01-02T03:04:05+0100",
+             "GIT_COMMITTER_DATE": "2024-01-02T03:04:05+0100", "PATH": "/usr/bin:/bin:/usr/local/bin"},
+    ).stdout.strip()
+
+
+@pytest.fixture()
+def repo(tmp_path):
+    work = tmp_path / "workspace"
+    (work / "pkg").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q", "--separate-git-dir", str(tmp_path / ".git"), str(work)], check=True)
+    (work / "pkg" / "a.py").write_text("one\ntwo\nthree\n")
+    (work / "old.txt").write_text("bye\n")
+    _git(tmp_path, "add", "-A")
+    _git(tmp_path, "commit", "-q", "-m", "first")
+    (work / "pkg" / "a.py").write_text("one\nTWO\nthree\nfour\n")
+    (work / "old.txt").unlink()
+    (work / "new.txt").write_text("hi\n")
+    _git(tmp_path, "add", "-A")
+    _git(tmp_path, "commit", "-q", "-m", "second change", "-m", "details here")
+    return tmp_path
+
+
+def test_commit_summary_matches_git(repo):
+    sha = _git(repo, "rev-parse", "HEAD")
+    summary = get_commit_summary(sha[:8], repo_path=str(repo))
+    header = summary.split("\n\n")[0].splitlines()
+    assert header == [sha, "Dev <dev@example.com>", "2024-01-02 03:04:05 +0100", "second change", "details here"]
+    expected = _git(repo, "diff-tree", "--no-commit-id", "--name-status", "-r", sha)
+    assert summary.split("=== File Changes ===\n")[1].strip() == expected
+    assert "3 files changed, 3 insertions(+), 2 deletions(-)" in summary
+
+
+def test_file_content_and_missing(repo):
+    sha = _git(repo, "rev-parse", "HEAD~1")
+    assert get_file_content("pkg/a.py", sha, repo_path=str(repo)) == "one\ntwo\nthree\n"
+    assert get_file_content("nope.py", sha, repo_path=str(repo)) is None
+    assert get_file_content("new.txt", repo_path=str(repo)) == "hi\n"
+    assert get_commit_summary("deadbeef", repo_path=str(repo)) is None
+
+
+def test_readers_are_reused(repo):
+    get_commit_summary("HEAD", repo_path=str(repo))
+    pool = get_pool(str(repo / ".git"))
+    procs = {id(r._proc) for r in pool._all}
+    get_commit_summary("HEAD~1", repo_path=str(repo))
+    assert len(pool._all) == 1
+    assert {id(r._proc) for r in pool._all} == procs
+
+
+def test_repeat_lookups_make_no_git_calls(repo, monkeypatch):
+    from agents.tools.git_reader import GitObjectReader
+
+    sha = _git(repo, "rev-parse", "HEAD")
+    first = get_commit_summary(sha[:10], repo_path=str(repo))
+    assert get_file_content("pkg/a.py", sha[:10], repo_path=str(repo))
+
+    calls = []
+    orig = GitObjectReader.read
+    monkeypatch.setattr(GitObjectReader, "read", lambda self, spec: calls.append(spec) or orig(self, spec))
+    assert get_commit_summary(sha[:10], repo_path=str(repo)) == first
+    assert get_commit_summary(sha, repo_path=str(repo)) == first
+    assert get_file_content("pkg/a.py", sha[:10], repo_path=str(repo)) == "one\nTWO\nthree\nfour\n"
+    assert calls == []
+
+
+def test_object_cache_lru_and_spill(tmp_path):
+    from agents.tools.object_cache import ObjectCache
+
+    cache = ObjectCache(max_bytes=100, spill_dir=str(tmp_path / "spill"))
+    cache.put("a", b"x" * 60)
+    cache.put("b", b"y" * 30)
+    assert cache.get("a") == b"x" * 60  # a becomes most recent
+    cache.put("c", b"z" * 30)           # evicts b to disk
+    assert "b" not in cache._items
+    assert cache.size_bytes <= 100
+    assert cache.get("b") == b"y" * 30  # promoted back from spill
+
+    no_spill = ObjectCache(max_bytes=10)
+    no_spill.put("k", b"0123456789abc")
+    assert no_spill.get("k") is None
+
+
+def test_parse_git_references_single_pass():
+    from agents.impl.engineer_crewai import parse_git_references
+
+    text = ("Review commit:37C2ED14 and #a1b2c3d on feature/x branch. Build 1234567 failed, "
+            "cafebabe note, also see a1b2c3d and branch: main")
+    refs = parse_git_references(text)
+    assert refs["commits"] == ["37c2ed14", "a1b2c3d"]
+    assert refs["branches"] == ["feature/x", "main"]
+
+
+def test_validate_commit_refs_batches(repo, monkeypatch):
+    from agents.impl.engineer_crewai import validate_commit_refs
+    from agents.tools.git_reader import GitObjectReader
+
+    head = _git(repo, "rev-parse", "HEAD")
+    tree = _git(repo, "rev-parse", "HEAD^{tree}")
+    monkeypatch.setattr(GitObjectReader, "read", lambda self, spec: pytest.fail("per-candidate lookup"))
+    assert validate_commit_refs([head[:9], "abc1234", tree[:9]], repo_path=str(repo)) == [head[:9]]
+
+
+def test_stat_of_large_repetitive_file_is_fast(repo):
+    import time
+
+    work = repo / "workspace"
+    old = ["{", "    pass", "}"] * 4000
+    (work / "big.py").write_text("\n".join(old) + "\n")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", "big")
+    new = [f"edit {i}" if i % 50 == 0 else line for i, line in enumerate(old)]
+    (work / "big.py").write_text("\n".join(new) + "\n")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", "edit big")
+    sha = _git(repo, "rev-parse", "HEAD")
+
+    started = time.monotonic()
+    summary = get_commit_summary(sha, repo_path=str(repo))
+    assert time.monotonic() - started < 5
+    added, deleted, _ = _git(repo, "diff-tree", "--no-commit-id", "--numstat", "-r", sha).split("\t")
+    assert f"{added} insertions(+), {deleted} deletions(-)" in summary
@@ -0,0 +1,86 @@
+import asyncio
+
+from agents.core.governor import LLMGovernor
+
+
+def test_fair_round_robin_across_owners():
+    gov = LLMGovernor(rpm=0, tpm=0, max_concurrency=1, redis_url="")
+    order = []
+
+    async def call(owner, i):
+        async with gov.slot(10, owner=owner):
+            order.append(f"{owner}{i}")
+            await asyncio.sleep(0.01)
+
+    async def main():
+        # owner a floods the queue first; b's single call must not wait behind all of it
+        jobs = [asyncio.create_task(call("a", i)) for i in range(4)]
+        await asyncio.sleep(0)
+        jobs.append(asyncio.create_task(call("b", 0)))
+        await asyncio.gather(*jobs)
+
+    asyncio.run(main())
+    assert order.index("b0") <= 2
+    assert gov.inflight == 0 and gov.queued == 0
+
+
+def test_token_bucket_delays_and_record_refunds():
+    gov = LLMGovernor(rpm=0, tpm=600, max_concurrency=4, redis_url="")  # 10 tokens/s
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async with gov.slot(600) as lease:
+            lease.record(595)  # only 595 used: 5 tokens come back
+        async with gov.slot(10):
+            pass
+        return loop.time() - start
+
+    elapsed = asyncio.run(main())
+    assert 0.2 < elapsed < 2.0
+
+
+def test_cancelled_waiter_leaves_queue():
+    gov = LLMGovernor(rpm=0, tpm=0, max_concurrency=1, redis_url="")
+
+    async def main():
+        async with gov.slot(1):
+            waiter = asyncio.create_task(gov.slot(1).__aenter__())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        assert gov.queued == 0 and gov.inflight == 0
+
+    asyncio.run(main())
+
+
+def test_timed_out_thread_keeps_its_slot(monkeypatch):
+    import threading
+
+    from agents.core import crewai_adapter
+    from agents.core.crewai_adapter import CrewAIAdapter
+
+    gov = LLMGovernor(rpm=0, tpm=0, max_concurrency=1, redis_url="")
+    monkeypatch.setattr(crewai_adapter, "get_governor", lambda: gov)
+    monkeypatch.setenv("LLM_CALL_TIMEOUT", "0.05")
+    release = threading.Event()
+
+    def slow_call():
+        release.wait(2)
+        return "late", None
+
+    async def main():
+        try:
+            await CrewAIAdapter()._governed_call(slow_call, "p", {})
+        except asyncio.TimeoutError:
+            pass
+        # the LLM call is still running in its thread, so the slot is still taken
+        assert gov.inflight == 1
+        release.set()
+        for _ in range(100):
+            if gov.inflight == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert gov.inflight == 0
+
+    asyncio.run(main())
@@ -75,6 +75,7 @@ def test_ingest_repo_monkeypatched(monkeypatch, tmp_path):
     monkeypatch.setattr(ingest_module, 'RecursiveCharacterTextSplitter', DummySplitter)
     monkeypatch.setattr(ingest_module, 'OpenAIEmbeddings', lambda: DummyEmbeddings())
     monkeypatch.setattr(ingest_module, 'Qdrant', DummyQdrant)
+    monkeypatch.setenv('RAG_LEXICAL_DIR', str(tmp_path / 'lexical'))
 
     # create a small file to represent repo contents
     file_path = tmp_path / "a.py"
@@ -85,3 +86,94 @@ def test_ingest_repo_monkeypatched(monkeypatch, tmp_path):
     assert called.get('collection') == 'test-collection'
     assert called.get('url') == 'http://localhost:6333'
     assert isinstance(called.get('chunks'), list)
+
+
+def test_auto_backend_mirrors_ingest_into_local_store(monkeypatch, tmp_path):
+    from mcp import vector_store
+    from mcp.embeddings import DeterministicEmbeddings
+
+    class DummyLoader:
+        def __init__(self, repo_dir, **kwargs):
+            pass
+
+        def load(self):
+            return [SimpleNamespace(metadata={"source": str(tmp_path / "a.py")}, page_content="def a(): pass\n")]
+
+    class DummySplitter:
+        def __init__(self, **kwargs):
+            pass
+
+        def split_documents(self, docs):
+            return docs
+
+    wrapped = {}
+
+    class DummyQdrant:
+        @classmethod
+        def from_documents(cls, chunks, embeddings, url=None, collection_name=None):
+            wrapped['vectors'] = embeddings.embed_documents([c.page_content for c in chunks])
+            return cls()
+
+    class CountingEmbeddings(DeterministicEmbeddings):
+        calls = 0
+
+        def embed_documents(self, texts):
+            CountingEmbeddings.calls += 1
+            return super().embed_documents(texts)
+
+    embeddings = CountingEmbeddings(dim=8)
+    monkeypatch.setattr(ingest_module, 'DirectoryLoader', DummyLoader)
+    monkeypatch.setattr(ingest_module, 'RecursiveCharacterTextSplitter', DummySplitter)
+    monkeypatch.setattr(ingest_module, 'OpenAIEmbeddings', lambda: embeddings)
+    monkeypatch.setattr(ingest_module, 'Qdrant', DummyQdrant)
+    monkeypatch.setattr(ingest_module, '_register_collection', lambda collection, emb: 8)
+    monkeypatch.setattr(ingest_module, 'get_local_store', lambda: vector_store.LocalVectorStore(base_dir=str(tmp_path / 'vectors')))
+    monkeypatch.setenv('RAG_VECTOR_BACKEND', 'auto')
+    monkeypatch.setenv('RAG_LEXICAL_DIR', str(tmp_path / 'lexical'))
+
+    for _ in range(2):
+        ingest_module.ingest_repo(repo_dir=str(tmp_path), collection='mirror')
+
+    local = vector_store.LocalVectorStore(base_dir=str(tmp_path / 'vectors'))
+    hits = local.search('mirror', wrapped['vectors'][0], 10)
+    # the fallback store holds the collection, once, despite two full ingests
+    assert [h['payload']['file_path'] for h in hits] == ['a.py']
+    # chunks were embedded once per ingest and shared with the Qdrant wrapper
+    assert CountingEmbeddings.calls == 2
+
+
+def test_full_ingest_drops_removed_files_from_lexical_index(monkeypatch, tmp_path):
+    from mcp import lexical
+
+    files = [["a.py", "b.py"], ["a.py"]]
+
+    class DummyLoader:
+        def __init__(self, repo_dir, **kwargs):
+            pass
+
+        def load(self):
+            return [SimpleNamespace(metadata={"source": str(tmp_path / f)}, page_content=f"# {f}\n") for f in files.pop(0)]
+
+    class DummySplitter:
+        def __init__(self, **kwargs):
+            pass
+
+        def split_documents(self, docs):
+            return docs
+
+    class DummyQdrant:
+        @classmethod
+        def from_documents(cls, chunks, embeddings, url=None, collection_name=None):
+            return cls()
+
+    monkeypatch.setattr(ingest_module, 'DirectoryLoader', DummyLoader)
+    monkeypatch.setattr(ingest_module, 'RecursiveCharacterTextSplitter', DummySplitter)
+    monkeypatch.setattr(ingest_module, 'Qdrant', DummyQdrant)
+    monkeypatch.setenv('RAG_VECTOR_BACKEND', 'qdrant')
+    monkeypatch.setenv('RAG_LEXICAL_DIR', str(tmp_path / 'lexical'))
+
+    for _ in range(2):
+        ingest_module.ingest_repo(repo_dir=str(tmp_path), collection='lex-full')
+
+    # b.py was deleted before the second full ingest; hybrid search must not rank it
+    assert [d["meta"]["file_path"] for d in lexical.load_index('lex-full').docs.values()] == ['a.py']
@@ -12,3 +12,30 @@ def test_deterministic_embedding_shape_and_repeatability():
     import math
     norm = math.sqrt(sum(x * x for x in v1))
     assert abs(norm - 1.0) < 1e-6
+
+
+def test_deterministic_batch_matches_single_and_reference():
+    import hashlib
+    from mcp.embeddings import DeterministicEmbeddings, deterministic_matrix
+
+    texts = ["alpha", "beta", ""]
+    mat = deterministic_matrix(texts, dim=100)
+    assert mat.shape == (3, 100)
+    emb = DeterministicEmbeddings(dim=100)
+    for i, t in enumerate(texts):
+        single = emb.embed_query(t)
+        assert max(abs(a - b) for a, b in zip(single, mat[i])) < 1e-6
+        # reference: the original byte-by-byte construction
+        h = hashlib.sha256(t.encode("utf-8")).digest()
+        ref = [(h[j % 32] / 255.0) * 2.0 - 1.0 for j in range(100)]
+        n = sum(x * x for x in ref) ** 0.5
+        assert max(abs(a - b / n) for a, b in zip(single, ref)) < 1e-6
+
+
+def test_embedding_dim_agreed_from_env(monkeypatch):
+    from mcp.embeddings import DeterministicEmbeddings, embed_dim
+
+    monkeypatch.setenv("RAG_EMBED_DIM", "32")
+    assert embed_dim() == 32
+    assert len(DeterministicEmbeddings().embed_query("x")) == 32
+    assert len(deterministic_embedding("x")) == 32
@@ -0,0 +1,52 @@
+from mcp import lexical
+from mcp.lexical import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    toks = tokenize("Fix getCommitSummary for PROJ-123 in redis_lock")
+    assert "getcommitsummary" in toks
+    assert "commit" in toks
+    assert "proj-123" in toks
+    assert "redis_lock" in toks and "lock" in toks
+
+
+def test_bm25_prefers_exact_identifier():
+    idx = LexicalIndex("t")
+    idx.add("def acquire_lock_async(client, key): pass", {"file_path": "mcp/redis_lock.py"})
+    idx.add("def release(client): lock lock lock", {"file_path": "mcp/other.py"})
+    idx.add("unrelated text about embeddings", {"file_path": "mcp/emb.py"})
+    ranked = idx.search("acquire_lock_async", limit=3)
+    assert ranked
+    assert idx.docs[ranked[0][0]]["meta"]["file_path"] == "mcp/redis_lock.py"
+
+
+def test_update_index_replaces_file_chunks(monkeypatch, tmp_path):
+    monkeypatch.setenv("RAG_LEXICAL_DIR", str(tmp_path))
+    lexical.update_index("c", [("old body", {"file_path": "a.py"}), ("keep", {"file_path": "b.py"})])
+    idx = lexical.update_index("c", [("new body", {"file_path": "a.py"})], deleted_files=["b.py"])
+    texts = sorted(d["text"] for d in idx.docs.values())
+    assert texts == ["new body"]
+    assert len(lexical.get_index("c").docs) == 1
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]])
+    assert fused[0][0] == "a"
+    assert {k for k, _ in fused} == {"a", "b", "c"}
+
+
+def test_doc_key_matches_for_nested_langchain_payloads():
+    idx = LexicalIndex("t")
+    key = idx.add("def f(): pass", {"file_path": "a.py", "source": "/repo/a.py"})
+    # LangChain's Qdrant payloads keep the chunk's metadata under "metadata"
+    nested = {"page_content": "def f(): pass", "metadata": {"file_path": "a.py", "source": "/repo/a.py"}}
+    assert lexical.doc_key(nested, "def f(): pass") == key
+    assert lexical.flatten_payload(nested)["file_path"] == "a.py"
+
+
+def test_update_index_replace_rebuilds_from_chunks(monkeypatch, tmp_path):
+    monkeypatch.setenv("RAG_LEXICAL_DIR", str(tmp_path))
+    lexical.update_index("full", [("gone", {"file_path": "removed.py"}), ("old", {"file_path": "a.py"})])
+    idx = lexical.update_index("full", [("new", {"file_path": "a.py"})], replace=True)
+    assert [d["meta"]["file_path"] for d in idx.docs.values()] == ["a.py"]
+    assert [d["text"] for d in lexical.load_index("full").docs.values()] == ["new"]
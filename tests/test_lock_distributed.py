@@ -1,4 +1,5 @@
 import asyncio
+import time
 import pytest
 
 from mcp import redis_lock
@@ -90,3 +91,119 @@ def test_acquire_release_sync(monkeypatch):
     redis_lock.release_lock_sync(client, key, token)
     client3, token3 = redis_lock.acquire_lock_sync('redis://unused', key, ttl=5)
     assert client3 is not None and token3 is not None
+
+
+@pytest.mark.asyncio
+async def test_acquire_async_can_surface_redis_errors():
+    class Down(FakeAsyncRedis):
+        async def set(self, key, value, nx=False, ex=None):
+            raise ConnectionError("redis down")
+
+    # Default: an error looks like "not acquired"; with raise_errors the caller can fall back
+    assert await redis_lock.acquire_lock_async(Down(), 'test:3:lock', ttl=5) is None
+    with pytest.raises(ConnectionError):
+        await redis_lock.acquire_lock_async(Down(), 'test:3:lock', ttl=5, raise_errors=True)
+
+
+class FakeLeaseRedis:
+    """Just enough of redis.asyncio for LockManager's scripts, with PX expiry."""
+
+    def __init__(self):
+        self.store = {}
+        self.expires = {}
+
+    def _live(self, key):
+        exp = self.expires.get(key)
+        if exp is not None and time.monotonic() >= exp:
+            self.store.pop(key, None)
+            self.expires.pop(key, None)
+        return self.store.get(key)
+
+    async def get(self, key):
+        return self._live(key)
+
+    async def eval(self, script, num_keys, *args):
+        keys, argv = args[:num_keys], args[num_keys:]
+        if script == redis_lock._ACQUIRE_LUA:
+            if self._live(keys[0]) is not None:
+                return 0
+            self.store[keys[0]] = argv[0]
+            self.expires[keys[0]] = time.monotonic() + int(argv[1]) / 1000
+            self.store[keys[1]] = str(int(self.store.get(keys[1], 0)) + 1)
+            return int(self.store[keys[1]])
+        if self._live(keys[0]) != argv[0]:
+            return 0
+        if script == redis_lock._RENEW_LUA:
+            self.expires[keys[0]] = time.monotonic() + int(argv[1]) / 1000
+        else:
+            self.store.pop(keys[0], None)
+        return 1
+
+
+def _manager(fake, ttl=0.2, renew_every=0.05):
+    mgr = redis_lock.LockManager("redis://unused", ttl=ttl, renew_every=renew_every)
+    mgr.client = lambda: fake
+    return mgr
+
+
+@pytest.mark.asyncio
+async def test_lease_fencing_tokens_increase_and_conflicts_return_none():
+    mgr = _manager(FakeLeaseRedis())
+    first = await mgr.acquire("task:5:lock")
+    assert first is not None and first.fence == 1
+    assert await mgr.acquire("task:5:lock") is None
+    await mgr.release(first)
+    second = await mgr.acquire("task:5:lock")
+    assert second.fence == 2
+    assert await mgr.is_current(second)
+    assert not await mgr.is_current(first)
+    await mgr.release(second)
+
+
+@pytest.mark.asyncio
+async def test_lease_is_renewed_past_its_ttl():
+    fake = FakeLeaseRedis()
+    mgr = _manager(fake)
+    lease = await mgr.acquire("task:6:lock")
+    await asyncio.sleep(0.5)  # more than twice the TTL
+    assert not lease.lost
+    assert await mgr.acquire("task:6:lock") is None
+    await mgr.release(lease)
+    assert await fake.get("task:6:lock") is None
+
+
+@pytest.mark.asyncio
+async def test_lost_lease_is_reported_and_fenced_out():
+    fake = FakeLeaseRedis()
+    mgr = _manager(fake)
+    lost = []
+
+    async def on_lost(lease):
+        lost.append(lease.fence)
+
+    stale = await mgr.acquire("task:7:lock", on_lost=on_lost)
+    # Simulate a pause longer than the TTL: the key expires and another run takes over
+    fake.store.pop("task:7:lock")
+    newer = await mgr.acquire("task:7:lock")
+    await asyncio.sleep(0.1)
+    assert stale.lost and lost == [1]
+    assert not await mgr.is_current(stale)
+    assert await mgr.is_current(newer)
+    await mgr.release(stale)  # must not drop the newer holder's lock
+    assert await fake.get("task:7:lock") == newer.token
+    await mgr.release(newer)
+
+
+@pytest.mark.asyncio
+async def test_lease_flagged_lost_is_still_current_until_taken_over():
+    fake = FakeLeaseRedis()
+    mgr = _manager(fake)
+    lease = await mgr.acquire("task:8:lock")
+    # e.g. renewal failed for a TTL but nobody acquired the lock meanwhile
+    lease.lost = True
+    assert await mgr.is_current(lease)
+    fake.store.pop("task:8:lock")
+    newer = await mgr.acquire("task:8:lock")
+    assert not await mgr.is_current(lease)
+    await mgr.release(lease)
+    await mgr.release(newer)
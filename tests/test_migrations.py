@@ -0,0 +1,52 @@
+from sqlalchemy import create_engine, inspect, select, text
+
+from mcp import migrations, models
+
+
+def _old_schema(engine):
+    # Tables as created before the hot-path indexes existed
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE agents (id INTEGER PRIMARY KEY, name VARCHAR(256) NOT NULL, owner_id INTEGER, "
+                          "description TEXT, logo_url VARCHAR(512), public BOOLEAN)"))
+        conn.execute(text("CREATE TABLE tasks (id INTEGER PRIMARY KEY, title VARCHAR(512) NOT NULL, description TEXT, "
+                          "owner_id INTEGER, agent_id INTEGER, status VARCHAR(32), logo_url VARCHAR(512), created_at DATETIME)"))
+        conn.execute(text("CREATE TABLE activities (id INTEGER PRIMARY KEY, task_id INTEGER, agent_id INTEGER, "
+                          "content TEXT, created_at DATETIME)"))
+
+
+def _plan(conn, stmt):
+    sql = str(stmt.compile(conn.engine, compile_kwargs={"literal_binds": True}))
+    return " ".join(row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql)))
+
+
+def test_migrations_add_indexes_to_existing_database_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    _old_schema(engine)
+
+    # scheduled_tasks / indexed_commits don't exist here and are skipped
+    assert migrations.run_migrations(engine) == [v for v, _ in migrations.MIGRATIONS]
+    assert migrations.run_migrations(engine) == []
+
+    names = {ix["name"] for ix in inspect(engine).get_indexes("activities")}
+    assert "ix_activities_task_created" in names
+    with engine.connect() as conn:
+        assert migrations.applied_versions(conn) == {v for v, _ in migrations.MIGRATIONS}
+        columns = {c["name"] for c in inspect(conn).get_columns("activities")}
+        assert {"summary", "content_gz", "archived"} <= columns
+        assert inspect(conn).has_table("activities_archive")
+        activities = select(models.Activity).where(models.Activity.task_id == 1).order_by(models.Activity.created_at)
+        assert "USING INDEX ix_activities_task_created" in _plan(conn, activities)
+        assert "TEMP B-TREE" not in _plan(conn, activities)
+        assert "ix_tasks_owner_created" in _plan(conn, select(models.Task).where(models.Task.owner_id == 1))
+        assert "ix_agents_name" in _plan(conn, select(models.Agent.id).where(models.Agent.name == "Engineer"))
+    engine.dispose()
+
+
+def test_fresh_database_gets_indexes_from_models():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    assert migrations.run_migrations(engine) == [v for v, _ in migrations.MIGRATIONS]
+    names = {ix["name"] for ix in inspect(engine).get_indexes("indexed_commits")}
+    assert "ix_indexed_commits_lookup" in names
+    names = {ix["name"] for ix in inspect(engine).get_indexes("scheduled_tasks")}
+    assert "ix_scheduled_tasks_due" in names
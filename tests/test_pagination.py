@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import create_engine, insert, select, text
+
+from mcp import models, pagination
+
+
+def _engine():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _pages(conn, descending, limit=3):
+    T = models.Task
+    cursor, seen = None, []
+    while True:
+        stmt = select(T.id, T.created_at).where(T.owner_id == 1)
+        after = pagination.keyset_after(T.created_at, T.id, cursor, descending)
+        if after is not None:
+            stmt = stmt.where(after)
+        rows = conn.execute(stmt.order_by(*pagination.keyset_order(T.created_at, T.id, descending)).limit(limit + 1)).all()
+        items = rows[:limit]
+        seen.extend(r.id for r in items)
+        if len(rows) <= limit:
+            return seen
+        cursor = pagination.encode_cursor(items[-1].created_at, items[-1].id)
+
+
+def test_keyset_pages_cover_rows_once_with_equal_timestamps():
+    engine = _engine()
+    with engine.begin() as conn:
+        # Same-second server-default timestamps, plus a later second
+        conn.execute(insert(models.Task), [{"title": f"t{i}", "owner_id": 1} for i in range(7)])
+        conn.execute(text("INSERT INTO tasks (title, owner_id, created_at) VALUES ('late', 1, '2999-01-01 00:00:00')"))
+        conn.execute(insert(models.Task), [{"title": "other", "owner_id": 2}])
+    with engine.connect() as conn:
+        newest_first = _pages(conn, descending=True)
+        assert newest_first == [8, 7, 6, 5, 4, 3, 2, 1]
+        assert _pages(conn, descending=False, limit=2) == [1, 2, 3, 4, 5, 6, 7, 8]
+
+
+def test_keyset_page_is_an_index_range_scan():
+    engine = _engine()
+    T = models.Task
+    cursor = pagination.encode_cursor(None, 10)
+    stmt = (select(T.id).where(T.owner_id == 1, pagination.keyset_after(T.created_at, T.id, cursor, True))
+            .order_by(*pagination.keyset_order(T.created_at, T.id, True)).limit(51))
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        plan = " ".join(r[-1] for r in conn.execute(text("EXPLAIN QUERY PLAN " + sql)))
+    assert "ix_tasks_owner_created" in plan and "TEMP B-TREE" not in plan
+
+
+def test_cursor_and_fields_validation():
+    from datetime import datetime
+    when = datetime(2026, 1, 2, 3, 4, 5, 6)
+    assert pagination.decode_cursor(pagination.encode_cursor(when, 42)) == (when, 42)
+    with pytest.raises(ValueError):
+        pagination.decode_cursor("not-a-cursor")
+    assert pagination.parse_fields(None, ("id", "title"), ("id",)) == ["id"]
+    assert pagination.parse_fields("title, id", ("id", "title"), ("id",)) == ["title", "id"]
+    with pytest.raises(ValueError):
+        pagination.parse_fields("id,password", ("id", "title"), ("id",))
+    assert pagination.clamp_limit(0) == pagination.DEFAULT_LIMIT
+    assert pagination.clamp_limit(10_000) == pagination.MAX_LIMIT
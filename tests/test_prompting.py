@@ -0,0 +1,72 @@
+from agents.core.prompting import PromptBuilder, add_task_sections, count_tokens
+
+
+def test_sections_truncated_to_budget_and_deduplicated():
+    log = "\n".join(["ERROR connection refused to db:5432"] * 50 + [f"line {i} of a long tail output" for i in range(400)])
+    pb = PromptBuilder(budget=10000)
+    pb.add("instructions", "Review this.", priority=0, required=True)
+    pb.add("log", log, priority=2, budget=200, keep="tail")
+    prompt = pb.build()
+    assert prompt.count("ERROR connection refused") <= 1
+    assert "line 399 of a long tail output" in prompt
+    assert "tokens truncated" in prompt
+    assert count_tokens(prompt) <= 220
+
+
+def test_total_budget_drops_low_priority_first():
+    pb = PromptBuilder(budget=150)
+    pb.add("instructions", "You are a reviewer.", priority=0, required=True)
+    add_task_sections(pb, {"title": "Fix flaky test", "description": "desc", "files": ["x.py"] * 300,
+                           "artifact_summary": "| file | pass |\n|---|---|\n| junit.xml | 10 |"})
+    pb.add("closing", "Return findings.", priority=0, required=True)
+    prompt = pb.build()
+    assert count_tokens(prompt) <= 150
+    assert prompt.startswith("You are a reviewer.")
+    assert prompt.endswith("Return findings.")
+    assert "junit.xml" in prompt
+    assert prompt.count("x.py") < 300
+
+    tight = PromptBuilder(budget=60)
+    tight.add("instructions", "You are a reviewer.", priority=0, required=True)
+    tight.add("files", "Files: " + "x.py " * 300, priority=4)
+    tight.add("closing", "Return findings.", priority=0, required=True)
+    assert tight.build() == "You are a reviewer.\nReturn findings."
+
+
+def test_agents_share_byte_identical_prefix(monkeypatch):
+    import asyncio
+
+    from agents.core.prompting import SUFFIX_HEADER, shared_prefix
+    from agents.impl.audit_crewai import AuditCrewAI
+    from agents.impl.defect_discovery_crewai import DefectDiscoveryCrewAI
+    from agents.impl.engineer_crewai import EngineerCodeReviewCrewAI
+    from agents.impl.perf_metrics_crewai import PerformanceMetricsCrewAI
+    from agents.impl.requirements_tracing_crewai import RequirementsTracingCrewAI
+    from agents.impl.root_cause_crewai import RootCauseInvestigatorCrewAI
+
+    task = {"title": "Pipeline failure", "description": "Integration tests fail on main", "files": ["ci.py"],
+            "artifact_summary": "| file | failed |\n|---|---|\n| junit.xml | 3 |"}
+    prompts = []
+
+    async def capture(prompt, **kwargs):
+        prompts.append(prompt)
+        return {"text": "ok"}
+
+    agents = [EngineerCodeReviewCrewAI("E"), RootCauseInvestigatorCrewAI("R"), DefectDiscoveryCrewAI("D"),
+              RequirementsTracingCrewAI("Q"), PerformanceMetricsCrewAI("M"), AuditCrewAI("A")]
+    for agent in agents:
+        monkeypatch.setattr(agent.adapter, "run", capture)
+        asyncio.run(agent.process(dict(task)))
+
+    prefix = shared_prefix(task)
+    assert "junit.xml" in prefix and "Integration tests fail" in prefix
+    for p in prompts:
+        assert p.startswith(prefix + "\n\n" + SUFFIX_HEADER)
+
+
+def test_usage_summary_reads_cached_tokens():
+    from agents.core.crewai_adapter import usage_summary
+
+    usage = {"prompt_tokens": 1800, "completion_tokens": 200, "prompt_tokens_details": {"cached_tokens": 1536}}
+    assert usage_summary(usage) == {"prompt_tokens": 1800, "completion_tokens": 200, "cached_tokens": 1536}
+    assert usage_summary(None) is None
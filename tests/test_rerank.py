@@ -0,0 +1,25 @@
+from mcp.rerank import LexicalReranker, estimate_tokens, rerank, select_within_budget
+
+
+def test_lexical_reranker_promotes_matching_chunk():
+    items = [
+        {"text": "generic helper utilities"},
+        {"text": "JIRA PROJ-42: release_lock_sync leaks client"},
+        {"text": "another unrelated chunk"},
+    ]
+    out = rerank("PROJ-42 release_lock_sync", items, top_k=2, reranker=LexicalReranker())
+    assert out[0]["text"].startswith("JIRA PROJ-42")
+    assert len(out) == 2
+    assert all("rerank_score" in o for o in out)
+
+
+def test_select_within_budget_respects_tokens():
+    items = [{"text": "a" * 400}, {"text": "b" * 400}, {"text": "c" * 400}]
+    out = select_within_budget(items, top_k=3, token_budget=250)
+    assert len(out) == 2
+    assert sum(estimate_tokens(o["text"]) for o in out) <= 250
+
+
+def test_select_within_budget_keeps_first_item_truncated():
+    out = select_within_budget([{"text": "x" * 1000}], top_k=3, token_budget=10)
+    assert len(out) == 1 and len(out[0]["text"]) == 40
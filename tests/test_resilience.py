@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from agents.core.agents import MasterControlPanel
+from agents.core.resilience import LatencyTracker, call_with_retries, is_retryable, mark_admitted
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def test_retries_retryable_errors_then_succeeds(monkeypatch):
+    monkeypatch.setenv("LLM_RETRY_BASE", "0.001")
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RateLimitError("429")
+        return "ok"
+
+    assert asyncio.run(call_with_retries(attempt, retries=2)) == "ok"
+    assert len(calls) == 3
+
+
+def test_non_retryable_error_raises_immediately():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(call_with_retries(attempt, retries=3))
+    assert len(calls) == 1
+    assert is_retryable(asyncio.TimeoutError())
+
+
+def test_hedge_fires_after_p95():
+    tracker = LatencyTracker(min_samples=5)
+    for _ in range(10):
+        tracker.record(0.01)
+    started = []
+
+    async def attempt():
+        started.append(1)
+        # the first attempt hangs, the hedged one returns quickly
+        await asyncio.sleep(5 if len(started) == 1 else 0)
+        return len(started)
+
+    async def main():
+        return await asyncio.wait_for(call_with_retries(attempt, tracker, retries=0, hedge=True), 2)
+
+    assert asyncio.run(main()) == 2
+
+
+def test_hedge_timer_starts_after_admission():
+    tracker = LatencyTracker(min_samples=5)
+    for _ in range(10):
+        tracker.record(0.05)
+    started = []
+
+    async def attempt():
+        started.append(1)
+        await asyncio.sleep(0.3)  # queued for admission far past p95
+        mark_admitted()
+        await asyncio.sleep(0.01)
+        return len(started)
+
+    async def main():
+        return await call_with_retries(attempt, tracker, retries=0, hedge=True, admission=True)
+
+    assert asyncio.run(main()) == 1
+    assert len(started) == 1
+
+
+class SlowAgent:
+    def __init__(self, name, delay):
+        self.name = name
+        self.delay = delay
+
+    async def process(self, task):
+        await asyncio.sleep(self.delay)
+        return f"{self.name}: done"
+
+
+def test_task_deadline_returns_partial_results(monkeypatch):
+    monkeypatch.setenv("AGENT_TASK_DEADLINE", "0.2")
+    mcp = MasterControlPanel()
+    mcp.agent_manager.agents = [SlowAgent("Fast", 0), SlowAgent("Hung", 10)]
+    results = mcp.submit_task({"title": "t", "description": "", "files": []})
+    assert results["Fast"] == "Fast: done"
+    assert "timed out" in results["Hung"]
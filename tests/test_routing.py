@@ -0,0 +1,44 @@
+from agents.core.routing import AgentRouter
+
+NAMES = ["EngineerAgent", "RootCauseAgent", "DiscoveryAgent", "RequirementsAgent", "MetricsAgent", "AuditAgent"]
+
+
+def test_webhook_tasks_route_to_few_agents():
+    router = AgentRouter()
+    jira = router.route({"title": "JIRA event: jira:issue_updated - PROJ-1", "description": "", "source": "jira"}, NAMES)
+    assert jira.agents == ["RequirementsAgent"]
+    push = router.route({"title": "GitHub event: push", "description": "fix crash in parser, add regression test",
+                         "source": "github"}, NAMES)
+    assert push.agents == ["RootCauseAgent"]
+    assert len(router.route({"title": "review code for latency error", "source": "github"}, NAMES).agents) == 2
+
+
+def test_explicit_escalation_and_fallback(monkeypatch):
+    router = AgentRouter()
+    assert router.route({"title": "x", "agent": "AuditAgent"}, NAMES).agents == ["AuditAgent"]
+    assert router.route({"title": "x", "agents": ["Nope"]}, NAMES).agents == NAMES
+    assert router.route({"title": "bug", "source": "jira", "escalate": True}, NAMES).agents == NAMES
+    assert router.route({"title": "Critical outage in prod", "source": "jira"}, NAMES).agents == NAMES
+    monkeypatch.setenv("AGENT_ROUTING", "off")
+    assert router.route({"title": "x", "agent": "AuditAgent"}, NAMES).agents == NAMES
+
+
+def test_agent_id_is_resolved_off_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+
+    from agents.core import routing
+
+    seen = {}
+
+    def lookup(agent_id):
+        seen["thread"] = threading.current_thread()
+        return "AuditAgent" if agent_id == 7 else None
+
+    monkeypatch.setattr(routing, "_agent_name_for_id", lookup)
+    task = asyncio.run(routing.resolve_agent_name({"title": "x", "agent_id": 7}))
+    assert seen["thread"] is not threading.main_thread()
+    assert AgentRouter().route(task, NAMES).agents == ["AuditAgent"]
+    # route() itself never touches the database
+    monkeypatch.setattr(routing, "_agent_name_for_id", None)
+    assert AgentRouter().route({"title": "x", "agent_id": 7}, NAMES).agents == NAMES
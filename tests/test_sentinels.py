@@ -0,0 +1,29 @@
+from mcp import sentinels
+
+
+def _reset(monkeypatch, tmp_path):
+    monkeypatch.setenv("RUN_AGENTS_SENTINEL_DIR", str(tmp_path))
+    monkeypatch.setattr(sentinels, "_logger", None)
+    monkeypatch.setattr(sentinels, "_listener", None)
+
+
+def test_sentinels_disabled_by_default(monkeypatch, tmp_path):
+    _reset(monkeypatch, tmp_path)
+    monkeypatch.delenv("RUN_AGENTS_DEBUG_SENTINELS", raising=False)
+    sentinels.sentinel(sentinels.ENTERED, "RUN_AGENTS_ENTERED id=1")
+    assert sentinels._logger is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sentinel_lines_go_to_their_own_files(monkeypatch, tmp_path):
+    _reset(monkeypatch, tmp_path)
+    monkeypatch.setenv("RUN_AGENTS_DEBUG_SENTINELS", "1")
+    sentinels.sentinel(sentinels.ENTERED, "RUN_AGENTS_ENTERED id=7")
+    sentinels.sentinel(sentinels.LOCK_CONFLICT, "LOCK_CONFLICT key=task:7:lock method=async")
+    sentinels._stop(sentinels._listener)  # flushes the queue
+
+    entered = (tmp_path / "run_agents_entered.log").read_text().splitlines()
+    conflict = (tmp_path / "run_agents_lock_conflict.log").read_text().splitlines()
+    assert len(entered) == 1 and entered[0].endswith("RUN_AGENTS_ENTERED id=7")
+    assert len(conflict) == 1 and "LOCK_CONFLICT key=task:7:lock" in conflict[0]
+    assert not (tmp_path / "run_agents_lock_acquired.log").exists()
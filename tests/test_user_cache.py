@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from mcp import api, models
+from mcp.user_cache import MISSING, CachedUser, UserCache, user_cache
+
+
+def test_cache_ttl_negative_entries_and_lru(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("mcp.user_cache.time.monotonic", lambda: now[0])
+    cache = UserCache(ttl=60, negative_ttl=5, max_entries=2)
+    alice = cache.put(CachedUser(1, "alice", None, "staff"))
+    cache.put_missing("ghost")
+    assert cache.get("alice") is alice and cache.get("ghost") is MISSING
+    now[0] += 10
+    assert cache.get("ghost") is None and cache.get("alice") is alice
+    cache.put(CachedUser(2, "bob", None, "staff"))
+    cache.put(CachedUser(3, "carol", None, "staff"))  # evicts the least recently used
+    assert cache.get("alice") is None and cache.get("carol").id == 3
+    cache.invalidate("carol")
+    assert cache.get("carol") is None
+
+
+def test_cache_hit_needs_no_database(monkeypatch):
+    user_cache.clear()
+    user_cache.put(CachedUser(7, "cached-user", None, "staff"))
+    monkeypatch.setattr(api, "AsyncSessionLocal", lambda: pytest.fail("database used on a cache hit"))
+    assert asyncio.run(api.get_current_user("Bearer cached-user")).id == 7
+
+    user_cache.put_missing("nobody")
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(api.get_current_user("Bearer nobody"))
+    assert exc.value.status_code == 401
+    user_cache.clear()
+
+
+def test_upsert_user_is_idempotent_under_concurrency(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}", connect_args={"check_same_thread": False, "timeout": 10})
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    ids, errors = [], []
+
+    def first_request():
+        db = Session()
+        try:
+            ids.append(api._upsert_user(db, "racer", "racer@example.com", "staff").id)
+            db.commit()
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=first_request) for _ in range(8)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert not errors and len(set(ids)) == 1
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.User.__table__)).scalar() == 1
+    engine.dispose()
+
+
+def test_no_http_route_changes_roles():
+    # Roles are only bounded by USER_CACHE_TTL, so nothing may change them over HTTP
+    assert not any("/users/" in getattr(r, "path", "") for r in api.router.routes)
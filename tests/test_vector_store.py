@@ -0,0 +1,79 @@
+import numpy as np
+
+from mcp import vector_store
+from mcp.vector_store import LocalVectorStore
+
+
+def _vec(*xs):
+    return list(np.asarray(xs, dtype=float))
+
+
+def test_local_store_upsert_search_and_delete(tmp_path):
+    store = LocalVectorStore(base_dir=str(tmp_path))
+    store.ensure_collection("c", 3)
+    store.upsert("c", [_vec(1, 0, 0), _vec(0, 1, 0), _vec(0.9, 0.1, 0)],
+                 [{"file_path": "a.py", "page_content": "a"},
+                  {"file_path": "b.py", "page_content": "b"},
+                  {"file_path": "c.py", "page_content": "c"}])
+    hits = store.search("c", _vec(1, 0, 0), limit=2)
+    assert [h["payload"]["file_path"] for h in hits] == ["a.py", "c.py"]
+    assert abs(hits[0]["score"] - 1.0) < 1e-5
+
+    store.delete_by_file_path("c", "a.py")
+    # a fresh instance reads the persisted, memory-mapped data
+    reopened = LocalVectorStore(base_dir=str(tmp_path))
+    hits = reopened.search("c", _vec(1, 0, 0), limit=5)
+    assert [h["payload"]["file_path"] for h in hits] == ["c.py", "b.py"]
+
+
+def test_local_store_ivf_search(tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_LOCAL_IVF_MIN", "10")
+    rng = np.random.default_rng(1)
+    data = rng.normal(size=(64, 8)).astype(np.float32)
+    store = LocalVectorStore(base_dir=str(tmp_path))
+    store.upsert("ivf", data, [{"i": i} for i in range(len(data))])
+    gen = (tmp_path / "ivf" / "CURRENT").read_text()
+    assert (tmp_path / "ivf" / gen / "ivf_centroids.npy").exists()
+    store.nprobe = 64  # probing every list must match brute force
+    hits = store.search("ivf", data[5], limit=1)
+    assert hits[0]["payload"]["i"] == 5
+
+
+def test_local_store_switches_generations_atomically(tmp_path):
+    store = LocalVectorStore(base_dir=str(tmp_path))
+    store.upsert("g", [_vec(1, 0)], [{"file_path": "a.py"}])
+    reader = LocalVectorStore(base_dir=str(tmp_path))
+    assert len(reader.search("g", _vec(1, 0), 5)) == 1
+    store.upsert("g", [_vec(0, 1)], [{"file_path": "b.py"}])
+    store.upsert("g", [_vec(1, 1)], [{"file_path": "c.py"}])
+    # readers pick up the new generation; only it and its predecessor remain
+    assert len(reader.search("g", _vec(1, 0), 5)) == 3
+    gens = sorted(p.name for p in (tmp_path / "g").iterdir() if p.is_dir())
+    assert gens == ["gen-000002", "gen-000003"]
+    assert (tmp_path / "g" / "CURRENT").read_text() == "gen-000003"
+
+
+def test_local_store_replace_drops_previous_rows(tmp_path):
+    store = LocalVectorStore(base_dir=str(tmp_path))
+    store.upsert("r", [_vec(1, 0), _vec(0, 1)], [{"file_path": "a.py"}, {"file_path": "b.py"}])
+    # a full re-ingest of the same files must not duplicate them
+    assert store.replace("r", [_vec(1, 0), _vec(0, 1)], [{"file_path": "a.py"}, {"file_path": "b.py"}]) == 2
+    assert len(store.search("r", _vec(1, 0), 10)) == 2
+
+
+def test_search_with_fallback_uses_local_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_VECTOR_BACKEND", "auto")
+    local = LocalVectorStore(base_dir=str(tmp_path))
+    local.upsert("fb", [_vec(0, 1)], [{"page_content": "only"}])
+    monkeypatch.setattr(vector_store, "_LOCAL_STORE", local)
+    monkeypatch.setattr(vector_store, "QdrantClient", None)
+    hits = vector_store.search_with_fallback("fb", _vec(0, 1), 3)
+    assert hits and hits[0]["payload"]["page_content"] == "only"
+
+
+def test_qdrant_point_ids_are_stable_per_file_chunk():
+    ids = vector_store.QdrantVectorStore._point_ids([{"file_path": "a.py"}, {"file_path": "b.py"}, {"file_path": "a.py"}])
+    again = vector_store.QdrantVectorStore._point_ids([{"file_path": "b.py"}, {"file_path": "a.py"}, {"file_path": "a.py"}])
+    assert len(set(ids)) == 3
+    assert set(ids) == set(again)
+    assert ids[0] == again[1] and ids[1] == again[0]
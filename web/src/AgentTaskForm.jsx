@@ -97,7 +97,7 @@ export default function AgentTaskForm(){
                 // show status and any activities
                 let out = 'Task: ' + JSON.stringify({id:j.id, title:j.title, status:j.status}, null, 2)
                 if(Array.isArray(j.activities) && j.activities.length){
-                  out += '\n\nActivities:\n' + j.activities.map(a => `${a.created_at} - ${a.content}`).join('\n\n')
+                  out += '\n\nActivities:\n' + j.activities.map(a => `${a.created_at} - ${a.content ?? a.summary}`).join('\n\n')
                 }
                 setOutput(out)
                 if(j.status && j.status !== 'pending' && j.status !== 'running'){
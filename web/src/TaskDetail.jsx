@@ -29,6 +29,49 @@ export default function TaskDetail({id, onClose}){
     finally{ setLoading(false) }
   }
 
+  // Task detail carries the first page of activity summaries; later pages and
+  // full content are fetched on demand
+  async function loadMoreActivities(){
+    if(!task || !task.activities_cursor) return
+    try{
+      const base = getApiBase()
+      const res = await fetch(`${base.replace(/\/$/, '')}/api/tasks/${id}/activities?cursor=${encodeURIComponent(task.activities_cursor)}`, { headers: authHeaders() })
+      if(res.ok){
+        const j = await res.json()
+        const next = res.headers.get('X-Next-Cursor')
+        setTask(prev => {
+          if(!prev) return prev
+          const acts = prev.activities || []
+          // keep entries streamed over SSE after the stored ones
+          const stored = acts.filter(a => !a.live), live = acts.filter(a => a.live)
+          return {...prev, activities: stored.concat(j, live), activities_cursor: next}
+        })
+      }
+    }catch(e){ console.error(e) }
+  }
+
+  async function expandActivity(activityId){
+    try{
+      const base = getApiBase()
+      const res = await fetch(`${base.replace(/\/$/, '')}/api/tasks/${id}/activities/${activityId}`, { headers: authHeaders() })
+      if(res.ok){
+        const j = await res.json()
+        setTask(prev => prev ? {...prev, activities: (prev.activities || []).map(a => (!a.live && a.id === activityId) ? {...a, content: j.content, truncated: false} : a)} : prev)
+      }
+    }catch(e){ console.error(e) }
+  }
+
+  async function cancelTask(){
+    try{
+      const base = getApiBase()
+      const res = await fetch(`${base.replace(/\/$/, '')}/api/tasks/${id}/cancel`, { method: 'POST', headers: authHeaders() })
+      if(res.ok){
+        const j = await res.json()
+        setTask(prev => prev ? {...prev, status: j.status} : prev)
+      }
+    }catch(e){ console.error(e) }
+  }
+
   useEffect(()=>{
     let es = null
     let connectedSSE = false
@@ -45,8 +88,8 @@ export default function TaskDetail({id, onClose}){
           } else if(msg.type === 'activity'){
             setTask(prev => {
               const acts = prev && Array.isArray(prev.activities) ? prev.activities.slice() : []
-              const next = { id: prev?.id || id, title: prev?.title || '', description: prev?.description || '', status: prev?.status || '', created_at: prev?.created_at || '', activities: acts, agents: prev?.agents || {} }
-              acts.push({ id: acts.length + 1, agent: msg.agent, content: msg.content, created_at: msg.created_at })
+              const next = { id: prev?.id || id, title: prev?.title || '', description: prev?.description || '', status: prev?.status || '', created_at: prev?.created_at || '', activities: acts, activities_cursor: prev?.activities_cursor || null, agents: prev?.agents || {} }
+              acts.push({ id: 'live-' + (acts.length + 1), live: true, agent: msg.agent, content: msg.content, created_at: msg.created_at })
               next.activities = acts
               return next
             })
@@ -81,7 +124,10 @@ export default function TaskDetail({id, onClose}){
     <div style={{position:'fixed', right:20, top:80, width:520, maxHeight:'70%', overflow:'auto', padding:12, background:'#fff', border:'1px solid #ddd', boxShadow:'0 4px 12px rgba(0,0,0,0.08)'}}>
       <div style={{display:'flex', justifyContent:'space-between', alignItems:'center'}}>
         <h4 style={{margin:0}}>Task {id}</h4>
-        <div><button onClick={onClose}>Close</button></div>
+        <div style={{display:'flex',gap:6}}>
+          {task && !['done','failed','cancelled'].includes(task.status) && <button onClick={cancelTask}>Cancel</button>}
+          <button onClick={onClose}>Close</button>
+        </div>
       </div>
       {loading && <div>Loading...</div>}
       {task && (
@@ -107,10 +153,12 @@ export default function TaskDetail({id, onClose}){
             task.activities.map(a=> (
               <div key={a.id} style={{marginBottom:12, padding:8, background:'#f9f9f9', borderRadius:6}}>
                 <div style={{fontSize:12,color:'#666'}}>{a.created_at}</div>
-                <div style={{whiteSpace:'pre-wrap', marginTop:6}}>{a.content}</div>
+                <div style={{whiteSpace:'pre-wrap', marginTop:6}}>{a.content ?? a.summary}{a.truncated && '…'}</div>
+                {a.truncated && <button style={{marginTop:6}} onClick={()=>expandActivity(a.id)}>Show full</button>}
               </div>
             ))
           ) : (<div style={{color:'#666'}}>No activities yet.</div>)}
+          {task.activities_cursor && <button onClick={loadMoreActivities}>Load more activities</button>}
         </div>
       )}
     </div>
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react'
+import React, { useEffect, useRef, useState } from 'react'
 import TaskDetail from './TaskDetail'
 
 function getApiBase(){
@@ -18,15 +18,32 @@ export default function TaskList(){
   const [tasks, setTasks] = useState([])
   const [selected, setSelected] = useState(null)
   const [loading, setLoading] = useState(false)
+  const [nextCursor, setNextCursor] = useState(null)
+  const loadedMore = useRef(false)
 
-  async function fetchTasks(){
+  // Newest tasks first; older pages are fetched on demand with the X-Next-Cursor header
+  async function fetchTasks(cursor){
     setLoading(true)
     try{
       const base = getApiBase()
-      const res = await fetch(base.replace(/\/$/, '') + '/api/tasks', { headers: authHeaders() })
+      let url = base.replace(/\/$/, '') + '/api/tasks?fields=id,title,status,created_at'
+      if(cursor) url += '&cursor=' + encodeURIComponent(cursor)
+      const res = await fetch(url, { headers: authHeaders() })
       if(res.ok){
         const j = await res.json()
-        setTasks(j)
+        const next = res.headers.get('X-Next-Cursor')
+        if(cursor){
+          loadedMore.current = true
+          setTasks(prev => prev.concat(j))
+          setNextCursor(next)
+        } else if(loadedMore.current){
+          // Refresh the first page but keep the older pages already loaded
+          const ids = new Set(j.map(t => t.id))
+          setTasks(prev => j.concat(prev.filter(t => !ids.has(t.id))))
+        } else {
+          setTasks(j)
+          setNextCursor(next)
+        }
       }
     }catch(e){
       console.error(e)
@@ -35,7 +52,7 @@ export default function TaskList(){
 
   useEffect(()=>{
     fetchTasks()
-    const iv = setInterval(fetchTasks, 5000)
+    const iv = setInterval(()=>fetchTasks(), 5000)
     return ()=> clearInterval(iv)
   }, [])
 
@@ -51,6 +68,7 @@ export default function TaskList(){
           </li>
         ))}
       </ul>
+      {nextCursor && <button onClick={()=>fetchTasks(nextCursor)}>Load more</button>}
       {selected && <TaskDetail id={selected} onClose={()=>setSelected(null)} />}
     </div>
   )